@@ -0,0 +1,35 @@
+"""add full-text search indexes
+
+Revision ID: 3f2c9a1d7b45
+Revises: 608a649e6271
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2c9a1d7b45'
+down_revision: Union[str, None] = '608a649e6271'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must match the expressions in app/search.py
+INDEXES = {
+    'ix_boards_search': ('boards', "to_tsvector('simple', coalesce(title, ''))"),
+    'ix_lists_search': ('lists', "to_tsvector('simple', coalesce(title, ''))"),
+    'ix_cards_search': ('cards', "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"),
+}
+
+
+def upgrade() -> None:
+    for name, (table, expression) in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})")
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
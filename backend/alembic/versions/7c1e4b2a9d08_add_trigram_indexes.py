@@ -0,0 +1,36 @@
+"""add trigram indexes for search suggestions
+
+Revision ID: 7c1e4b2a9d08
+Revises: 3f2c9a1d7b45
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b2a9d08'
+down_revision: Union[str, None] = '3f2c9a1d7b45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    'ix_boards_title_trgm': ('boards', 'title'),
+    'ix_lists_title_trgm': ('lists', 'title'),
+    'ix_cards_title_trgm': ('cards', 'title'),
+    'ix_labels_name_trgm': ('labels', 'name'),
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
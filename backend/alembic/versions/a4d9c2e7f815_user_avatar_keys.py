@@ -0,0 +1,29 @@
+"""avatar key columns on users
+
+Revision ID: a4d9c2e7f815
+Revises: f3c7a9e1d254
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d9c2e7f815'
+down_revision: Union[str, None] = 'f3c7a9e1d254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Avatars uploaded before this were never recorded, so there is nothing to backfill
+    op.add_column('users', sa.Column('avatar_key', sa.String(length=64), nullable=True))
+    op.add_column('users', sa.Column('avatar_pending', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar_pending')
+    op.drop_column('users', 'avatar_key')
@@ -0,0 +1,38 @@
+"""structured card ids and from/to lists on activities
+
+Revision ID: a7e3c5d1f482
+Revises: d2b8f05e6a19
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c5d1f482'
+down_revision: Union[str, None] = 'd2b8f05e6a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = ('card_id', 'from_list_id', 'to_list_id')
+
+
+def upgrade() -> None:
+    # Nullable and without a default, so adding them doesn't rewrite the table.
+    # Older rows only have their free-text details; analytics treats cards
+    # without recorded events as created in their current list
+    for name in COLUMNS:
+        op.add_column('activities', sa.Column(name, sa.Integer(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_activities_card_id', 'activities', ['card_id'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_activities_card_id', table_name='activities', postgresql_concurrently=True)
+    for name in reversed(COLUMNS):
+        op.drop_column('activities', name)
@@ -0,0 +1,35 @@
+"""size, sha256 and content type on attachments
+
+Revision ID: b1f4e8a26c37
+Revises: a7e3c5d1f482
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1f4e8a26c37'
+down_revision: Union[str, None] = 'a7e3c5d1f482'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing attachments keep their uploads/<filename> paths and no hash
+    op.add_column('attachments', sa.Column('size', sa.BigInteger(), nullable=True))
+    op.add_column('attachments', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.add_column('attachments', sa.Column('content_type', sa.String(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_attachments_sha256', 'attachments', ['sha256'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_attachments_sha256', table_name='attachments', postgresql_concurrently=True)
+    op.drop_column('attachments', 'content_type')
+    op.drop_column('attachments', 'sha256')
+    op.drop_column('attachments', 'size')
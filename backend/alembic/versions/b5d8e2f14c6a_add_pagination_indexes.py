@@ -0,0 +1,35 @@
+"""add composite indexes for keyset pagination
+
+Revision ID: b5d8e2f14c6a
+Revises: 7c1e4b2a9d08
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d8e2f14c6a'
+down_revision: Union[str, None] = '7c1e4b2a9d08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = {
+    'ix_boards_created_at_id': ('boards', ['created_at', 'id']),
+    'ix_lists_created_at_id': ('lists', ['created_at', 'id']),
+    'ix_cards_created_at_id': ('cards', ['created_at', 'id']),
+    'ix_activities_board_id_created_at_id': ('activities', ['board_id', 'created_at', 'id']),
+}
+
+
+def upgrade() -> None:
+    for name, (table, columns) in INDEXES.items():
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,80 @@
+"""denormalize board_id onto cards, labels, checklists and checklist items
+
+Revision ID: c9f1a6e2b783
+Revises: e4a7c3d91f20
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f1a6e2b783'
+down_revision: Union[str, None] = 'e4a7c3d91f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Rows per backfill transaction; small enough to keep row locks short
+BATCH_SIZE = 5000
+
+# table -> (parent table, parent column), in dependency order
+TABLES = {
+    'cards': ('lists', 'list_id'),
+    'labels': ('cards', 'card_id'),
+    'checklists': ('cards', 'card_id'),
+    'checklist_items': ('checklists', 'checklist_id'),
+}
+INDEXES = {
+    'ix_cards_board_id_list_id': ('cards', ['board_id', 'list_id']),
+    'ix_labels_board_id_name': ('labels', ['board_id', 'name']),
+}
+
+
+def backfill(table: str, parent: str, column: str):
+    conn = op.get_bind()
+    low, high = conn.execute(sa.text(f"SELECT min(id), max(id) FROM {table}")).one()
+    if low is None:
+        return
+    statement = sa.text(f"""
+        UPDATE {table} SET board_id = (SELECT {parent}.board_id FROM {parent} WHERE {parent}.id = {table}.{column})
+        WHERE id >= :start AND id < :end AND board_id IS NULL
+    """)
+    for start in range(low, high + 1, BATCH_SIZE):
+        # Each batch commits on its own, so the table stays writable throughout
+        with op.get_context().autocommit_block():
+            conn.execute(statement, {"start": start, "end": start + BATCH_SIZE})
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        # Nullable with no default: a metadata-only change that doesn't rewrite the table
+        op.add_column(table, sa.Column('board_id', sa.Integer(), nullable=True))
+        # NOT VALID skips checking existing rows, so adding it doesn't hold the
+        # table lock for a full scan; it's validated after the backfill
+        op.create_foreign_key(
+            f'fk_{table}_board_id', table, 'boards', ['board_id'], ['id'],
+            ondelete='CASCADE', postgresql_not_valid=True,
+        )
+
+    for table, (parent, column) in TABLES.items():
+        backfill(table, parent, column)
+
+    with op.get_context().autocommit_block():
+        if op.get_bind().dialect.name == 'postgresql':
+            # Validating only takes a lock that lets reads and writes carry on
+            for table in TABLES:
+                op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT fk_{table}_board_id')
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in reversed(list(TABLES)):
+        op.drop_constraint(f'fk_{table}_board_id', table, type_='foreignkey')
+        op.drop_column(table, 'board_id')
@@ -0,0 +1,51 @@
+"""materialized per-list statistics
+
+Revision ID: d2b8f05e6a19
+Revises: c9f1a6e2b783
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b8f05e6a19'
+down_revision: Union[str, None] = 'c9f1a6e2b783'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNTERS = ('card_count', 'overdue_count', 'checklist_items', 'checklist_items_done')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'list_statistics',
+        sa.Column('list_id', sa.Integer(), sa.ForeignKey('lists.id', ondelete='CASCADE'), primary_key=True),
+        *(sa.Column(name, sa.Integer(), nullable=False, server_default='0') for name in COUNTERS),
+    )
+    # Writes keep these current from here on; the app's periodic reconcile
+    # repairs anything written between this backfill and the deploy
+    op.get_bind().execute(sa.text("""
+        INSERT INTO list_statistics (list_id, card_count, overdue_count, checklist_items, checklist_items_done)
+        SELECT l.id,
+               (SELECT count(*) FROM cards c WHERE c.list_id = l.id),
+               (SELECT count(*) FROM cards c WHERE c.list_id = l.id AND c.due_date < :now),
+               (SELECT count(*) FROM checklist_items i
+                  JOIN checklists k ON k.id = i.checklist_id
+                  JOIN cards c ON c.id = k.card_id
+                 WHERE c.list_id = l.id),
+               (SELECT count(*) FROM checklist_items i
+                  JOIN checklists k ON k.id = i.checklist_id
+                  JOIN cards c ON c.id = k.card_id
+                 WHERE c.list_id = l.id AND i.completed)
+          FROM lists l
+    """), {'now': datetime.now(timezone.utc).replace(tzinfo=None)})
+
+
+def downgrade() -> None:
+    op.drop_table('list_statistics')
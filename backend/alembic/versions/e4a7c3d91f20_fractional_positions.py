@@ -0,0 +1,81 @@
+"""fractional-index positions for lists, cards, checklists and items
+
+Revision ID: e4a7c3d91f20
+Revises: b5d8e2f14c6a
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.ordering import spread_keys
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c3d91f20'
+down_revision: Union[str, None] = 'b5d8e2f14c6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# table -> (parent column, current display order)
+TABLES = {
+    'lists': ('board_id', 'created_at, id'),
+    'cards': ('list_id', 'created_at, id'),
+    'checklists': ('card_id', 'position, id'),
+    'checklist_items': ('checklist_id', 'position, id'),
+}
+INDEXES = {
+    'ix_lists_board_id_position': ('lists', ['board_id', 'position']),
+    'ix_cards_list_id_position': ('cards', ['list_id', 'position']),
+    'ix_checklists_card_id_position': ('checklists', ['card_id', 'position']),
+    'ix_checklist_items_checklist_id_position': ('checklist_items', ['checklist_id', 'position']),
+}
+
+
+def siblings(table: str, parent: str, order: str):
+    rows = op.get_bind().execute(sa.text(f"SELECT id, {parent} FROM {table} ORDER BY {parent}, {order}")).all()
+    groups = {}
+    for row_id, parent_id in rows:
+        groups.setdefault(parent_id, []).append(row_id)
+    return groups.values()
+
+
+def write(table: str, column: str, values):
+    values = list(values)
+    if values:
+        op.get_bind().execute(sa.text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), values)
+
+
+def upgrade() -> None:
+    for table, (parent, order) in TABLES.items():
+        # Checklists already have an integer position; build the keys beside it
+        column = 'position' if table in ('lists', 'cards') else 'position_key'
+        op.add_column(table, sa.Column(column, sa.String(), nullable=True))
+        for ids in siblings(table, parent, order):
+            write(table, column, ({"id": i, "value": key} for i, key in zip(ids, spread_keys(len(ids)))))
+        if column != 'position':
+            with op.batch_alter_table(table) as batch:
+                batch.drop_column('position')
+                batch.alter_column('position_key', new_column_name='position')
+
+    for name, (table, columns) in INDEXES.items():
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+
+    for table, (parent, _) in TABLES.items():
+        if table in ('lists', 'cards'):
+            op.drop_column(table, 'position')
+            continue
+        op.add_column(table, sa.Column('position_index', sa.Integer(), nullable=True))
+        for ids in siblings(table, parent, 'position, id'):
+            write(table, 'position_index', ({"id": i, "value": n} for n, i in enumerate(ids)))
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column('position')
+            batch.alter_column('position_index', new_column_name='position')
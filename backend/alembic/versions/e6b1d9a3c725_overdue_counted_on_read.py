@@ -0,0 +1,37 @@
+"""count overdue cards on read instead of in list_statistics
+
+Revision ID: e6b1d9a3c725
+Revises: c8e2f4a6b913
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b1d9a3c725'
+down_revision: Union[str, None] = 'c8e2f4a6b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_cards_list_id_due_date', 'cards', ['list_id', 'due_date'])
+    op.drop_column('list_statistics', 'overdue_count')
+
+
+def downgrade() -> None:
+    op.add_column(
+        'list_statistics',
+        sa.Column('overdue_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.get_bind().execute(sa.text("""
+        UPDATE list_statistics
+           SET overdue_count = (SELECT count(*) FROM cards c
+                                 WHERE c.list_id = list_statistics.list_id AND c.due_date < :now)
+    """), {'now': datetime.now(timezone.utc).replace(tzinfo=None)})
+    op.drop_index('ix_cards_list_id_due_date', table_name='cards')
@@ -0,0 +1,202 @@
+# app/analytics.py
+"""Board analytics from card history: cumulative flow, lead and cycle times
+per list and for the board, and weekly throughput.
+
+Every card event on a board comes back from one query, is turned into
+NumPy columns and worked through with array operations, so the cost is a
+few passes over the arrays rather than Python work per card. Results are
+cached per board until new activity arrives.
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import Integer, exists, extract, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .config import ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL
+
+DAY = 86400.0
+WEEK = 7 * DAY
+# 1970-01-05, the first Monday after the epoch
+MONDAY = 4 * DAY
+PERCENTILES = (50, 85, 95)
+CARD_EVENTS = ("card_created", "card_moved", "card_deleted")
+
+analytics_cache = TTLCache("board-analytics", maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+
+def load_events(db: Session, board_id: int) -> Dict[str, np.ndarray]:
+    """The board's card events in time order, as columns: card id, whether it
+    is the card's creation, the list it left and the list it entered (NaN for
+    none) and the time in epoch seconds."""
+    activity = models.Activity
+    recorded = select(
+        activity.card_id.label("card_id"),
+        (activity.activity_type == "card_created").label("created"),
+        activity.from_list_id.label("from_list_id"),
+        activity.to_list_id.label("to_list_id"),
+        extract("epoch", activity.created_at).label("at"),
+        activity.id.label("seq"),
+    ).where(
+        activity.board_id == board_id, activity.card_id.is_not(None), activity.activity_type.in_(CARD_EVENTS)
+    )
+    # Cards from before moves were recorded count as created in their current list
+    untracked = select(
+        models.Card.id,
+        literal(True),
+        null().cast(Integer),
+        models.Card.list_id,
+        extract("epoch", models.Card.created_at),
+        literal(0),
+    ).where(models.Card.board_id == board_id, ~exists().where(activity.card_id == models.Card.id))
+    events = union_all(recorded, untracked).subquery()
+    rows = db.execute(select(events).order_by(events.c.at, events.c.seq)).all()
+
+    columns = list(zip(*rows)) or [()] * 5
+    return {
+        "card": np.asarray(columns[0], dtype=np.int64),
+        "created": np.asarray(columns[1], dtype=bool),
+        # None becomes NaN, which matches no list
+        "from": np.asarray(columns[2], dtype=float),
+        "to": np.asarray(columns[3], dtype=float),
+        "at": np.asarray(columns[4], dtype=float),
+    }
+
+
+def _list_index(values: np.ndarray, list_ids: np.ndarray) -> np.ndarray:
+    # Position of each id in list_ids, or -1 for lists no longer on the board
+    if not list_ids.size:
+        return np.full(values.shape, -1)
+    order = np.argsort(list_ids)
+    ordered = list_ids[order]
+    found = np.minimum(np.searchsorted(ordered, values), ordered.size - 1)
+    return np.where(ordered[found] == values, order[found], -1)
+
+
+def _distribution(seconds: np.ndarray) -> dict:
+    seconds = seconds[~np.isnan(seconds)]
+    if not seconds.size:
+        return {"count": 0}
+    hours = seconds / 3600
+    p50, p85, p95 = np.percentile(hours, PERCENTILES)
+    return {
+        "count": int(hours.size),
+        "mean_hours": round(float(hours.mean()), 2),
+        "p50_hours": round(float(p50), 2),
+        "p85_hours": round(float(p85), 2),
+        "p95_hours": round(float(p95), 2),
+    }
+
+
+def _per_list(seconds: np.ndarray, list_index: np.ndarray, count: int) -> List[dict]:
+    # One distribution per list, from a single sort rather than a mask per list
+    order = np.argsort(list_index, kind="stable")
+    bounds = np.searchsorted(list_index[order], np.arange(count + 1))
+    ordered = seconds[order]
+    return [_distribution(ordered[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+
+def _utc_date(seconds: float) -> date:
+    return datetime.fromtimestamp(seconds, timezone.utc).date()
+
+
+def compute(events: Dict[str, np.ndarray], lists: Sequence, done_list_id: Optional[int], days: int, now: float) -> dict:
+    """Analytics for the board whose `lists` (id, title), in display order,
+    and card `events` from load_events() are given."""
+    list_ids = np.asarray([row[0] for row in lists], dtype=float)
+    count = list_ids.size
+    card, created, at = events["card"], events["created"], events["at"]
+    left = _list_index(events["from"], list_ids)
+    entered = _list_index(events["to"], list_ids)
+
+    # Cumulative flow: +1 where a card enters a list, -1 where it leaves, added
+    # up to each day's end. Events before the window land in its first day
+    day_ends = (np.floor(now / DAY) + 1 - np.arange(days - 1, -1, -1)) * DAY
+    first_day = np.searchsorted(day_ends, at, side="right")
+    flow = np.zeros((count, days + 1), dtype=np.int64)
+    np.add.at(flow, (entered[entered >= 0], first_day[entered >= 0]), 1)
+    np.add.at(flow, (left[left >= 0], first_day[left >= 0]), -1)
+    cumulative = np.cumsum(flow, axis=1)[:, :days]
+
+    # Group each card's events together, still in time order
+    order = np.argsort(card, kind="stable")
+    card, created, at, entered = card[order], created[order], at[order], entered[order]
+    # (the slices keep these empty when there are no events)
+    starts = np.r_[True, card[1:] != card[:-1]][:card.size]
+    same_card_next = np.r_[card[1:] == card[:-1], False][:card.size]
+    next_at = np.r_[at[1:], np.nan][:card.size]
+    group = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+    # Creation time, and when the card first left its creation list, per event's card
+    born = np.where(created[first], at[first], np.nan)[group]
+    started = np.where(same_card_next[first], next_at[first], np.nan)[group]
+
+    # A stay in a list runs from the event entering it to the card's next event
+    stayed = same_card_next & (entered >= 0)
+    dwell = _per_list((next_at - at)[stayed], entered[stayed], count)
+
+    # First arrival of each card in each list, creation excluded
+    arrivals = np.flatnonzero(~created & (entered >= 0))
+    if arrivals.size:
+        _, unique = np.unique(np.stack([card[arrivals], entered[arrivals]], axis=1), axis=0, return_index=True)
+        arrivals = np.sort(arrivals[unique])
+    lead = _per_list(at[arrivals] - born[arrivals], entered[arrivals], count)
+
+    # The done list is the last one unless the caller says otherwise
+    done = count - 1 if done_list_id is None else int(np.flatnonzero(list_ids == done_list_id)[0])
+    completed = arrivals[entered[arrivals] == done]
+
+    weeks = -(-days // 7)
+    this_week = np.floor((now - MONDAY) / WEEK) * WEEK + MONDAY
+    week_starts = this_week - WEEK * np.arange(weeks - 1, -1, -1)
+    week = np.floor((at[completed] - week_starts[0]) / WEEK).astype(np.int64)
+    throughput = np.bincount(week[(week >= 0) & (week < weeks)], minlength=weeks)
+
+    return {
+        "done_list_id": int(list_ids[done]) if count else None,
+        "days": [_utc_date(end - DAY) for end in day_ends],
+        "lists": [
+            {
+                "list_id": int(list_ids[i]),
+                "name": lists[i][1],
+                "cumulative_flow": cumulative[i].tolist(),
+                "lead_time": lead[i],
+                "cycle_time": dwell[i],
+            }
+            for i in range(count)
+        ],
+        "lead_time": _distribution(at[completed] - born[completed]),
+        "cycle_time": _distribution(at[completed] - started[completed]),
+        "throughput": [
+            {"week_start": _utc_date(start), "completed": int(n)} for start, n in zip(week_starts, throughput)
+        ],
+    }
+
+
+def board_analytics(db: Session, board_id: int, days: int = 30, done_list_id: Optional[int] = None) -> dict:
+    """compute() for a board, reusing the last result while no activity has
+    been recorded on the board and its lists are unchanged."""
+    lists = [tuple(row) for row in db.execute(
+        select(models.List.id, models.List.title)
+        .where(models.List.board_id == board_id).order_by(models.List.position, models.List.id)
+    )]
+    if done_list_id is not None and done_list_id not in {row[0] for row in lists}:
+        raise HTTPException(status_code=400, detail="Done list is not on this board")
+    latest = db.scalar(
+        select(models.Activity.id).where(models.Activity.board_id == board_id)
+        .order_by(models.Activity.created_at.desc(), models.Activity.id.desc()).limit(1)
+    )
+    version = (latest, tuple(lists))
+    key = (board_id, days, done_list_id)
+    cached = analytics_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    now = datetime.now(timezone.utc).timestamp()
+    result = {"board_id": board_id, **compute(load_events(db, board_id), lists, done_list_id, days, now)}
+    analytics_cache.set(key, (version, result))
+    return result
@@ -1,14 +1,20 @@
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from . import models, schemas
 from .database import get_db
 from dotenv import load_dotenv
 from typing import Optional
+from .cache import TTLCache
+from .config import USER_CACHE_TTL, USER_CACHE_SIZE, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
 
 load_dotenv()
 
@@ -19,22 +25,65 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Detached user records keyed by token subject (username), so authenticating a
+# request does not cost a database round trip
+user_cache = TTLCache("users", maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# bcrypt is deliberately slow, so hashing and verification run in a dedicated
+# bounded pool instead of on the event loop or in the shared request threadpool
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+# Jobs running or waiting in the pool; beyond this, requests are turned away
+password_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE_LIMIT)
+
+def _acquire_password_slot():
+    if not password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+def _run_password_job(func, *args):
+    _acquire_password_slot()
+    try:
+        return password_executor.submit(func, *args).result()
+    finally:
+        password_slots.release()
+
+async def _run_password_job_async(func, *args):
+    _acquire_password_slot()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        password_slots.release()
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_password_job(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _run_password_job(pwd_context.hash, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_job_async(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_password_job_async(pwd_context.hash, password)
 
-def authenticate_user(db: Session, username: str, password: str):
+def _find_login_user(db: Session, username: str) -> Optional[models.User]:
     # Try to find user by email if username lookup fails
-    user = db.query(models.User).filter(
+    return db.query(models.User).filter(
         (models.User.username == username) | (models.User.email == username)
     ).first()
+
+async def authenticate_user(db: Session, username: str, password: str):
+    # The lookup is blocking IO on a sync session, so it goes to the threadpool
+    # like a sync route would rather than running on the event loop
+    user = await run_in_threadpool(_find_login_user, db, username)
     
     if not user:
         return False
     
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
         
     return user
@@ -49,7 +98,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> schemas.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -63,20 +112,42 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    user = await _load_user_async(db, token_data.username)
     if user is None:
         raise credentials_exception
     return user
 
-async def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
+def load_user(db: Session, username: str) -> Optional[schemas.User]:
+    user = user_cache.get(username)
+    if user is None:
+        db_user = db.query(models.User).filter(models.User.username == username).first()
+        if db_user is None:
+            return None
+        user = schemas.User.model_validate(db_user)
+        user_cache.set(username, user)
+    return user
+
+async def _load_user_async(db: Session, username: str) -> Optional[schemas.User]:
+    # A cache hit stays on the event loop; only a miss runs the sync query,
+    # in the threadpool like the login lookup
+    user = user_cache.get(username)
+    if user is None:
+        user = await run_in_threadpool(load_user, db, username)
+    return user
+
+def invalidate_user(*usernames: str):
+    # Call after any write that changes a user's cached fields
+    for username in usernames:
+        user_cache.invalidate(username)
+
+async def get_user_from_token(token: str, db: Session) -> Optional[schemas.User]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
             
-        user = db.query(models.User).filter(models.User.username == username).first()
-        return user
+        return await _load_user_async(db, username)
     except JWTError:
         return None
 
@@ -0,0 +1,110 @@
+# app/avatars.py
+"""Avatar processing.
+
+An uploaded photo is stored as is, then turned into small square
+thumbnails (app/thumbnails.py) by a background job. Decoding and resizing
+are CPU-bound, so they run in a process pool instead of on the event loop
+or in a thread holding the GIL. Thumbnails are named by the
+SHA-256 of the photo they came from, so a URL always means the same image
+and can be cached for good.
+
+The user's avatar only switches to the new photo once its thumbnails exist;
+if processing fails they keep the previous one.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from sqlalchemy import update
+
+from . import auth, models, thumbnails
+from .config import AVATAR_MAX_PIXELS, AVATAR_SIZES, AVATAR_WORKERS
+from .jobs import queue
+from .storage import storage
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = thumbnails.variant_names(AVATAR_SIZES)
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+# Thumbnail URLs never change what they point at
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def location(key: str, variant: str) -> str:
+    return os.path.join("avatars", key[:2], key, variant)
+
+
+class AvatarProcessor:
+    def __init__(self, workers: int = AVATAR_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Started lazily, and by spawning rather than forking a process
+            # that has an event loop and connection pools
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def render(self, path: str) -> Dict[str, bytes]:
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        try:
+            return await loop.run_in_executor(pool, thumbnails.render, path, AVATAR_SIZES, AVATAR_MAX_PIXELS)
+        except BrokenProcessPool:
+            # A worker died, likely of this image (out of memory, a decoder
+            # crash), so it mustn't be retried in the API process. Fail the
+            # job for the queue to retry later in a fresh pool
+            logger.warning(f"Avatar worker pool broke rendering {path}; starting a new one")
+            if self._pool is pool:
+                # Not one another render has started since
+                self.shutdown()
+            raise
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+processor = AvatarProcessor()
+
+
+async def is_ready(key: str) -> bool:
+    # Variants are written in order, so the last one marks them all
+    return await asyncio.to_thread(os.path.exists, storage.local_path(location(key, VARIANTS[-1])))
+
+
+@queue.handler("avatar_thumbnails", concurrency=AVATAR_WORKERS)
+async def process(payload: dict):
+    """Makes the thumbnails for photo `key` and switches the user's avatar to
+    it, unless they've uploaded another since."""
+    user_id, key = payload["user_id"], payload["key"]
+    try:
+        if not await is_ready(key):
+            variants = await processor.render(storage.local_path(payload["location"]))
+            for variant in VARIANTS:
+                await storage.put(location(key, variant), variants[variant])
+        done = True
+    except thumbnails.NotAnImage as e:
+        # No use retrying; other errors fail the job so it's tried again
+        logger.warning(f"Avatar for user {user_id} is unusable: {e}")
+        done = False
+
+    values = {"avatar_pending": None}
+    if done:
+        values["avatar_key"] = key
+    async with queue.sessions() as db:
+        username = (await db.execute(
+            update(models.User)
+            .where(models.User.id == user_id, models.User.avatar_pending == key)
+            .values(**values)
+            .returning(models.User.username)
+        )).scalar()
+        await db.commit()
+    if username is not None:
+        auth.invalidate_user(username)
@@ -0,0 +1,142 @@
+# app/broker.py
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called with (channel, message) for every message published on a subscribed channel
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+class Broker(ABC):
+    """Pub/sub transport used by the WebSocket ConnectionManager to fan out
+    messages to every worker that has sockets open on a channel."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+def publish_from_any_thread(broker: Broker, loop: asyncio.AbstractEventLoop, channel: str, message: str) -> None:
+    """Publish without awaiting, from the event loop or from a sync route
+    running in the threadpool."""
+    coro = broker.publish(channel, message)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(coro)
+    else:
+        asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+class InMemoryBroker(Broker):
+    """Delivers messages to handlers in the current process only. Managers that
+    share an instance behave like separate workers on a shared Redis."""
+
+    def __init__(self):
+        self.subscriptions: Dict[str, List[MessageHandler]] = {}
+
+    async def publish(self, channel: str, message: str) -> None:
+        for handler in list(self.subscriptions.get(channel, [])):
+            try:
+                await handler(channel, message)
+            except Exception as e:
+                logger.error(f"Error delivering message on {channel}: {e}")
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self.subscriptions.setdefault(channel, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self.subscriptions.get(channel)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self.subscriptions[channel]
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub broker. Each worker holds one pubsub connection and only
+    subscribes to the channels it has local handlers for."""
+
+    def __init__(self, client):
+        self.client = client
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.subscriptions: Dict[str, List[MessageHandler]] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self.subscriptions.setdefault(channel, [])
+        if handler in handlers:
+            return
+        handlers.append(handler)
+        if len(handlers) == 1:
+            await self.pubsub.subscribe(channel)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self.subscriptions.get(channel)
+        if not handlers or handler not in handlers:
+            return
+        handlers.remove(handler)
+        if not handlers:
+            del self.subscriptions[channel]
+            await self.pubsub.unsubscribe(channel)
+
+    async def _listen(self):
+        while not self._closed:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._closed:
+                    break
+                logger.error(f"Redis pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            data = message["data"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            if isinstance(data, bytes):
+                data = data.decode()
+            for handler in list(self.subscriptions.get(channel, [])):
+                try:
+                    await handler(channel, data)
+                except Exception as e:
+                    logger.error(f"Error delivering message on {channel}: {e}")
+
+    async def close(self) -> None:
+        self._closed = True
+        reader, self._reader = self._reader, None
+        if reader is not None:
+            reader.cancel()
+        # Resetting closes the pubsub connection, which also unblocks a pending read
+        await self.pubsub.reset()
+        if reader is not None:
+            await asyncio.gather(reader, return_exceptions=True)
+        self.subscriptions.clear()
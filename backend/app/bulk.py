@@ -0,0 +1,313 @@
+# app/bulk.py
+from collections import Counter, defaultdict
+from typing import AsyncIterator, Dict, List, Set, Tuple, Type, TypeVar
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import Integer, case, delete, exists, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import models, schemas, stats
+from .config import CARD_BATCH_LIMIT
+from .ordering import keys_between
+from .permissions import permissions
+from .search_index import search_index
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+Item = TypeVar("Item", bound=BaseModel)
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batches are limited to {limit} items")
+
+
+async def _body(request: Request, max_size: int) -> AsyncIterator[bytes]:
+    # The request body, failing with 413 as soon as it's more than `max_size`
+    # bytes rather than after buffering it all
+    too_large = HTTPException(status_code=413, detail=f"Batches are limited to {max_size} bytes")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size:
+        raise too_large
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_size:
+            raise too_large
+        yield chunk
+
+
+async def read_batch(request: Request, model: Type[Item], limit: int, max_size: int) -> List[Item]:
+    """Parses a JSON array body, or NDJSON with one item per line, of at most
+    `limit` items and `max_size` bytes.
+
+    NDJSON is validated as it streams in, so an oversized or malformed import
+    fails before the whole body has been buffered.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_TYPES:
+        body = b"".join([chunk async for chunk in _body(request, max_size)])
+        try:
+            items = TypeAdapter(List[model]).validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
+        if len(items) > limit:
+            raise _too_large(limit)
+        return items
+
+    items: List[Item] = []
+    buffer = b""
+
+    def parse(line: bytes):
+        if not line.strip():
+            return
+        if len(items) >= limit:
+            raise _too_large(limit)
+        try:
+            items.append(model.model_validate_json(line))
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            for error in errors:
+                error["loc"] = ("body", len(items) + 1, *error["loc"])
+            raise RequestValidationError(errors)
+
+    async for chunk in _body(request, max_size):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+    parse(buffer)
+    return items
+
+
+async def create_cards(db: AsyncSession, user_id: int, cards: List[schemas.CardCreate]) -> List[models.Card]:
+    """Inserts a batch of cards with a fixed number of round trips: one query to
+    check every list, one for the end of each list, one multi-row
+    INSERT ... RETURNING for the cards, one for their activity rows and one
+    for the list counters."""
+    if not cards:
+        return []
+    list_ids = {card.list_id for card in cards}
+    lists = {
+        row.id: row for row in await db.execute(
+            select(models.List.id, models.List.board_id, models.List.title)
+            .join(models.Board)
+            .where(models.List.id.in_(list_ids), models.Board.owner_id == user_id)
+        )
+    }
+    if len(lists) != len(list_ids):
+        raise HTTPException(status_code=404, detail="List not found or access denied")
+
+    # Cards go to the bottom of their lists, in request order
+    last_keys = dict((await db.execute(
+        select(models.Card.list_id, func.max(models.Card.position))
+        .where(models.Card.list_id.in_(list_ids)).group_by(models.Card.list_id)
+    )).all())
+    counts = Counter(card.list_id for card in cards)
+    keys = {list_id: iter(keys_between(last_keys.get(list_id), None, n)) for list_id, n in counts.items()}
+
+    created = list(await db.scalars(
+        insert(models.Card).returning(models.Card),
+        [
+            {
+                **card.model_dump(),
+                "due_date": stats.naive_utc(card.due_date),
+                "board_id": lists[card.list_id].board_id,
+                "position": next(keys[card.list_id]),
+            }
+            for card in cards
+        ],
+    ))
+    await db.execute(insert(models.Activity), [
+        {
+            "board_id": lists[card.list_id].board_id,
+            "user_id": user_id,
+            "activity_type": "card_created",
+            "details": f"Card '{card.title}' created in list '{lists[card.list_id].title}'",
+            "card_id": card.id,
+            "to_list_id": card.list_id,
+        }
+        for card in created
+    ])
+    await db.run_sync(stats.apply, {}, stats.new_cards(created))
+    await db.commit()
+    search_index.add_new_cards(created, {list_id: row.board_id for list_id, row in lists.items()})
+
+    for card in created:
+        # New cards have nothing attached yet; saves a lazy load per card in the response
+        set_committed_value(card, "labels", [])
+        set_committed_value(card, "checklists", [])
+    return created
+
+
+OPERATION_SUMMARIES = {
+    "move": "moved",
+    "set_due_date": "rescheduled",
+    "add_label": "labelled",
+    "remove_label": "unlabelled",
+    "delete": "deleted",
+}
+
+
+def _summary(counts: Dict[str, int]) -> str:
+    parts = [f"{OPERATION_SUMMARIES[op]} {n} card{'s' if n != 1 else ''}" for op, n in counts.items()]
+    return "Bulk update: " + ", ".join(parts)
+
+
+async def _record_card_events(db: AsyncSession, user_id: int, card_ids: List[int], activity_type: str,
+                              verb: str, to_list_id=None):
+    # One activity row per card, keeping the per-card history analytics reads,
+    # written with a single INSERT ... SELECT from the cards as they are now
+    card = models.Card
+    statement = select(
+        card.board_id, literal(user_id), literal(activity_type),
+        literal("Card '") + card.title + literal(f"' {verb}"),
+        card.id, card.list_id, literal(to_list_id, Integer),
+    ).where(card.id.in_(card_ids))
+    if to_list_id is not None:
+        statement = statement.where(card.list_id != to_list_id)
+    await db.execute(insert(models.Activity).from_select(
+        ["board_id", "user_id", "activity_type", "details", "card_id", "from_list_id", "to_list_id"], statement
+    ))
+
+
+async def _delete_cards(db: AsyncSession, card_ids: List[int]) -> int:
+    # Same effect as deleting each card through the ORM: checklists go with the
+    # card, everything else that points at it is detached
+    checklist_ids = select(models.Checklist.id).where(models.Checklist.card_id.in_(card_ids))
+    await db.execute(delete(models.ChecklistItem).where(models.ChecklistItem.checklist_id.in_(checklist_ids)))
+    await db.execute(delete(models.Checklist).where(models.Checklist.card_id.in_(card_ids)))
+    for model in (models.Label, models.Comment, models.Attachment, models.WebSocketEvent):
+        await db.execute(update(model).where(model.card_id.in_(card_ids)).values(card_id=None))
+    result = await db.execute(delete(models.Card).where(models.Card.id.in_(card_ids)))
+    return result.rowcount
+
+
+async def apply_card_operations(
+    db: AsyncSession, user_id: int, operations: List[schemas.BulkCardOperation]
+) -> Tuple[schemas.BulkCardResult, Dict[int, dict]]:
+    """Applies bulk card operations in order within one transaction.
+
+    Every card and target list is resolved to its board up front, each distinct
+    board is checked once, and each operation is a single set-based statement.
+    Returns the result and, per touched board, a summary to broadcast.
+    """
+    card_ids = {card_id for operation in operations for card_id in operation.card_ids}
+    if len(card_ids) > CARD_BATCH_LIMIT:
+        raise _too_large(CARD_BATCH_LIMIT)
+    list_ids = {operation.list_id for operation in operations if operation.op == "move"}
+
+    card_boards = dict((await db.execute(
+        select(models.Card.id, models.Card.board_id).where(models.Card.id.in_(card_ids))
+    )).all())
+    if len(card_boards) != len(card_ids):
+        raise HTTPException(status_code=404, detail="Card not found")
+    list_boards = dict((await db.execute(
+        select(models.List.id, models.List.board_id).where(models.List.id.in_(list_ids))
+    )).all()) if list_ids else {}
+    if len(list_boards) != len(list_ids):
+        raise HTTPException(status_code=400, detail="Invalid new list ID")
+
+    for board_id in set(card_boards.values()):
+        if not await permissions.is_owner_async(db, user_id, board_id):
+            raise HTTPException(status_code=403, detail="Not authorized to modify these cards")
+
+    # Only moves and deletes change the list counters
+    counted_ids = {
+        card_id for operation in operations if operation.op in ("move", "delete")
+        for card_id in operation.card_ids
+    }
+    counted = models.Card.id.in_(counted_ids)
+    if counted_ids:
+        before = await db.run_sync(stats.snapshot, counted)
+
+    affected: List[int] = []
+    counts: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    touched: Dict[int, Set[int]] = defaultdict(set)
+    deleted: Set[int] = set()
+    for operation in operations:
+        ids = [card_id for card_id in dict.fromkeys(operation.card_ids) if card_id not in deleted]
+        if not ids:
+            # Every card named here was deleted by an earlier operation
+            affected.append(0)
+            continue
+        if operation.op == "move":
+            # Cards only move within their board, as with PUT /cards/{id}/move
+            if any(card_boards[card_id] != list_boards[operation.list_id] for card_id in ids):
+                raise HTTPException(status_code=400, detail="Invalid new list ID")
+            # Moved cards go to the bottom of the list, in request order
+            last = await db.scalar(select(func.max(models.Card.position)).where(
+                models.Card.list_id == operation.list_id, models.Card.id.not_in(ids)
+            ))
+            positions = dict(zip(ids, keys_between(last, None, len(ids))))
+            await _record_card_events(db, user_id, ids, "card_moved", "moved", to_list_id=operation.list_id)
+            result = await db.execute(
+                update(models.Card).where(models.Card.id.in_(ids))
+                .values(list_id=operation.list_id, position=case(positions, value=models.Card.id, else_=models.Card.position))
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.rowcount
+        elif operation.op == "set_due_date":
+            result = await db.execute(
+                update(models.Card).where(models.Card.id.in_(ids)).values(due_date=stats.naive_utc(operation.due_date))
+            )
+            rows = result.rowcount
+        elif operation.op == "add_label":
+            # Skip cards that already carry a label with this name
+            already_labelled = exists().where(
+                models.Label.card_id == models.Card.id, models.Label.name == operation.name
+            )
+            result = await db.execute(insert(models.Label).from_select(
+                ["name", "color", "card_id", "board_id"],
+                select(literal(operation.name), literal(operation.color), models.Card.id, models.Card.board_id)
+                .where(models.Card.id.in_(ids), ~already_labelled),
+            ))
+            rows = result.rowcount
+        elif operation.op == "remove_label":
+            result = await db.execute(
+                delete(models.Label).where(models.Label.card_id.in_(ids), models.Label.name == operation.name)
+            )
+            rows = result.rowcount
+        else:
+            await _record_card_events(db, user_id, ids, "card_deleted", "deleted")
+            rows = await _delete_cards(db, ids)
+            deleted.update(ids)
+        affected.append(rows)
+        for card_id in ids:
+            counts[card_boards[card_id]][operation.op] += 1
+            touched[card_boards[card_id]].add(card_id)
+
+    if counted_ids:
+        await db.run_sync(stats.record, counted, before)
+    # One coalesced activity row per board
+    await db.execute(insert(models.Activity), [
+        {"board_id": board_id, "user_id": user_id, "activity_type": "cards_bulk_updated", "details": _summary(ops)}
+        for board_id, ops in counts.items()
+    ])
+    await db.commit()
+
+    if list_ids or deleted:
+        permissions.invalidate_hierarchy()
+    await db.run_sync(search_index.refresh_cards, sorted(card_ids))
+    changes = {
+        board_id: {"card_ids": sorted(touched[board_id]), "deleted": sorted(touched[board_id] & deleted),
+                   "operations": dict(ops)}
+        for board_id, ops in counts.items()
+    }
+    return schemas.BulkCardResult(affected=affected, board_ids=sorted(counts)), changes
+
+
+def card_batch_body() -> dict:
+    # The body is read by hand to allow NDJSON, so describe it for the OpenAPI docs
+    item = {"$ref": "#/components/schemas/CardCreate"}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": item, "maxItems": CARD_BATCH_LIMIT}},
+                "application/x-ndjson": {"schema": item},
+            },
+        }
+    }
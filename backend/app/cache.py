@@ -0,0 +1,100 @@
+# app/cache.py
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .broker import Broker, publish_from_any_thread
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Safe to use from sync routes running in the threadpool. When a broker is
+    attached, invalidations are published so every worker drops the entry.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._cache_id = uuid.uuid4().hex
+        self._broker: Optional[Broker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def channel(self) -> str:
+        return f"cache-invalidate:{self.name}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] < time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._discard(key)
+        self._publish(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        self._publish(None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _discard(self, key: Optional[Hashable]) -> None:
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    async def attach_broker(self, broker: Broker) -> None:
+        # Share invalidations with the other workers through the broker
+        self._broker = broker
+        self._loop = asyncio.get_running_loop()
+        await broker.subscribe(self.channel, self._on_invalidation)
+
+    async def detach_broker(self) -> None:
+        if self._broker is not None:
+            await self._broker.unsubscribe(self.channel, self._on_invalidation)
+        self._broker = None
+        self._loop = None
+
+    async def _on_invalidation(self, channel: str, data: str) -> None:
+        message = json.loads(data)
+        if message["origin"] == self._cache_id:
+            return
+        key = message["key"]
+        # JSON turns tuple keys into lists
+        self._discard(tuple(key) if isinstance(key, list) else key)
+
+    def _publish(self, key: Optional[Hashable]) -> None:
+        broker, loop = self._broker, self._loop
+        if broker is None or loop is None:
+            return
+        publish_from_any_thread(broker, loop, self.channel, json.dumps({"origin": self._cache_id, "key": key}))
@@ -5,3 +5,95 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
+
+# Authenticated-user cache; shared invalidation goes over Redis when it is available
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_SHARED = os.getenv("USER_CACHE_SHARED", "true").lower() == "true"
+
+# Board permission and ancestry caches, invalidated on member and hierarchy changes
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", 300))
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", 50000))
+
+# Dedicated pool for bcrypt hashing/verification and how many jobs may be in flight
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64))
+
+# Database connection pools. DB_MAX_CONNECTIONS, when set, is the connection budget
+# for the whole deployment and caps each worker's pools to its share of it
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 0))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+# Read replicas for GET endpoints, as comma-separated sync URLs. Users who just
+# wrote read from the primary for REPLICA_STICKY_SECONDS
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", 10))
+
+# Typeahead suggestions: minimum pg_trgm word similarity and the per-user cache of hot prefixes
+SUGGEST_SIMILARITY_THRESHOLD = float(os.getenv("SUGGEST_SIMILARITY_THRESHOLD", 0.5))
+SUGGEST_CACHE_TTL = float(os.getenv("SUGGEST_CACHE_TTL", 30))
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", 10000))
+
+# "database" searches with Postgres FTS (SQLite FTS5 locally); "memory" uses the
+# in-process inverted index in app/search_index.py
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "database")
+
+# Most cards POST /cards/batch accepts in one request (JSON array or NDJSON)
+CARD_BATCH_LIMIT = int(os.getenv("CARD_BATCH_LIMIT", 10000))
+# Largest request body it reads, checked as the body streams in
+CARD_BATCH_MAX_SIZE = int(os.getenv("CARD_BATCH_MAX_SIZE", 32 * 1024 * 1024))
+
+# How often GET /boards/{id}/statistics counters are recounted to repair drift.
+# 0 turns it off
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", 300))
+
+# Computed /boards/{id}/analytics results kept per board until new activity arrives
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", 300))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 1000))
+
+# Where uploaded files are kept. "local" stores them under STORAGE_ROOT, named by
+# the SHA-256 of their content so identical files are stored once
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", "uploads")
+# Largest attachment accepted, enforced while the upload streams in
+ATTACHMENT_MAX_SIZE = int(os.getenv("ATTACHMENT_MAX_SIZE", 25 * 1024 * 1024))
+
+# Resumable uploads (POST /cards/{id}/uploads) for files too big to send in one
+# request. They arrive in UPLOAD_CHUNK_SIZE pieces, and unfinished ones are
+# removed UPLOAD_SESSION_TTL seconds after they start
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.getenv("RESUMABLE_UPLOAD_MAX_SIZE", 2 * 1024 ** 3))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))
+# How often expired upload sessions are cleaned up. 0 turns it off
+UPLOAD_GC_INTERVAL = float(os.getenv("UPLOAD_GC_INTERVAL", 3600))
+
+# Avatars are scaled to these square sizes, as WebP and JPEG, in a pool of
+# AVATAR_WORKERS processes
+AVATAR_SIZES = tuple(int(size) for size in os.getenv("AVATAR_SIZES", "32,64,128,256").split(","))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", 2))
+# Largest avatar upload accepted, and the most pixels one may decode to
+AVATAR_MAX_SIZE = int(os.getenv("AVATAR_MAX_SIZE", 10 * 1024 * 1024))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", 50_000_000))
+
+# Background jobs (app/jobs.py). Workers look for new ones every
+# JOB_POLL_INTERVAL seconds. A running job's lease is renewed every third of
+# JOB_LEASE seconds, so it's only run again elsewhere once its worker has gone
+# quiet for that long. Failures are retried after
+# JOB_BACKOFF_BASE, doubling each time up to JOB_BACKOFF_MAX
+RUN_JOB_WORKERS = os.getenv("RUN_JOB_WORKERS", "true").lower() == "true"
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+JOB_LEASE = float(os.getenv("JOB_LEASE", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 10))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 3600))
+# How long running jobs get to finish on shutdown before they're handed back
+JOB_SHUTDOWN_GRACE = float(os.getenv("JOB_SHUTDOWN_GRACE", 10))
+# Emails sent at once by each worker
+EMAIL_CONCURRENCY = int(os.getenv("EMAIL_CONCURRENCY", 4))
@@ -1,8 +1,19 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
+from .config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS, DB_MAX_CONNECTIONS, WEB_CONCURRENCY
+)
 
 load_dotenv()
 
@@ -10,9 +21,170 @@ load_dotenv()
 db_password = quote_plus(os.getenv('DB_PASSWORD', ''))
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{db_password}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+# Used by async routes; set to sqlite+aiosqlite:///./taskflow.db to run locally without Postgres
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    'ASYNC_DATABASE_URL',
+    f"postgresql+asyncpg://{os.getenv('DB_USER')}:{db_password}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class PoolMetrics:
+    """Checkout wait times and saturation for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait: float, checked_out: int):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+            "peak_saturation": round(self.peak_checked_out / capacity, 3) if capacity else 0.0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class InstrumentedPoolMixin:
+    metrics: PoolMetrics
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# engine name -> (engine, metrics), read by the /db/metrics endpoint
+engines = {}
+
+
+def pool_settings():
+    pool_size, max_overflow = DB_POOL_SIZE, DB_MAX_OVERFLOW
+    if DB_MAX_CONNECTIONS:
+        # Every worker opens a sync and an async engine, so split the budget
+        # across WEB_CONCURRENCY workers times two engines
+        per_engine = max(1, DB_MAX_CONNECTIONS // (max(WEB_CONCURRENCY, 1) * 2))
+        pool_size = min(pool_size, per_engine)
+        max_overflow = max(0, min(max_overflow, per_engine - pool_size))
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def statement_timeout_args(url) -> dict:
+    if not DB_STATEMENT_TIMEOUT_MS or url.get_backend_name() != "postgresql":
+        return {}
+    # Enforced by the server so runaway queries are cancelled even if the client hangs
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+
+def make_engine(url: str, name: str = "primary", is_async: bool = False, **overrides):
+    url = make_url(url)
+    kwargs = {}
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        # In-memory SQLite keeps its single-connection pool
+        kwargs.update(pool_settings())
+        kwargs["poolclass"] = InstrumentedAsyncPool if is_async else InstrumentedQueuePool
+    connect_args = statement_timeout_args(url)
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    kwargs.update(overrides)
+
+    engine = create_async_engine(url, **kwargs) if is_async else create_engine(url, **kwargs)
+    pool = engine.pool
+    metrics = None
+    if isinstance(pool, InstrumentedPoolMixin):
+        metrics = pool.metrics = PoolMetrics(name)
+    engines[name] = (engine, metrics)
+    return engine
+
+
+def get_pool_metrics() -> dict:
+    stats = {}
+    for name, (engine, metrics) in engines.items():
+        if metrics is not None:
+            stats[name] = metrics.snapshot(engine.pool)
+    return stats
+
+
+def async_url(url: str) -> str:
+    # Replicas are configured with sync URLs; async routes need the async driver
+    url = make_url(url)
+    drivers = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return url.set(drivername=drivers.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+
+class RoutingSession(Session):
+    """Session that sends plain reads to `read_engine` when one is set. Flushes
+    and DML go to the primary, and once the session has written every later
+    read does too."""
+
+    read_engine = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.read_engine = None
+        if self.read_engine is not None:
+            return self.read_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL, "primary")
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+async_engine = make_engine(ASYNC_SQLALCHEMY_DATABASE_URL, "primary-async", is_async=True)
+# Objects stay loaded after commit so responses can be built without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -21,4 +193,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_async_sessions() -> async_sessionmaker:
+    # For handlers that outlive a request, like websockets, to open a short
+    # session per lookup instead of holding one open
+    return AsyncSessionLocal
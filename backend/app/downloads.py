@@ -0,0 +1,185 @@
+# app/downloads.py
+"""Serves stored files without reading them into memory.
+
+Handles what clients need to cache and resume large downloads: an ETag and
+Last-Modified for conditional requests (304), and a single byte `Range`
+(206), guarded by `If-Range`. The body goes out as a zero-copy `sendfile`
+when the ASGI server offers one, and otherwise in chunks read off the event
+loop.
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+
+# ASGI extensions: https://asgi.readthedocs.io/en/latest/extensions.html
+ZEROCOPY_SEND = "http.response.zerocopysend"
+PATH_SEND = "http.response.pathsend"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match uses
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The [start, end) of a single `bytes=` range, or None to send the whole
+    file."""
+    unit, _, spec = header.partition("=")
+    # Multiple ranges aren't worth a multipart body: ignoring the header and
+    # answering 200 is always allowed, as it is for one that doesn't parse
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        if not first:
+            # The last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(size - length, 0), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if end <= start:
+        return None
+    return start, min(end, size)
+
+
+class FileDownload(Response):
+    def __init__(
+        self,
+        path: str,
+        filename: str,
+        content_type: Optional[str] = None,
+        etag: Optional[str] = None,
+        stat_result: Optional[os.stat_result] = None,
+        # Access is checked per user by default, so shared caches mustn't keep it
+        cache_control: str = "private, no-cache",
+        inline: bool = False,
+    ):
+        self.path = path
+        self.status_code = 200
+        self.media_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self.background = None
+        stat_result = stat_result or os.stat(path)
+        self.size = stat_result.st_size
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.mtime = int(stat_result.st_mtime)
+        if etag is None:
+            # Files from before content hashing: derive one from the stat
+            etag = hashlib.md5(f"{stat_result.st_mtime}-{self.size}".encode()).hexdigest()
+        self.etag = f'"{etag}"'
+
+        disposition_type = "inline" if inline else "attachment"
+        quoted = quote(filename)
+        if quoted == filename:
+            disposition = f'{disposition_type}; filename="{filename}"'
+        else:
+            disposition = f"{disposition_type}; filename*=utf-8''{quoted}"
+        self.init_headers({
+            "accept-ranges": "bytes",
+            "etag": self.etag,
+            "last-modified": self.last_modified,
+            "cache-control": cache_control,
+            "content-disposition": disposition,
+            # Stored uploads are never sniffed into HTML
+            "x-content-type-options": "nosniff",
+        })
+        self.headers["content-length"] = str(self.size)
+
+    def _not_modified(self, request: Headers) -> bool:
+        if_none_match = request.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, self.etag)
+        if_modified_since = request.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range(self, request: Headers) -> Optional[Tuple[int, int]]:
+        http_range = request.get("range")
+        if not http_range:
+            return None
+        if_range = request.get("if-range")
+        # A range of a file that has changed since would be corrupt, so send
+        # all of it instead. If-Range takes a strong ETag or the exact date
+        if if_range is not None and if_range.strip() not in (self.etag, self.last_modified):
+            return None
+        return _parse_range(http_range, self.size)
+
+    async def _send_body(self, scope: Scope, send: Send, start: int, end: int):
+        extensions = scope.get("extensions") or {}
+        if ZEROCOPY_SEND in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": ZEROCOPY_SEND, "file": f.fileno(), "offset": start, "count": end - start,
+                })
+            return
+        if PATH_SEND in extensions and (start, end) == (0, self.size):
+            await send({"type": PATH_SEND, "path": self.path})
+            return
+        f = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the response cleanly
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        request = Headers(scope=scope)
+        head_only = scope["method"].upper() == "HEAD"
+        status, start, end = 200, 0, self.size
+
+        if self._not_modified(request):
+            status = 304
+            for header in ("content-length", "content-disposition", "content-type"):
+                del self.headers[header]
+        else:
+            try:
+                byte_range = self._range(request)
+            except RangeNotSatisfiable:
+                response = Response(status_code=416, headers={"content-range": f"bytes */{self.size}"})
+                return await response(scope, receive, send)
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+                self.headers["content-range"] = f"bytes {start}-{end - 1}/{self.size}"
+                self.headers["content-length"] = str(end - start)
+
+        await send({"type": "http.response.start", "status": status, "headers": self.raw_headers})
+        if status == 304 or head_only or start == end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            await self._send_body(scope, send, start, end)
@@ -0,0 +1,82 @@
+# app/emails.py
+"""Outgoing email, sent from the job queue so SMTP is never waited on in a
+request and a message survives a worker restart."""
+import logging
+import os
+from typing import List
+
+from dotenv import load_dotenv
+from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+from sqlalchemy import select
+
+from . import models, stats
+from .config import EMAIL_CONCURRENCY
+from .jobs import queue
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+email_config = ConnectionConfig(
+    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
+    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
+    MAIL_FROM=os.getenv("MAIL_FROM"),
+    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
+    MAIL_SERVER=os.getenv("MAIL_SERVER"),
+    MAIL_STARTTLS=True,
+    MAIL_SSL_TLS=False,
+    USE_CREDENTIALS=True,
+    VALIDATE_CERTS=True
+)
+
+fastmail = FastMail(email_config)
+
+
+def send_later(db, subject: str, recipients: List[str], body: str):
+    """Queues a plain-text email, sent once `db` commits. The payload is kept
+    in the jobs table, dead jobs included, so it mustn't hold secrets."""
+    queue.enqueue(db, "email", {"subject": subject, "recipients": recipients, "body": body})
+
+
+@queue.handler("email", concurrency=EMAIL_CONCURRENCY)
+async def send_email(payload: dict):
+    await fastmail.send_message(MessageSchema(**payload, subtype=MessageType.plain))
+
+
+def send_password_reset_later(db, user_id: int):
+    """Queues the password reset email for `user_id`, sent once `db` commits."""
+    # Only the user goes in the job; the link is made from their token when
+    # it's sent, so a token never sits in the queue
+    queue.enqueue(db, "password_reset_email", {"user_id": user_id})
+
+
+@queue.handler("password_reset_email", concurrency=EMAIL_CONCURRENCY)
+async def send_password_reset(payload: dict):
+    async with queue.sessions() as db:
+        user = (await db.execute(
+            select(models.User.username, models.User.email, models.User.password_reset_token).where(
+                models.User.id == payload["user_id"],
+                models.User.password_reset_expires > stats.utcnow(),
+            )
+        )).first()
+    if user is None or user.password_reset_token is None:
+        # Used, expired or the user is gone: nothing worth sending
+        logger.info(f"Password reset for user {payload['user_id']} no longer pending; not sent")
+        return
+    reset_url = f"{os.getenv('FRONTEND_URL')}/reset-password/{user.password_reset_token}"
+    await fastmail.send_message(MessageSchema(
+        subject="Password Reset Request",
+        recipients=[user.email],
+        body=f"""
+        Hi {user.username},
+
+        You requested to reset your password. Click the link below to reset it:
+
+        {reset_url}
+
+        This link will expire in 1 hour.
+
+        If you didn't request this, please ignore this email.
+        """,
+        subtype=MessageType.plain,
+    ))
@@ -0,0 +1,25 @@
+# app/hierarchy.py
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def move_cards_to_board(db: Session, card_filter, board_id: int):
+    """Points the cards matching `card_filter`, with their labels, checklists and
+    checklist items, at `board_id`.
+
+    Keeps the denormalized board_id columns in step when a card or a whole list
+    changes board: four set-based UPDATEs however many rows are involved.
+    """
+    card_ids = select(models.Card.id).where(card_filter)
+    checklist_ids = select(models.Checklist.id).where(models.Checklist.card_id.in_(card_ids))
+    statements = [
+        update(models.ChecklistItem).where(models.ChecklistItem.checklist_id.in_(checklist_ids)),
+        update(models.Checklist).where(models.Checklist.card_id.in_(card_ids)),
+        update(models.Label).where(models.Label.card_id.in_(card_ids)),
+        # Cards last, in case the filter is on board_id itself
+        update(models.Card).where(card_filter),
+    ]
+    for statement in statements:
+        db.execute(statement.values(board_id=board_id).execution_options(synchronize_session=False))
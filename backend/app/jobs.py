@@ -0,0 +1,299 @@
+# app/jobs.py
+"""A durable job queue in the database.
+
+Work that shouldn't hold up a request, or be lost when the worker handling
+it restarts, is saved as a row in `jobs` in the same transaction as the
+change that called for it. Each app worker polls for every registered kind
+of job, claims due ones with `SELECT ... FOR UPDATE SKIP LOCKED` so workers
+never wait on each other (SQLite has one writer at a time, so the claiming
+UPDATE alone is enough there), and runs at most the kind's concurrency at
+once.
+
+A claimed job is leased for JOB_LEASE seconds, and its worker renews the
+lease while the handler runs. If the worker dies the job is claimed again
+once the lease runs out, so handlers must be safe to run twice. Each claim
+is told apart by its attempt number, so a worker whose lease was taken over
+can't finish or requeue the newer claim. Failures are retried with
+exponential backoff, and a job that has failed, or lost its worker,
+`max_attempts` times is kept as dead rather than retried forever.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from .config import (
+    JOB_BACKOFF_BASE, JOB_BACKOFF_MAX, JOB_LEASE, JOB_MAX_ATTEMPTS, JOB_POLL_INTERVAL, JOB_SHUTDOWN_GRACE
+)
+from .models import JobStatus
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class JobKind(NamedTuple):
+    handler: Handler
+    # Jobs of this kind run at once, per worker process
+    concurrency: int
+    max_attempts: int
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+def backoff(attempts: int) -> float:
+    # Jittered, so jobs that failed together don't all retry together
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    def __init__(self):
+        self.kinds: Dict[str, JobKind] = {}
+        # Where workers and handlers get database sessions; set by start()
+        self.sessions: Optional[async_sessionmaker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Dict[str, asyncio.Event] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._pollers: List[asyncio.Task] = []
+
+    def handler(self, kind: str, concurrency: int = 1, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """Registers the decorated coroutine as the handler for `kind`. It gets
+        the job's payload; raising fails the attempt."""
+        def register(handler: Handler) -> Handler:
+            self.kinds[kind] = JobKind(handler, concurrency, max_attempts)
+            return handler
+        return register
+
+    def enqueue(self, db, kind: str, payload: dict, delay: float = 0) -> models.Job:
+        """Adds a job to `db`, a sync or async session; it's queued when the
+        caller commits."""
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = models.Job(
+            kind=kind,
+            payload=payload,
+            max_attempts=self.kinds[kind].max_attempts,
+            run_at=_now() + timedelta(seconds=delay),
+        )
+        db.add(job)
+        if not delay:
+            # Start it straight away if this worker is free, rather than at the next poll
+            session = getattr(db, "sync_session", db)
+            event.listen(session, "after_commit", lambda session: self.wake(kind), once=True)
+        return job
+
+    def wake(self, kind: str):
+        # Callable from any thread, e.g. a sync route's
+        if self._loop is not None and kind in self._wake:
+            self._loop.call_soon_threadsafe(self._wake[kind].set)
+
+    # Claiming and running
+
+    @staticmethod
+    def _held(job: ClaimedJob):
+        # The row as `job` claimed it, not since re-claimed, finished or released
+        return (
+            (models.Job.id == job.id)
+            & (models.Job.status == JobStatus.RUNNING.value)
+            & (models.Job.attempts == job.attempts)
+        )
+
+    async def _claim(self, kind: str, limit: int) -> List[ClaimedJob]:
+        now = _now()
+        # Running jobs come due again when their lease runs out
+        due_again = (
+            (models.Job.kind == kind)
+            & models.Job.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value])
+            & (models.Job.run_at <= now)
+        )
+        due = (
+            select(models.Job.id)
+            .where(due_again, models.Job.attempts < models.Job.max_attempts)
+            .order_by(models.Job.run_at, models.Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.sessions() as db:
+            # Ones whose worker died on their last attempt, e.g. because the
+            # job itself crashes it, aren't tried again
+            lost = await db.execute(
+                update(models.Job)
+                .where(due_again, models.Job.attempts >= models.Job.max_attempts)
+                .values(status=JobStatus.DEAD.value, last_error="Worker lost while running the last attempt")
+                .execution_options(synchronize_session=False)
+            )
+            if lost.rowcount:
+                logger.error(f"{lost.rowcount} {kind} jobs lost their worker on every attempt; giving up")
+            rows = (await db.execute(
+                update(models.Job)
+                .where(models.Job.id.in_(due))
+                .values(
+                    status=JobStatus.RUNNING.value,
+                    attempts=models.Job.attempts + 1,
+                    run_at=now + timedelta(seconds=JOB_LEASE),
+                )
+                .returning(models.Job.id, models.Job.payload, models.Job.attempts, models.Job.max_attempts)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        return [ClaimedJob(row.id, kind, row.payload, row.attempts, row.max_attempts) for row in rows]
+
+    async def _finish(self, job: ClaimedJob, error: Optional[str]):
+        held = self._held(job)
+        async with self.sessions() as db:
+            if error is None:
+                statement = delete(models.Job).where(held)
+            elif job.attempts >= job.max_attempts:
+                logger.error(f"Job {job.id} ({job.kind}) failed {job.attempts} times; giving up")
+                statement = update(models.Job).where(held).values(status=JobStatus.DEAD.value, last_error=error)
+            else:
+                statement = update(models.Job).where(held).values(
+                    status=JobStatus.QUEUED.value,
+                    run_at=_now() + timedelta(seconds=backoff(job.attempts)),
+                    last_error=error,
+                )
+            result = await db.execute(statement.execution_options(synchronize_session=False))
+            await db.commit()
+        if not result.rowcount:
+            logger.warning(f"Job {job.id} ({job.kind}) ran past its lease and was claimed again; result dropped")
+
+    async def _release(self, job: ClaimedJob):
+        # Interrupted by shutdown: hand it straight back, without counting the attempt
+        async with self.sessions() as db:
+            await db.execute(
+                update(models.Job).where(self._held(job))
+                .values(status=JobStatus.QUEUED.value, attempts=models.Job.attempts - 1, run_at=_now())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def _heartbeat(self, job: ClaimedJob):
+        # Keeps the lease from running out under a handler that's still going
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                async with self.sessions() as db:
+                    result = await db.execute(
+                        update(models.Job).where(self._held(job))
+                        .values(run_at=_now() + timedelta(seconds=JOB_LEASE))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception:
+                # Try again next beat; the lease has a while left
+                logger.exception(f"Could not renew the lease on job {job.id} ({job.kind})")
+                continue
+            if not result.rowcount:
+                logger.warning(f"Job {job.id} ({job.kind}) lost its lease while running")
+                return
+
+    async def _run(self, job: ClaimedJob):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self.kinds[job.kind].handler(job.payload)
+            error = None
+        except asyncio.CancelledError:
+            heartbeat.cancel()
+            await self._release(job)
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.kind}) failed, attempt {job.attempts} of {job.max_attempts}")
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat.cancel()
+        await self._finish(job, error)
+
+    async def run_pending(self, kind: Optional[str] = None) -> int:
+        """Runs every job that's due now, of one kind or all, and returns how
+        many ran. For tests and scripts; workers use start()."""
+        ran = 0
+        for name in [kind] if kind else list(self.kinds):
+            while claimed := await self._claim(name, self.kinds[name].concurrency):
+                await asyncio.gather(*(self._run(job) for job in claimed))
+                ran += len(claimed)
+        return ran
+
+    async def _poll(self, kind: str):
+        spec, wake = self.kinds[kind], self._wake[kind]
+        running: Set[asyncio.Task] = set()
+
+        def done(task: asyncio.Task):
+            running.discard(task)
+            self._running.discard(task)
+            # A free slot: look for more
+            wake.set()
+
+        while True:
+            # Cleared first, so a wake-up while claiming isn't missed
+            wake.clear()
+            free = spec.concurrency - len(running)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await self._claim(kind, free)
+                except Exception:
+                    logger.exception(f"Could not claim {kind} jobs")
+            for job in claimed:
+                task = asyncio.create_task(self._run(job))
+                running.add(task)
+                self._running.add(task)
+                task.add_done_callback(done)
+            if claimed and len(claimed) == free:
+                # Maybe more waiting; go again once a slot frees up
+                await wake.wait()
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, sessions: async_sessionmaker):
+        self.sessions = sessions
+        self._loop = asyncio.get_running_loop()
+        for kind in self.kinds:
+            self._wake[kind] = asyncio.Event()
+            self._pollers.append(asyncio.create_task(self._poll(kind)))
+
+    async def stop(self, grace: float = JOB_SHUTDOWN_GRACE):
+        for poller in self._pollers:
+            poller.cancel()
+        await asyncio.gather(*self._pollers, return_exceptions=True)
+        self._pollers = []
+        # Let running jobs finish; the ones that don't are handed back
+        running = set(self._running)
+        if running:
+            _, unfinished = await asyncio.wait(running, timeout=grace)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        self._loop = None
+        self._wake = {}
+
+    async def metrics(self, db: AsyncSession) -> dict:
+        rows = (await db.execute(
+            select(models.Job.kind, models.Job.status, func.count(), func.min(models.Job.created_at))
+            .group_by(models.Job.kind, models.Job.status)
+        )).all()
+        metrics = {kind: {} for kind in self.kinds}
+        for kind, status, count, oldest in rows:
+            metrics.setdefault(kind, {})[status] = {"count": count, "oldest": oldest}
+        return metrics
+
+
+queue = JobQueue()
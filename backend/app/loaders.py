@@ -0,0 +1,48 @@
+# app/loaders.py
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from . import models
+
+
+def board_snapshot_options():
+    # Eager-load the whole board tree with one SELECT ... IN per level, so the
+    # number of queries stays fixed no matter how many lists or cards exist
+    cards = selectinload(models.Board.lists).selectinload(models.List.cards)
+    return [
+        cards.selectinload(models.Card.labels),
+        cards.selectinload(models.Card.checklists).selectinload(models.Checklist.items),
+    ]
+
+
+def card_options():
+    return [
+        selectinload(models.Card.labels),
+        selectinload(models.Card.checklists).selectinload(models.Checklist.items),
+    ]
+
+
+def checklist_options():
+    return [selectinload(models.Checklist.items)]
+
+
+def load_board_snapshot(db: Session, board_id: int) -> Optional[models.Board]:
+    return (
+        db.query(models.Board)
+        .options(*board_snapshot_options())
+        .filter(models.Board.id == board_id)
+        .first()
+    )
+
+
+async def reload(db: AsyncSession, model, object_id: int, *options):
+    # AsyncSession cannot lazy-load while a response is serialised, so re-select
+    # after a write to pick up server defaults and the relationships it needs
+    result = await db.execute(
+        select(model)
+        .options(*options)
+        .where(model.id == object_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
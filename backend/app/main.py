@@ -1,12 +1,24 @@
 # main.py
 import os
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, get_db
+from .database import engine, async_engine, get_db, SessionLocal, AsyncSessionLocal
 from . import models
 from .routes import router
+from .websocket import manager
+from .broker import RedisBroker
+from .auth import user_cache
+from .permissions import permissions
+from .replicas import replica_router
+from .search_index import search_index
+from .stats import reconcile_periodically
+from .upload_sessions import collect_periodically
+from .avatars import processor as avatar_processor
+from .jobs import queue as job_queue
+from .config import USER_CACHE_SHARED, STATS_RECONCILE_INTERVAL, UPLOAD_GC_INTERVAL, RUN_JOB_WORKERS
 from .exceptions import (
     NotFoundException, 
     ForbiddenException, 
@@ -31,31 +43,6 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 models.Base.metadata.create_all(bind=engine)
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.socket_users: Dict[WebSocket, int] = {}
-
-    async def connect(self, websocket: WebSocket, card_id: int, user_id: int):
-        await websocket.accept()
-        if card_id not in self.active_connections:
-            self.active_connections[card_id] = []
-        self.active_connections[card_id].append(websocket)
-        self.socket_users[websocket] = user_id
-
-    async def disconnect(self, websocket: WebSocket, card_id: int):
-        if card_id in self.active_connections:
-            self.active_connections[card_id].remove(websocket)
-
-    async def broadcast(self, message: dict, card_id: int):
-        if card_id in self.active_connections:
-            for connection in self.active_connections[card_id]:
-                await connection.send_json(message)
-
-manager = ConnectionManager()
-
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -64,16 +51,60 @@ async def lifespan(app: FastAPI):
         r = await redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
         await r.ping()  # Test the connection
         await FastAPILimiter.init(r)
+        # Fan WebSocket broadcasts out to every worker through Redis pub/sub
+        manager.broker = RedisBroker(r)
+        if USER_CACHE_SHARED:
+            # Keep every worker's user cache consistent
+            await user_cache.attach_broker(manager.broker)
+        # Membership and hierarchy changes must reach every worker's permission cache
+        for cache in permissions.caches():
+            await cache.attach_broker(manager.broker)
+        if search_index.enabled:
+            # Index updates made by other workers
+            await search_index.attach_broker(manager.broker)
         app.state.use_redis = True
         logger.info("Connected to Redis successfully")
     except (RedisConnectionError, OSError):
         logger.warning("Failed to connect to Redis. Rate limiting is disabled.")
         app.state.use_redis = False
+    # Health-checks replicas and shares read-your-writes windows between workers
+    await replica_router.start(manager.broker if app.state.use_redis else None)
+    if search_index.enabled:
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(search_index.rebuild, db)
+        finally:
+            db.close()
+    # Repairs any drifted statistics
+    stats_task = None
+    if STATS_RECONCILE_INTERVAL > 0:
+        stats_task = asyncio.create_task(reconcile_periodically(SessionLocal, STATS_RECONCILE_INTERVAL))
+    # Removes resumable uploads that were abandoned part way
+    uploads_task = None
+    if UPLOAD_GC_INTERVAL > 0:
+        uploads_task = asyncio.create_task(collect_periodically(SessionLocal, UPLOAD_GC_INTERVAL))
+    # Emails and thumbnails, from the jobs table
+    if RUN_JOB_WORKERS:
+        await job_queue.start(AsyncSessionLocal)
     
     yield
     
+    for task in (stats_task, uploads_task):
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    await job_queue.stop()
+    avatar_processor.shutdown()
+    await replica_router.stop()
+    
     if app.state.use_redis:
+        await user_cache.detach_broker()
+        for cache in permissions.caches():
+            await cache.detach_broker()
+        await search_index.detach_broker()
+        await manager.broker.close()
         await FastAPILimiter.close()
+    await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -84,6 +115,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(router)
@@ -126,6 +158,14 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Response: {response.status_code}")
     return response
 
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    response = await call_next(request)
+    # Keep this client on the primary for a moment so it reads its own writes
+    if replica_router.replicas and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        await replica_router.record_write(request)
+    return response
+
 async def rate_limit_if_redis():
     if app.state.use_redis:
         await RateLimiter(times=2, seconds=5)
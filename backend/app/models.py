@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, DateTime, Enum, JSON
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, ForeignKey, DateTime, Enum, JSON, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -16,10 +16,19 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     password_reset_token = Column(String, unique=True, nullable=True)
     password_reset_expires = Column(DateTime, nullable=True)
+    # SHA-256 of the avatar photo whose thumbnails are served, and of one still
+    # being processed
+    avatar_key = Column(String(64), nullable=True)
+    avatar_pending = Column(String(64), nullable=True)
     boards = relationship("Board", back_populates="owner")
     activities = relationship("Activity", back_populates="user")
     templates = relationship("BoardTemplate", back_populates="creator")
 
+    @property
+    def avatar_url(self):
+        # Thumbnails are under it as <size>.webp and <size>.jpg
+        return f"/avatars/{self.avatar_key}" if self.avatar_key else None
+
 class Board(Base):
     __tablename__ = "boards"
 
@@ -30,7 +39,7 @@ class Board(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     owner = relationship("User", back_populates="boards")
-    lists = relationship("List", back_populates="board", cascade="all, delete-orphan")
+    lists = relationship("List", back_populates="board", cascade="all, delete-orphan", order_by="[List.position, List.id]")
     activities = relationship("Activity", back_populates="board")
 
 class List(Base):
@@ -39,11 +48,33 @@ class List(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     board_id = Column(Integer, ForeignKey("boards.id"))
+    # Fractional-index key, see app/ordering.py
+    position = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     board = relationship("Board", back_populates="lists")
-    cards = relationship("Card", back_populates="list", cascade="all, delete-orphan")
+    cards = relationship("Card", back_populates="list", cascade="all, delete-orphan", order_by="[Card.position, Card.id]")
+
+class ListStatistics(Base):
+    """Counters for one list, kept up to date by app/stats.py."""
+    __tablename__ = "list_statistics"
+
+    list_id = Column(Integer, ForeignKey("lists.id", ondelete="CASCADE"), primary_key=True)
+    card_count = Column(Integer, nullable=False, default=0, server_default="0")
+    checklist_items = Column(Integer, nullable=False, default=0, server_default="0")
+    checklist_items_done = Column(Integer, nullable=False, default=0, server_default="0")
+
+@event.listens_for(List, "after_insert")
+def create_list_statistics(mapper, connection, target):
+    # Every list has its counters row from the start, in the same transaction
+    connection.execute(ListStatistics.__table__.insert().values(list_id=target.id))
+
+@event.listens_for(List, "after_delete")
+def delete_list_statistics(mapper, connection, target):
+    # Postgres cascades this itself; SQLite doesn't enforce foreign keys
+    table = ListStatistics.__table__
+    connection.execute(table.delete().where(table.c.list_id == target.id))
 
 class Card(Base):
     __tablename__ = "cards"
@@ -52,6 +83,9 @@ class Card(Base):
     title = Column(String, index=True)
     description = Column(String)
     list_id = Column(Integer, ForeignKey("lists.id"))
+    # Copy of list.board_id so access checks and board reads skip the join
+    board_id = Column(Integer, ForeignKey("boards.id", ondelete="CASCADE"))
+    position = Column(String)
     due_date = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -64,7 +98,9 @@ class ActivityType(str, PyEnum):
     CARD_CREATED = "card_created"
     CARD_MOVED = "card_moved"
     CARD_ARCHIVED = "card_archived"
+    CARD_DELETED = "card_deleted"
     LIST_CREATED = "list_created"
+    CARDS_BULK_UPDATED = "cards_bulk_updated"
     
 class Activity(Base):
     __tablename__ = "activities"
@@ -74,6 +110,11 @@ class Activity(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     activity_type = Column(String)  
     details = Column(String)
+    # Card events say which card went from which list to which; no foreign keys,
+    # as the history outlives the cards and lists (see app/analytics.py)
+    card_id = Column(Integer, nullable=True)
+    from_list_id = Column(Integer, nullable=True)
+    to_list_id = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     board = relationship("Board", back_populates="activities")
@@ -86,6 +127,7 @@ class Label(Base):
     name = Column(String)
     color = Column(String)
     card_id = Column(Integer, ForeignKey("cards.id"))
+    board_id = Column(Integer, ForeignKey("boards.id", ondelete="CASCADE"))
     type = Column(String, nullable=True)
     card = relationship("Card", back_populates="labels")
     description = Column(String, nullable=True)
@@ -95,12 +137,55 @@ class Attachment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String)
+    # Storage location; uploads from before content addressing have their own path
     file_path = Column(String)
+    size = Column(BigInteger, nullable=True)
+    # Content hash and storage key, shared by every attachment with the same bytes
+    sha256 = Column(String(64), nullable=True, index=True)
+    content_type = Column(String, nullable=True)
     card_id = Column(Integer, ForeignKey("cards.id"))
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
     card = relationship("Card", back_populates="attachments")
 
+class UploadSession(Base):
+    """A resumable upload in progress. Its chunks are held by storage until it
+    is completed or expires."""
+    __tablename__ = "upload_sessions"
+
+    # Random, and what the client addresses the upload by
+    id = Column(String(43), primary_key=True)
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class JobStatus(str, PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    # Failed every attempt; kept for someone to look at
+    DEAD = "dead"
+
+class Job(Base):
+    """Background work, run by app/jobs.py. Deleted once it succeeds."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default=JobStatus.QUEUED.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # When it may next be claimed: after its backoff while queued, and when
+    # its lease runs out while running
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class BoardTemplate(Base):
     __tablename__ = "board_templates"
 
@@ -161,12 +246,13 @@ class Checklist(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     card_id = Column(Integer, ForeignKey("cards.id"))
-    position = Column(Integer, default=0)
+    board_id = Column(Integer, ForeignKey("boards.id", ondelete="CASCADE"))
+    position = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     card = relationship("Card", back_populates="checklists")
-    items = relationship("ChecklistItem", back_populates="checklist", cascade="all, delete-orphan")
+    items = relationship("ChecklistItem", back_populates="checklist", cascade="all, delete-orphan", order_by="[ChecklistItem.position, ChecklistItem.id]")
 
 class ChecklistItem(Base):
     __tablename__ = "checklist_items"
@@ -174,15 +260,16 @@ class ChecklistItem(Base):
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String)
     completed = Column(Boolean, default=False)
-    position = Column(Integer, default=0)
+    position = Column(String)
     checklist_id = Column(Integer, ForeignKey("checklists.id"))
+    board_id = Column(Integer, ForeignKey("boards.id", ondelete="CASCADE"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     checklist = relationship("Checklist", back_populates="items")
 
 # Update the Card model to include the relationship
-Card.checklists = relationship("Checklist", back_populates="card", cascade="all, delete-orphan")    
+Card.checklists = relationship("Checklist", back_populates="card", cascade="all, delete-orphan", order_by=[Checklist.position, Checklist.id])    
 
 # Update Board and User models
 Board.members = relationship("BoardMember", back_populates="board")
@@ -205,4 +292,27 @@ class WebSocketEvent(Base):
 
 # Update Card and User models to include the new relationship
 Card.websocket_events = relationship("WebSocketEvent", back_populates="card")
-User.websocket_events = relationship("WebSocketEvent", back_populates="user")
\ No newline at end of file
+User.websocket_events = relationship("WebSocketEvent", back_populates="user")
+
+# Keyset pagination walks these in (created_at, id) order
+Index("ix_boards_created_at_id", Board.created_at, Board.id)
+Index("ix_lists_created_at_id", List.created_at, List.id)
+Index("ix_cards_created_at_id", Card.created_at, Card.id)
+Index("ix_activities_board_id_created_at_id", Activity.board_id, Activity.created_at, Activity.id)
+Index("ix_activities_card_id", Activity.card_id)
+
+# Siblings in display order, for reads and for finding a move's neighbours
+Index("ix_lists_board_id_position", List.board_id, List.position)
+Index("ix_cards_list_id_position", Card.list_id, Card.position)
+Index("ix_checklists_card_id_position", Checklist.card_id, Checklist.position)
+Index("ix_checklist_items_checklist_id_position", ChecklistItem.checklist_id, ChecklistItem.position)
+
+# Board-scoped reads on the denormalized board_id
+Index("ix_cards_board_id_list_id", Card.board_id, Card.list_id)
+Index("ix_labels_board_id_name", Label.board_id, Label.name)
+
+# Overdue cards per list, counted when statistics are read
+Index("ix_cards_list_id_due_date", Card.list_id, Card.due_date)
+
+# Workers claim the earliest due jobs of a kind
+Index("ix_jobs_kind_status_run_at", Job.kind, Job.status, Job.run_at)
@@ -0,0 +1,139 @@
+# app/ordering.py
+"""Fractional-index ordering keys for lists, cards, checklists and items.
+
+A key is a base-36 fraction written without the leading "0.", so keys sort
+lexicographically. There is always room for a new key between two others,
+so a reorder writes only the row that moved. Lowercase digits and letters
+sort the same under C and the usual locale collations.
+"""
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+# Keys grow about one character per five inserts at the same spot; past this
+# the siblings are respaced
+MAX_KEY_LENGTH = 24
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    if high is not None:
+        # Keep the shared prefix, padding `low` with zeros
+        n = 0
+        while n < len(high) and (low[n] if n < len(low) else "0") == high[n]:
+            n += 1
+        if n:
+            return high[:n] + _midpoint(low[n:], high[n:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high is None and low and low_digit + 1 < BASE:
+        # Appending steps by one digit instead of halving, so keys at the end
+        # of a list grow a character every couple of dozen appends, not every five
+        return DIGITS[low_digit + 1]
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def key_between(low: Optional[str], high: Optional[str]) -> str:
+    """A key strictly between `low` and `high`; None means an open end."""
+    if low is not None and high is not None and low >= high:
+        raise ValueError(f"{low!r} is not before {high!r}")
+    return _midpoint(low or "", high)
+
+
+def spread_keys(count: int) -> List[str]:
+    """`count` short, evenly spaced keys, leaving room on every side."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    width += 1
+    span = BASE ** width
+    keys = []
+    for i in range(count):
+        value = (i + 1) * span // (count + 1)
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits = DIGITS[digit] + digits
+        keys.append(digits.rstrip("0"))
+    return keys
+
+
+def _siblings(model, parent: str, parent_id, exclude_id):
+    statement = select(model).where(getattr(model, parent) == parent_id)
+    if exclude_id is not None:
+        statement = statement.where(model.id != exclude_id)
+    return statement
+
+
+def rebalance(db: Session, model, parent: str, parent_id, exclude_id=None):
+    # Rewrites every sibling's key, so only used when keys get long or collide
+    siblings = db.scalars(
+        _siblings(model, parent, parent_id, exclude_id).order_by(model.position, model.id)
+    ).all()
+    for sibling, key in zip(siblings, spread_keys(len(siblings))):
+        sibling.position = key
+    db.flush()
+
+
+def _neighbour(db: Session, model, parent: str, parent_id, item, sibling_id: int):
+    sibling = db.get(model, sibling_id)
+    if sibling is None or getattr(sibling, parent) != parent_id or sibling.id == item.id:
+        raise HTTPException(status_code=400, detail=f"Invalid position: {sibling_id} is not a sibling")
+    return sibling.position
+
+
+def _bounds(db: Session, model, parent: str, item, before_id: Optional[int], after_id: Optional[int]):
+    parent_id = getattr(item, parent)
+    siblings = _siblings(model, parent, parent_id, item.id).with_only_columns
+    if after_id is not None and before_id is not None:
+        low = _neighbour(db, model, parent, parent_id, item, after_id)
+        high = _neighbour(db, model, parent, parent_id, item, before_id)
+        if low >= high:
+            raise HTTPException(status_code=400, detail=f"Invalid position: {after_id} is not before {before_id}")
+        return low, high
+    if after_id is not None:
+        low = _neighbour(db, model, parent, parent_id, item, after_id)
+        high = db.scalar(siblings(func.min(model.position)).where(model.position > low))
+        return low, high
+    if before_id is not None:
+        high = _neighbour(db, model, parent, parent_id, item, before_id)
+        low = db.scalar(siblings(func.max(model.position)).where(model.position < high))
+        return low, high
+    # Append at the end
+    return db.scalar(siblings(func.max(model.position))), None
+
+
+def place(db: Session, item, parent: str, before_id: Optional[int] = None, after_id: Optional[int] = None) -> str:
+    """Gives `item` a key among the rows sharing its `parent` column value:
+    right after `after_id`, right before `before_id`, or last when neither is
+    given. Only `item` is written unless the siblings need respacing."""
+    model = type(item)
+    key = key_between(*_bounds(db, model, parent, item, before_id, after_id))
+    if len(key) > MAX_KEY_LENGTH:
+        rebalance(db, model, parent, getattr(item, parent), exclude_id=item.id)
+        key = key_between(*_bounds(db, model, parent, item, before_id, after_id))
+    item.position = key
+    return key
+
+
+async def place_async(db: AsyncSession, item, parent: str, before_id: Optional[int] = None,
+                      after_id: Optional[int] = None) -> str:
+    return await db.run_sync(lambda session: place(session, item, parent, before_id, after_id))
+
+
+def keys_between(low: Optional[str], high: Optional[str], count: int) -> List[str]:
+    """`count` ordered keys between `low` and `high`, for batch inserts.
+    Bisecting keeps them about log(count) characters long."""
+    if count <= 0:
+        return []
+    middle = key_between(low, high)
+    before = count // 2
+    return keys_between(low, middle, before) + [middle] + keys_between(middle, high, count - before - 1)
@@ -0,0 +1,94 @@
+# app/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import literal, select, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.types import NullType
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: Optional[datetime], object_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, object_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        created_at, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(object_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page cursor")
+
+
+class CursorPage:
+    """Keyset pagination over (created_at, id) for list endpoints.
+
+    The page is returned as the response body; the cursor for the next page,
+    if there is one, goes in the X-Next-Cursor header like /search.
+    """
+
+    def __init__(self, response: Response, limit: int, cursor: Optional[str] = None, descending: bool = False):
+        self.response = response
+        self.limit = limit
+        self.cursor = cursor
+        self.descending = descending
+
+    def _anchor_query(self, model):
+        # The anchor row's timestamp exactly as stored, with no type processing
+        # either way, since SQLite keeps CURRENT_TIMESTAMP as text without
+        # microseconds and a bound datetime never equals it
+        _, object_id = decode_cursor(self.cursor)
+        return select(type_coerce(model.created_at, NullType())).where(model.id == object_id)
+
+    def _apply(self, statement, model, stored):
+        if self.cursor:
+            created_at, object_id = decode_cursor(self.cursor)
+            # The cursor's copy of the timestamp covers deleted anchor rows
+            anchor = literal(stored, NullType()) if stored is not None else literal(created_at, model.created_at.type)
+            # A row-value comparison, which the (created_at, id) indexes can
+            # seek to directly; the equivalent OR of two conditions can't
+            key, after = tuple_(model.created_at, model.id), tuple_(anchor, literal(object_id))
+            statement = statement.where(key < after if self.descending else key > after)
+        if self.descending:
+            statement = statement.order_by(model.created_at.desc(), model.id.desc())
+        else:
+            statement = statement.order_by(model.created_at, model.id)
+        # One extra row tells us whether there is a next page
+        return statement.limit(self.limit + 1)
+
+    def apply(self, db: Session, statement, model):
+        """Limits and orders `statement` to this page of `model` rows, looking up
+        the cursor's anchor row first."""
+        stored = db.scalar(self._anchor_query(model)) if self.cursor else None
+        return self._apply(statement, model, stored)
+
+    async def apply_async(self, db: AsyncSession, statement, model):
+        stored = await db.scalar(self._anchor_query(model)) if self.cursor else None
+        return self._apply(statement, model, stored)
+
+    def page(self, rows: Sequence):
+        rows = list(rows)
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            self.response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+        return rows
+
+
+def cursor_page(default_limit: int = 50, descending: bool = False):
+    """Dependency factory so each endpoint keeps its own default page size."""
+
+    def dependency(
+        response: Response,
+        limit: int = Query(default_limit, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+    ) -> CursorPage:
+        return CursorPage(response, limit, cursor, descending)
+
+    return dependency
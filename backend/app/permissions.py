@@ -0,0 +1,160 @@
+# app/permissions.py
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .models import PermissionLevel
+from .cache import TTLCache
+from .config import PERMISSION_CACHE_TTL, PERMISSION_CACHE_SIZE
+
+PERMISSION_RANK = {
+    PermissionLevel.VIEW: 1,
+    PermissionLevel.EDIT: 2,
+    PermissionLevel.ADMIN: 3,
+}
+
+# Cached for users with no membership, so repeated denials stay cheap too
+NO_MEMBERSHIP = ""
+
+
+class PermissionService:
+    """Resolves board access for a user and maps cards, lists, checklists,
+    checklist items and labels to their board, caching both so access checks
+    do not re-join the board hierarchy on every request."""
+
+    def __init__(self, maxsize: int = PERMISSION_CACHE_SIZE, ttl: float = PERMISSION_CACHE_TTL):
+        # board_id -> owner_id
+        self.owners = TTLCache("board-owners", maxsize=maxsize, ttl=ttl)
+        # (user_id, board_id) -> PermissionLevel or NO_MEMBERSHIP
+        self.memberships = TTLCache("board-memberships", maxsize=maxsize, ttl=ttl)
+        # (kind, id) -> board_id
+        self.ancestry = TTLCache("board-ancestry", maxsize=maxsize, ttl=ttl)
+
+    def caches(self):
+        return [self.owners, self.memberships, self.ancestry]
+
+    def clear(self):
+        for cache in self.caches():
+            cache.clear()
+
+    # Board access
+
+    def get_board_owner(self, db: Session, board_id: int) -> Optional[int]:
+        owner_id = self.owners.get(board_id)
+        if owner_id is None:
+            row = db.query(models.Board.owner_id).filter(models.Board.id == board_id).first()
+            if row is None:
+                return None
+            owner_id = row.owner_id
+            self.owners.set(board_id, owner_id)
+        return owner_id
+
+    def is_owner(self, db: Session, user_id: int, board_id: Optional[int]) -> bool:
+        return board_id is not None and self.get_board_owner(db, board_id) == user_id
+
+    def get_permission(self, db: Session, user_id: int, board_id: Optional[int]) -> Optional[PermissionLevel]:
+        if board_id is None:
+            return None
+        owner_id = self.get_board_owner(db, board_id)
+        if owner_id is None:
+            return None
+        if owner_id == user_id:
+            return PermissionLevel.ADMIN
+        level = self.memberships.get((user_id, board_id))
+        if level is None:
+            row = db.query(models.BoardMember.permission_level).filter(
+                models.BoardMember.board_id == board_id,
+                models.BoardMember.user_id == user_id
+            ).first()
+            level = PermissionLevel(row.permission_level) if row else NO_MEMBERSHIP
+            self.memberships.set((user_id, board_id), level)
+        return level or None
+
+    def has_permission(self, db: Session, user_id: int, board_id: Optional[int], minimum: PermissionLevel = PermissionLevel.VIEW) -> bool:
+        level = self.get_permission(db, user_id, board_id)
+        return level is not None and PERMISSION_RANK[level] >= PERMISSION_RANK[minimum]
+
+    def require_board_permission(
+        self,
+        db: Session,
+        user_id: int,
+        board_id: int,
+        minimum: PermissionLevel = PermissionLevel.VIEW,
+        forbidden_detail: str = "Not authorized to access this board"
+    ) -> PermissionLevel:
+        if self.get_board_owner(db, board_id) is None:
+            raise HTTPException(status_code=404, detail="Board not found")
+        level = self.get_permission(db, user_id, board_id)
+        if level is None or PERMISSION_RANK[level] < PERMISSION_RANK[minimum]:
+            raise HTTPException(status_code=403, detail=forbidden_detail)
+        return level
+
+    # Ancestry
+
+    def _board_for(self, kind: str, object_id: int, query) -> Optional[int]:
+        board_id = self.ancestry.get((kind, object_id))
+        if board_id is None:
+            row = query.first()
+            if row is None:
+                return None
+            board_id = row.board_id
+            self.ancestry.set((kind, object_id), board_id)
+        return board_id
+
+    def board_for_list(self, db: Session, list_id: int) -> Optional[int]:
+        return self._board_for("list", list_id, db.query(models.List.board_id).filter(models.List.id == list_id))
+
+    # Cards, checklists, items and labels carry their board_id, so these are
+    # primary-key lookups on a single table
+
+    def board_for_card(self, db: Session, card_id: int) -> Optional[int]:
+        return self._board_for("card", card_id, db.query(models.Card.board_id).filter(models.Card.id == card_id))
+
+    def board_for_checklist(self, db: Session, checklist_id: int) -> Optional[int]:
+        return self._board_for(
+            "checklist", checklist_id,
+            db.query(models.Checklist.board_id).filter(models.Checklist.id == checklist_id)
+        )
+
+    def board_for_checklist_item(self, db: Session, item_id: int) -> Optional[int]:
+        return self._board_for(
+            "checklist_item", item_id,
+            db.query(models.ChecklistItem.board_id).filter(models.ChecklistItem.id == item_id)
+        )
+
+    def board_for_label(self, db: Session, label_id: int) -> Optional[int]:
+        return self._board_for("label", label_id, db.query(models.Label.board_id).filter(models.Label.id == label_id))
+
+    # AsyncSession routes reuse the checks above through run_sync; cache hits
+    # never touch the database
+
+    async def require_board_permission_async(self, db: AsyncSession, *args, **kwargs) -> PermissionLevel:
+        return await db.run_sync(self.require_board_permission, *args, **kwargs)
+
+    async def is_owner_async(self, db: AsyncSession, user_id: int, board_id: Optional[int]) -> bool:
+        return await db.run_sync(self.is_owner, user_id, board_id)
+
+    async def board_for_async(self, db: AsyncSession, kind: str, object_id: int) -> Optional[int]:
+        return await db.run_sync(getattr(self, f"board_for_{kind}"), object_id)
+
+    # Invalidation
+
+    def invalidate_membership(self, user_id: int, board_id: int):
+        self.memberships.invalidate((user_id, board_id))
+
+    def invalidate_board(self, board_id: int):
+        self.owners.invalidate(board_id)
+        # Deleting a board cascades to everything under it
+        self.invalidate_hierarchy()
+
+    def invalidate_ancestry(self, kind: str, object_id: int):
+        self.ancestry.invalidate((kind, object_id))
+
+    def invalidate_hierarchy(self):
+        # Moving or deleting a list or card changes the board of everything
+        # under it, so drop the whole ancestry map rather than walk the subtree
+        self.ancestry.clear()
+
+
+permissions = PermissionService()
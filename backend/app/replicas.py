@@ -0,0 +1,140 @@
+# app/replicas.py
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+from typing import List, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .broker import Broker
+from .cache import TTLCache
+from .config import DB_REPLICA_URLS, REPLICA_STICKY_SECONDS, REPLICA_HEALTH_INTERVAL
+from .database import get_db, get_async_db, make_engine, async_url
+
+logger = logging.getLogger(__name__)
+
+WRITES_CHANNEL = "replica-writes"
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = make_engine(url, name)
+        self.async_engine = make_engine(async_url(url), f"{name}-async", is_async=True)
+        self.healthy = True
+
+    async def ping(self) -> bool:
+        try:
+            async with self.async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.warning(f"Replica {self.name} failed health check: {e}")
+            return False
+
+    async def dispose(self):
+        self.engine.dispose()
+        await self.async_engine.dispose()
+
+
+class ReplicaRouter:
+    """Picks a healthy replica round-robin for read-only requests.
+
+    Requests from a client that wrote within the last `sticky_seconds` stay on
+    the primary so they read their own writes. With a broker attached, writes
+    are announced to every worker so the window holds across the deployment.
+    """
+
+    def __init__(self, urls: List[str], sticky_seconds: float = REPLICA_STICKY_SECONDS,
+                 health_interval: float = REPLICA_HEALTH_INTERVAL):
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls)]
+        self.health_interval = health_interval
+        self.recent_writers = TTLCache("replica-sticky", maxsize=100000, ttl=sticky_seconds)
+        self._counter = itertools.count()
+        self._broker: Optional[Broker] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def client_key(request: Request) -> str:
+        # Hash the credentials so tokens never end up in memory dumps or on Redis
+        identity = request.headers.get("authorization") or (request.client.host if request.client else "")
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def pick(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        # Every replica is down, fall back to the primary
+        return None
+
+    def replica_for(self, request: Request) -> Optional[Replica]:
+        if not self.replicas or self.recent_writers.get(self.client_key(request)):
+            return None
+        return self.pick()
+
+    async def record_write(self, request: Request):
+        key = self.client_key(request)
+        self.recent_writers.set(key, True)
+        if self._broker is not None:
+            await self._broker.publish(WRITES_CHANNEL, json.dumps({"key": key}))
+
+    async def _on_write(self, channel: str, data: str) -> None:
+        self.recent_writers.set(json.loads(data)["key"], True)
+
+    async def check_health(self):
+        for replica in self.replicas:
+            healthy = await replica.ping()
+            if healthy != replica.healthy:
+                logger.info(f"Replica {replica.name} is {'up' if healthy else 'down'}")
+            replica.healthy = healthy
+
+    async def _run_health_checks(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    async def start(self, broker: Optional[Broker] = None):
+        if not self.replicas:
+            return
+        if broker is not None:
+            self._broker = broker
+            await broker.subscribe(WRITES_CHANNEL, self._on_write)
+        self._health_task = asyncio.create_task(self._run_health_checks())
+
+    async def stop(self):
+        task, self._health_task = self._health_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._broker is not None:
+            await self._broker.unsubscribe(WRITES_CHANNEL, self._on_write)
+            self._broker = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+replica_router = ReplicaRouter(DB_REPLICA_URLS)
+
+
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    # For read-only routes; stays on the primary when no replica fits
+    replica = replica_router.replica_for(request)
+    if replica is not None:
+        db.read_engine = replica.engine
+    return db
+
+
+async def get_async_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    replica = replica_router.replica_for(request)
+    if replica is not None:
+        db.sync_session.read_engine = replica.async_engine.sync_engine
+    return db
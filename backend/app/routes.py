@@ -1,43 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-import shutil
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import asyncio
 import os
 import secrets
 from . import models, schemas, auth
-from .database import get_db
+from .database import get_db, get_async_db, get_async_sessions, get_pool_metrics
+from .loaders import load_board_snapshot, board_snapshot_options, card_options, checklist_options, reload
+from .permissions import permissions
+from .replicas import get_read_db, get_async_read_db
+from .search import SearchQuery, get_search_backend, MAX_SEARCH_LIMIT
+from .search_index import search_index
+from .pagination import CursorPage, cursor_page
+from . import analytics, avatars, bulk, emails, stats, upload_sessions, uploads
+from .emails import fastmail
+from .jobs import queue
+from .ordering import place, place_async, keys_between
+from .hierarchy import move_cards_to_board
+from .storage import storage, too_large
+from .downloads import FileDownload
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from sqlalchemy import func, desc, or_, asc, and_
+from sqlalchemy import func, desc, or_, asc, and_, select, delete, insert
 from .exceptions import NotFoundException, ForbiddenException, BadRequestException
 from .models import PermissionLevel
 import logging
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from fastapi_mail import MessageSchema, MessageType
 from pydantic import EmailStr, BaseModel
 from .auth import authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from dotenv import load_dotenv
-from .websocket import handle_websocket, manager
+from .websocket import handle_websocket, handle_board_websocket, manager
 from fastapi import WebSocket, WebSocketDisconnect
 from .auth import get_user_from_token
-from .config import SECRET_KEY, ALGORITHM
+from .config import SECRET_KEY, ALGORITHM, CARD_BATCH_LIMIT, CARD_BATCH_MAX_SIZE, ATTACHMENT_MAX_SIZE
+from .config import RESUMABLE_UPLOAD_MAX_SIZE, UPLOAD_CHUNK_SIZE, UPLOAD_SESSION_TTL, AVATAR_MAX_SIZE
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
-UPLOAD_DIR = "uploads"
 # Create an APIRouter instance
 router = APIRouter()
-email_config = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=os.getenv("MAIL_FROM"),
-    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
-    MAIL_SERVER=os.getenv("MAIL_SERVER"),
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True
-)
 
 # In routes.py
 @router.websocket("/ws/cards/{card_id}")
@@ -59,29 +62,63 @@ async def websocket_endpoint(
         return
 
     # Verify card access
-    card = (
-        db.query(models.Card)
-        .join(models.List)
-        .join(models.Board)
-        .outerjoin(models.BoardMember)
-        .filter(
-            models.Card.id == card_id,
-            or_(
-                models.Board.owner_id == user.id,
-                models.BoardMember.user_id == user.id
-            )
-        )
-        .first()
-    )
-
-    if not card:
+    if not permissions.has_permission(db, user.id, permissions.board_for_card(db, card_id)):
         await websocket.close(code=4002)
         return
 
     # Connect only if all checks passed
     await manager.connect(websocket, card_id, user.id)
+    await handle_websocket(websocket, card_id, user.id)
+
+@router.websocket("/ws/boards/{board_id}")
+async def board_websocket_endpoint(
+    websocket: WebSocket,
+    board_id: int,
+    db: Session = Depends(get_db),
+    sessions: async_sessionmaker = Depends(get_async_sessions)
+):
+    # One socket per open board; cards and lists are subscribed to over it
+    token = websocket.query_params.get("token")
+    if not token:
+        await websocket.close(code=4000)
+        return
+
+    user = await get_user_from_token(token, db)
+    if not user:
+        await websocket.close(code=4001)
+        return
+
+    # Verify board access once for the lifetime of the socket
+    if not permissions.has_permission(db, user.id, board_id):
+        await websocket.close(code=4002)
+        return
+
+    user_id = user.id
+    # Release the pooled connection while the socket stays open
+    db.close()
+
+    await manager.connect_board(websocket, board_id, user_id)
+    await handle_board_websocket(websocket, board_id, user_id, sessions)
 
-fastmail = FastMail(email_config)
+@router.get("/ws/metrics")
+def get_websocket_metrics(current_user: schemas.User = Depends(auth.get_current_user)):
+    # Per-channel fan-out latency and outbound queue depth for this worker
+    return manager.get_metrics()
+
+
+@router.get("/db/metrics")
+def get_database_metrics(current_user: schemas.User = Depends(auth.get_current_user)):
+    # Pool checkout wait times and saturation for this worker's engines
+    return get_pool_metrics()
+
+
+@router.get("/jobs/metrics")
+async def get_job_metrics(
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Queued, running and dead background jobs per kind, with the oldest of each
+    return await queue.metrics(db)
 
 
 @router.websocket("/ws/test")
@@ -97,78 +134,39 @@ async def test_endpoint(websocket: WebSocket):
 
 # Create a new board
 @router.post("/boards/", response_model=schemas.Board)
-def create_board(board: schemas.BoardCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def create_board(board: schemas.BoardCreate, current_user: schemas.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     db_board = models.Board(**board.model_dump(), owner_id=current_user.id)
     db.add(db_board)
     db.commit()
     db.refresh(db_board)
+    search_index.refresh_board(db, db_board.id)
     return db_board
 
 # Get all boards with pagination
 @router.get("/boards/", response_model=list[schemas.Board])
 def read_boards(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
+    page: CursorPage = Depends(cursor_page(20)),
     db: Session = Depends(get_db)
 ):
-    boards = db.query(models.Board).offset(skip).limit(limit).all()
-    return boards
+    boards = db.scalars(page.apply(db, select(models.Board).options(*board_snapshot_options()), models.Board))
+    return page.page(boards)
 
 # Get a specific board by ID
 
 @router.get("/boards/{board_id}", response_model=schemas.Board)
 def read_board(
     board_id: int, 
-    current_user: models.User = Depends(auth.get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user), 
+    db: Session = Depends(get_read_db)
 ):
-    # Add debug logging
-    print(f"Fetching board {board_id} for user {current_user.id}")
-    
-    # Get the board with owner check
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if not board:
-        raise HTTPException(status_code=404, detail="Board not found")
-
     # Check permissions
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise HTTPException(
-                status_code=403, 
-                detail="Not authorized to access this board"
-            )
-
-    # Get lists with cards in a single query to improve performance
-    lists = (
-        db.query(models.List)
-        .filter(models.List.board_id == board_id)
-        .order_by(models.List.created_at)
-        .all()
-    )
-    
-    # Log the found lists
-    print(f"Found {len(lists)} lists for board {board_id}")
-
-    # Load cards for each list
-    for list_item in lists:
-        cards = (
-            db.query(models.Card)
-            .filter(models.Card.list_id == list_item.id)
-            .order_by(models.Card.created_at)
-            .all()
-        )
-        list_item.cards = cards
-        print(f"Found {len(cards)} cards for list {list_item.id}")
-
-    # Attach lists to board
-    board.lists = lists
+    permissions.require_board_permission(db, current_user.id, board_id)
 
-    # Log the final board state
-    print(f"Returning board with {len(board.lists)} lists")
+    # Load the board together with its lists, cards, labels and checklists
+    # in a fixed number of queries
+    board = load_board_snapshot(db, board_id)
+    if not board:
+        raise HTTPException(status_code=404, detail="Board not found")
     return board
 
 # Update a board
@@ -176,56 +174,41 @@ def read_board(
 def update_board(
     board_id: int, 
     board: schemas.BoardUpdate, 
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     logger.info(f"Updating board {board_id} for user {current_user.username} (id: {current_user.id})")
     
-    db_board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if db_board is None:
+    if permissions.get_board_owner(db, board_id) is None:
         raise HTTPException(status_code=404, detail="Board not found")
     
-    logger.info(f"Board owner_id: {db_board.owner_id}, Current user id: {current_user.id}")
+    if not permissions.has_permission(db, current_user.id, board_id, PermissionLevel.EDIT):
+        logger.warning(f"User {current_user.id} not authorized to update board {board_id}")
+        raise ForbiddenException(detail="Not authorized to update this board")
     
-    if db_board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        
-        logger.info(f"Board member found: {member}")
-        if member:
-            logger.info(f"Member permission level: {member.permission_level}")
-            
-        if not member or member.permission_level == PermissionLevel.VIEW:
-            logger.warning(f"User {current_user.id} not authorized to update board {board_id}")
-            raise ForbiddenException(detail="Not authorized to update this board")
+    db_board = db.query(models.Board).filter(models.Board.id == board_id).first()
+    if db_board is None:
+        raise HTTPException(status_code=404, detail="Board not found")
     
     for var, value in vars(board).items():
         setattr(db_board, var, value) if value else None
     db.add(db_board)
     db.commit()
     db.refresh(db_board)
+    search_index.refresh_board(db, board_id)
     logger.info(f"Board {board_id} updated successfully")
     return db_board
 
 @router.get("/boards/{board_id}/members", response_model=List[schemas.BoardMember])
 def get_board_members(
     board_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if not board:
-        raise HTTPException(status_code=404, detail="Board not found")
-        
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to view this board's members")
+    permissions.require_board_permission(
+        db, current_user.id, board_id,
+        forbidden_detail="Not authorized to view this board's members"
+    )
             
     members = db.query(models.BoardMember).filter(models.BoardMember.board_id == board_id).all()
     return members
@@ -234,7 +217,7 @@ def get_board_members(
 @router.delete("/boards/{board_id}", response_model=schemas.Board)
 def delete_board(
     board_id: int, 
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     db_board = db.query(models.Board).filter(models.Board.id == board_id).first()
@@ -246,125 +229,105 @@ def delete_board(
     
     db.delete(db_board)
     db.commit()
+    permissions.invalidate_board(board_id)
+    search_index.remove("board", board_id)
     return db_board
 
 # Get all lists for a specific board
 @router.get("/boards/{board_id}/lists", response_model=list[schemas.List])
 def read_lists_for_board(
     board_id: int, 
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if board is None:
-        raise HTTPException(status_code=404, detail="Board not found")
+    permissions.require_board_permission(db, current_user.id, board_id)
     
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to access this board")
-    
-    lists = db.query(models.List).filter(models.List.board_id == board_id).all()
+    lists = db.query(models.List).filter(models.List.board_id == board_id).order_by(models.List.position, models.List.id).all()
     return lists
 
 # Get board activity
 @router.get("/boards/{board_id}/activity", response_model=List[schemas.Activity])
 async def get_board_activity(
     board_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    page: CursorPage = Depends(cursor_page(50, descending=True)),
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if not board:
-        raise HTTPException(status_code=404, detail="Board not found")
+    await permissions.require_board_permission_async(db, current_user.id, board_id)
     
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to access this board")
-    
-    activities = db.query(models.Activity).filter(models.Activity.board_id == board_id).order_by(models.Activity.created_at.desc()).limit(50).all()
-    return activities
+    # Newest first
+    activities = await db.scalars(await page.apply_async(
+        db, select(models.Activity).where(models.Activity.board_id == board_id), models.Activity
+    ))
+    return page.page(activities)
 
 # Get board statistics
 @router.get("/boards/{board_id}/statistics", response_model=schemas.BoardStatistics)
 async def get_board_statistics(
     board_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if not board:
-        raise HTTPException(status_code=404, detail="Board not found")
-    
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to access this board")
-    
-    list_stats = db.query(
-        models.List.title,
-        func.count(models.Card.id).label('card_count')
-    ).outerjoin(models.Card).filter(models.List.board_id == board_id).group_by(models.List.id).all()
-    
-    total_cards = sum(stat.card_count for stat in list_stats)
+    await permissions.require_board_permission_async(db, current_user.id, board_id)
+    
+    # One counters row per list, kept current by the writes (see app/stats.py),
+    # and overdue cards counted against the clock now
+    counters = [func.coalesce(getattr(models.ListStatistics, name), 0).label(name) for name in stats.COUNTERS]
+    board_lists = select(models.List.id).where(models.List.board_id == board_id)
+    overdue = stats.overdue_counts(board_lists).subquery()
+    result = await db.execute(
+        select(
+            models.List.title.label("name"), *counters,
+            func.coalesce(overdue.c.overdue_count, 0).label("overdue_count"),
+        )
+        .outerjoin(models.ListStatistics)
+        .outerjoin(overdue, overdue.c.list_id == models.List.id)
+        .where(models.List.board_id == board_id)
+        .order_by(models.List.position, models.List.id)
+    )
+    lists_statistics = [schemas.ListStatistics.model_validate(row) for row in result]
     
     return schemas.BoardStatistics(
-        total_lists=len(list_stats),
-        total_cards=total_cards,
-        lists_statistics=[schemas.ListStatistics(name=stat.title, card_count=stat.card_count) for stat in list_stats]
+        total_lists=len(lists_statistics),
+        total_cards=sum(stat.card_count for stat in lists_statistics),
+        total_overdue=sum(stat.overdue_count for stat in lists_statistics),
+        total_checklist_items=sum(stat.checklist_items for stat in lists_statistics),
+        total_checklist_items_done=sum(stat.checklist_items_done for stat in lists_statistics),
+        lists_statistics=lists_statistics
     )
+
+# Get board analytics
+@router.get("/boards/{board_id}/analytics", response_model=schemas.BoardAnalytics)
+def get_board_analytics(
+    board_id: int,
+    days: int = Query(30, ge=1, le=365),
+    done_list_id: Optional[int] = None,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    permissions.require_board_permission(db, current_user.id, board_id)
+
+    # Sync on purpose: the NumPy work runs in the threadpool, off the event loop
+    return analytics.board_analytics(db, board_id, days=days, done_list_id=done_list_id)
+
 @router.get("/boards/{board_id}/cards", response_model=List[schemas.Card])
 async def get_board_cards(
     board_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if not board:
-        raise NotFoundException(detail="Board not found")
-    
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to access this board")
-    
-    cards = db.query(models.Card).join(models.List).filter(models.List.board_id == board_id).all()
-    return cards
-
-# Get all cards for a specific board
-@router.get("/boards/{board_id}", response_model=schemas.Board)
-def read_board(board_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    board = db.query(models.Board).filter(models.Board.id == board_id).first()
-    if board is None:
-        raise NotFoundException(detail="Board not found")
-    
-    if board.owner_id != current_user.id:
-        member = db.query(models.BoardMember).filter(
-            models.BoardMember.board_id == board_id,
-            models.BoardMember.user_id == current_user.id
-        ).first()
-        if not member:
-            raise ForbiddenException(detail="Not authorized to access this board")
+    await permissions.require_board_permission_async(db, current_user.id, board_id)
     
-    return board
+    cards = await db.scalars(
+        select(models.Card).join(models.List).where(models.Card.board_id == board_id).options(*card_options())
+        .order_by(models.List.position, models.List.id, models.Card.position, models.Card.id)
+    )
+    return cards.all()
 
 @router.post("/board-templates", response_model=schemas.BoardTemplate)
 async def create_board_template(
     template: schemas.BoardTemplateCreate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     db_template = models.BoardTemplate(**template.model_dump(), created_by=current_user.id)
@@ -377,7 +340,7 @@ async def create_board_template(
 async def create_board_from_template(
     template_id: int,
     board_name: str,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     template = db.query(models.BoardTemplate).filter(models.BoardTemplate.id == template_id).first()
@@ -388,12 +351,15 @@ async def create_board_from_template(
     db.add(new_board)
     db.flush()
 
-    for list_template in template.lists:
-        new_list = models.List(title=list_template.name, board_id=new_board.id)
+    for list_template, position in zip(template.lists, keys_between(None, None, len(template.lists))):
+        new_list = models.List(title=list_template.name, board_id=new_board.id, position=position)
         db.add(new_list)
 
     db.commit()
     db.refresh(new_board)
+    search_index.refresh_board(db, new_board.id)
+    for new_list in new_board.lists:
+        search_index.refresh_list(db, new_list.id)
     return new_board
 
 @router.post("/boards/{board_id}/members", response_model=schemas.BoardMember)
@@ -401,16 +367,16 @@ def add_board_member(
     board_id: int,
     member: schemas.BoardMemberCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id, models.Board.owner_id == current_user.id).first()
-    if not board:
+    if not permissions.is_owner(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Board not found or you don't have permission")
     
     new_member = models.BoardMember(**member.model_dump(), board_id=board_id)
     db.add(new_member)
     db.commit()
     db.refresh(new_member)
+    permissions.invalidate_membership(new_member.user_id, board_id)
     return new_member
 
 @router.put("/boards/{board_id}/members/{user_id}", response_model=schemas.BoardMember)
@@ -419,10 +385,9 @@ def update_board_member_permission(
     user_id: int,
     permission: PermissionLevel,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id, models.Board.owner_id == current_user.id).first()
-    if not board:
+    if not permissions.is_owner(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Board not found or you don't have permission")
     
     member = db.query(models.BoardMember).filter(models.BoardMember.board_id == board_id, models.BoardMember.user_id == user_id).first()
@@ -432,6 +397,7 @@ def update_board_member_permission(
     member.permission_level = permission
     db.commit()
     db.refresh(member)
+    permissions.invalidate_membership(user_id, board_id)
     return member
 
 @router.delete("/boards/{board_id}/members/{user_id}", status_code=204)
@@ -439,10 +405,9 @@ def remove_board_member(
     board_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    board = db.query(models.Board).filter(models.Board.id == board_id, models.Board.owner_id == current_user.id).first()
-    if not board:
+    if not permissions.is_owner(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Board not found or you don't have permission")
     
     member = db.query(models.BoardMember).filter(models.BoardMember.board_id == board_id, models.BoardMember.user_id == user_id).first()
@@ -451,16 +416,20 @@ def remove_board_member(
     
     db.delete(member)
     db.commit()
+    permissions.invalidate_membership(user_id, board_id)
     return {"detail": "Board member removed successfully"}
    
 # List routes
 # Create a new list
 @router.post("/lists/", response_model=schemas.List)
-def create_list(list: schemas.ListCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def create_list(list: schemas.ListCreate, current_user: schemas.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     db_list = models.List(**list.model_dump())
+    # New lists go at the end of the board
+    place(db, db_list, "board_id")
     db.add(db_list)
     db.commit()
     db.refresh(db_list)
+    search_index.refresh_list(db, db_list.id)
     
     # Log activity
     activity = models.Activity(
@@ -476,11 +445,10 @@ def create_list(list: schemas.ListCreate, current_user: models.User = Depends(au
 
 # Get all lists with pagination
 @router.get("/lists/", response_model=list[schemas.List])
-def read_lists(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    # Query the database for lists, applying offset and limit for pagination
-    lists = db.query(models.List).offset(skip).limit(limit).all()
-    # Return the retrieved lists
-    return lists
+def read_lists(page: CursorPage = Depends(cursor_page(100)), db: Session = Depends(get_db)):
+    # Keyset pagination stays as fast on deep pages as on the first
+    lists = db.scalars(page.apply(db, select(models.List), models.List))
+    return page.page(lists)
 
 # Get a specific list by ID
 @router.get("/lists/{list_id}", response_model=schemas.List)
@@ -498,21 +466,15 @@ def read_list(list_id: int, db: Session = Depends(get_db)):
 def update_list(
     list_id: int,
     list_data: schemas.ListUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     print(f"Updating list {list_id} with data:", list_data.model_dump())  # Debug log
     
     # Get the list and verify ownership
-    db_list = (
-        db.query(models.List)
-        .join(models.Board)
-        .filter(
-            models.List.id == list_id,
-            models.Board.owner_id == current_user.id
-        )
-        .first()
-    )
+    db_list = None
+    if permissions.is_owner(db, current_user.id, permissions.board_for_list(db, list_id)):
+        db_list = db.query(models.List).filter(models.List.id == list_id).first()
     
     if not db_list:
         raise HTTPException(
@@ -522,12 +484,21 @@ def update_list(
     
     # Update only the provided fields
     update_data = list_data.model_dump(exclude_unset=True)
+    after_id, before_id = update_data.pop("after_id", None), update_data.pop("before_id", None)
     for key, value in update_data.items():
         setattr(db_list, key, value)
+    if after_id is not None or before_id is not None or "board_id" in update_data:
+        place(db, db_list, "board_id", before_id=before_id, after_id=after_id)
+    if "board_id" in update_data:
+        # Everything in the list follows it to the new board
+        move_cards_to_board(db, models.Card.list_id == list_id, db_list.board_id)
     
     try:
         db.commit()
         db.refresh(db_list)
+        if "board_id" in update_data:
+            permissions.invalidate_hierarchy()
+        search_index.refresh_list(db, list_id, with_cards="board_id" in update_data)
         print("List updated successfully:", db_list)  # Debug log
         return db_list
     except Exception as e:
@@ -538,21 +509,15 @@ def update_list(
 @router.delete("/lists/{list_id}", response_model=schemas.List)
 def delete_list(
     list_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     print(f"Deleting list {list_id}")  # Debug log
     
     # Get the list and verify ownership
-    db_list = (
-        db.query(models.List)
-        .join(models.Board)
-        .filter(
-            models.List.id == list_id,
-            models.Board.owner_id == current_user.id
-        )
-        .first()
-    )
+    db_list = None
+    if permissions.is_owner(db, current_user.id, permissions.board_for_list(db, list_id)):
+        db_list = db.query(models.List).filter(models.List.id == list_id).first()
     
     if not db_list:
         raise HTTPException(
@@ -563,6 +528,8 @@ def delete_list(
     try:
         db.delete(db_list)
         db.commit()
+        permissions.invalidate_hierarchy()
+        search_index.remove("list", list_id)
         print("List deleted successfully")  # Debug log
         return {"detail": "List deleted successfully"}
     except Exception as e:
@@ -586,28 +553,35 @@ def read_cards_for_list(
     if sort_by:
         order = desc if sort_order == "desc" else asc
         query = query.order_by(order(getattr(models.Card, sort_by)))
+    else:
+        query = query.order_by(models.Card.position, models.Card.id)
 
     cards = query.all()
     return cards
 
 # Card routes
 @router.post("/cards/", response_model=schemas.Card)
-def create_card(card: schemas.CardCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def create_card(card: schemas.CardCreate, current_user: schemas.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     list = db.query(models.List).filter(models.List.id == card.list_id).first()
     if not list:
         raise HTTPException(status_code=404, detail="List not found")
     
-    db_card = models.Card(**card.model_dump())
+    db_card = models.Card(**card.model_dump(), board_id=list.board_id)
+    place(db, db_card, "list_id")
     db.add(db_card)
+    stats.apply(db, {}, stats.new_cards([db_card]))
     db.commit()
     db.refresh(db_card)
+    search_index.refresh_card(db, db_card.id)
 
     # Log activity
     activity = models.Activity(
         board_id=list.board_id,
         user_id=current_user.id,
         activity_type="card_created",
-        details=f"Card '{db_card.title}' created in list '{list.title}'"
+        details=f"Card '{db_card.title}' created in list '{list.title}'",
+        card_id=db_card.id,
+        to_list_id=list.id
     )
     db.add(activity)
     db.commit()
@@ -615,9 +589,9 @@ def create_card(card: schemas.CardCreate, current_user: models.User = Depends(au
     return db_card
 
 @router.get("/cards/", response_model=list[schemas.Card])
-def read_cards(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    cards = db.query(models.Card).offset(skip).limit(limit).all()
-    return cards
+def read_cards(page: CursorPage = Depends(cursor_page(100)), db: Session = Depends(get_db)):
+    cards = db.scalars(page.apply(db, select(models.Card), models.Card))
+    return page.page(cards)
 
 @router.get("/cards/{card_id}", response_model=schemas.Card)
 def read_card(card_id: int, db: Session = Depends(get_db)):
@@ -631,11 +605,39 @@ def update_card(card_id: int, card: schemas.CardUpdate, db: Session = Depends(ge
     db_card = db.query(models.Card).filter(models.Card.id == card_id).first()
     if db_card is None:
         raise HTTPException(status_code=404, detail="Card not found")
+    moved = card.list_id is not None and card.list_id != db_card.list_id
+    before = stats.snapshot(db, models.Card.id == card_id) if moved else None
+    from_list_id, from_board_id = db_card.list_id, db_card.board_id
     for var, value in vars(card).items():
         setattr(db_card, var, value) if value is not None else None
+    if moved:
+        # Goes to the bottom of its new list
+        place(db, db_card, "list_id")
+        board_id = permissions.board_for_list(db, card.list_id)
+        if board_id is None:
+            raise HTTPException(status_code=404, detail="List not found")
+        if board_id != db_card.board_id:
+            move_cards_to_board(db, models.Card.id == card_id, board_id)
+            db_card.board_id = board_id
+        # Recorded on both boards when it changes board, so each one's history
+        # shows the card arriving or leaving
+        for board in {from_board_id, board_id}:
+            db.add(models.Activity(
+                board_id=board,
+                activity_type="card_moved",
+                details=f"Card '{db_card.title}' moved",
+                card_id=card_id,
+                from_list_id=from_list_id,
+                to_list_id=card.list_id
+            ))
     db.add(db_card)
+    if moved:
+        stats.record(db, models.Card.id == card_id, before)
     db.commit()
     db.refresh(db_card)
+    if card.list_id is not None:
+        permissions.invalidate_hierarchy()
+    search_index.refresh_card(db, card_id)
     return db_card
 
 @router.delete("/cards/{card_id}", response_model=schemas.Card)
@@ -643,109 +645,131 @@ def delete_card(card_id: int, db: Session = Depends(get_db)):
     db_card = db.query(models.Card).filter(models.Card.id == card_id).first()
     if db_card is None:
         raise HTTPException(status_code=404, detail="Card not found")
+    before = stats.snapshot(db, models.Card.id == card_id)
+    db.add(models.Activity(
+        board_id=db_card.board_id,
+        activity_type="card_deleted",
+        details=f"Card '{db_card.title}' deleted",
+        card_id=card_id,
+        from_list_id=db_card.list_id
+    ))
     db.delete(db_card)
+    stats.record(db, models.Card.id == card_id, before)
     db.commit()
+    permissions.invalidate_hierarchy()
+    search_index.remove("card", card_id)
     return db_card
 
 @router.put("/cards/{card_id}/move", response_model=schemas.Card)
 async def move_card(
     card_id: int,
     new_list_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Moving card {card_id} to list {new_list_id} for user {current_user.id}")
-    card = db.query(models.Card).filter(models.Card.id == card_id).first()
+    card = await db.get(models.Card, card_id)
     if not card:
         print(f"Card {card_id} not found")
         raise HTTPException(status_code=404, detail="Card not found")
 
     # Check if the user has permission to move this card
-    board = db.query(models.Board).join(models.List).filter(models.List.id == card.list_id).first()
-    print(f"Board owner_id: {board.owner_id}, Current user id: {current_user.id}")
-    if not board or board.owner_id != current_user.id:
+    board_id = await permissions.board_for_async(db, "list", card.list_id)
+    if not await permissions.is_owner_async(db, current_user.id, board_id):
         print(f"User {current_user.id} not authorized to move card {card_id}")
         raise HTTPException(status_code=403, detail="Not authorized to move this card")
 
     # Check if the new list exists and belongs to the same board
-    new_list = db.query(models.List).filter(models.List.id == new_list_id, models.List.board_id == board.id).first()
-    if not new_list:
+    if await permissions.board_for_async(db, "list", new_list_id) != board_id:
         raise HTTPException(status_code=400, detail="Invalid new list ID")
 
-    # Move the card
+    # Move the card. Only its own row changes: the new key sits between its
+    # neighbours, and without either it goes to the bottom of the list
+    counted = new_list_id != card.list_id
+    if counted:
+        before = await db.run_sync(stats.snapshot, models.Card.id == card_id)
+        db.add(models.Activity(
+            board_id=board_id,
+            user_id=current_user.id,
+            activity_type="card_moved",
+            details=f"Card '{card.title}' moved",
+            card_id=card_id,
+            from_list_id=card.list_id,
+            to_list_id=new_list_id
+        ))
     card.list_id = new_list_id
-    db.commit()
-    db.refresh(card)
+    await place_async(db, card, "list_id", before_id=before_id, after_id=after_id)
+    if counted:
+        await db.run_sync(stats.record, models.Card.id == card_id, before)
+    await db.commit()
 
+    card = await reload(db, models.Card, card_id, *card_options())
+    await db.run_sync(search_index.refresh_card, card_id)
     return card
 
 @router.post("/cards/{card_id}/labels", response_model=schemas.Label)
 async def create_label(
     card_id: int,
     label: schemas.LabelCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if card exists and user has access
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    
-    if not card:
+    board_id = await permissions.board_for_async(db, "card", card_id)
+    if not await permissions.is_owner_async(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Card not found")
 
-    db_label = models.Label(**label.dict(), card_id=card_id)
+    db_label = models.Label(**label.dict(), card_id=card_id, board_id=board_id)
     db.add(db_label)
-    db.commit()
-    db.refresh(db_label)
+    await db.commit()
+    await db.refresh(db_label)
+    await db.run_sync(search_index.refresh_card, card_id)
     return db_label
 
 @router.delete("/labels/{label_id}")
 async def delete_label(
     label_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    label = db.query(models.Label).join(models.Card).join(models.List).join(models.Board).filter(
-        models.Label.id == label_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    label = None
+    if await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "label", label_id)):
+        label = await db.get(models.Label, label_id)
     
     if not label:
         raise HTTPException(status_code=404, detail="Label not found")
     
-    db.delete(label)
-    db.commit()
+    card_id = label.card_id
+    await db.delete(label)
+    await db.commit()
+    permissions.invalidate_ancestry("label", label_id)
+    await db.run_sync(search_index.refresh_card, card_id)
     return {"detail": "Label deleted successfully"}
 
 @router.get("/cards/{card_id}/labels", response_model=List[schemas.Label])
 async def get_card_labels(
     card_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    
-    if not card:
+    if not await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "card", card_id)):
         raise HTTPException(status_code=404, detail="Card not found")
     
-    return card.labels
+    labels = await db.scalars(select(models.Label).where(models.Label.card_id == card_id))
+    return labels.all()
 
 @router.delete("/cards/{card_id}/labels/{label_id}", response_model=schemas.Card)
 def remove_label_from_card(
     card_id: int, 
     label_id: int, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    card = None
+    if permissions.is_owner(db, current_user.id, permissions.board_for_card(db, card_id)):
+        card = db.query(models.Card).filter(models.Card.id == card_id).first()
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
     
@@ -755,111 +779,248 @@ def remove_label_from_card(
     
     db.delete(label)
     db.commit()
+    permissions.invalidate_ancestry("label", label_id)
     db.refresh(card)
+    search_index.refresh_card(db, card_id)
     return card
 
-@router.post("/cards/batch", response_model=List[schemas.Card])
-def create_cards_batch(
-    cards: List[schemas.CardCreate],
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+@router.post("/cards/batch", response_model=List[schemas.Card], openapi_extra=bulk.card_batch_body())
+async def create_cards_batch(
+    request: Request,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    created_cards = []
-    for card_data in cards:
-        # Verify that the user has access to the list
-        list_obj = db.query(models.List).join(models.Board).filter(
-            models.List.id == card_data.list_id,
-            models.Board.owner_id == current_user.id
-        ).first()
-        if not list_obj:
-            raise HTTPException(status_code=404, detail="List not found or access denied")
-        
-        db_card = models.Card(**card_data.model_dump())
-        db.add(db_card)
-        created_cards.append(db_card)
-    
-    db.commit()
-    for card in created_cards:
-        db.refresh(card)
-    
-    return created_cards
-
-@router.post("/cards/{card_id}/attachments", response_model=schemas.Attachment)
+    # A JSON array, or NDJSON (one card per line) for large imports
+    cards = await bulk.read_batch(request, schemas.CardCreate, CARD_BATCH_LIMIT, CARD_BATCH_MAX_SIZE)
+    return await bulk.create_cards(db, current_user.id, cards)
+
+@router.post("/cards/bulk", response_model=schemas.BulkCardResult)
+async def bulk_update_cards(
+    request: schemas.BulkCardRequest,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Move, relabel, reschedule or delete many cards in one transaction
+    result, changes = await bulk.apply_card_operations(db, current_user.id, request.operations)
+    for board_id, change in changes.items():
+        # One message per board rather than one per card
+        await manager.broadcast_to_board(board_id, {
+            "type": "cards",
+            "action": "bulk_updated",
+            "data": change,
+            "boardId": board_id,
+            "user_id": current_user.id,
+        })
+    return result
+
+@router.post("/cards/{card_id}/attachments", response_model=schemas.Attachment, openapi_extra=uploads.upload_body())
 async def add_attachment(
     card_id: int,
-    file: UploadFile = File(...),
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    filename: Optional[str] = None,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    if not card:
+    if not await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "card", card_id)):
         raise HTTPException(status_code=404, detail="Card not found or access denied")
+    # Don't hold a pooled connection while the file streams in
+    await db.commit()
+
+    # Multipart with a `file` field, or the raw bytes with ?filename=. Either
+    # way it goes to storage chunk by chunk, named by its SHA-256
+    upload = await uploads.read_upload(request, filename)
+    stored = await storage.save(upload, ATTACHMENT_MAX_SIZE)
+
+    db_attachment = models.Attachment(
+        filename=upload.filename,
+        file_path=stored.location,
+        size=stored.size,
+        sha256=stored.sha256,
+        content_type=upload.content_type,
+        card_id=card_id
+    )
+    db.add(db_attachment)
+    await db.commit()
+    return db_attachment
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+# Resumable uploads, for files too large to send in one go
 
-    db_attachment = models.Attachment(filename=file.filename, file_path=file_path, card_id=card.id)
-    db.add(db_attachment)
-    db.commit()
-    db.refresh(db_attachment)
+async def get_upload_session(db: AsyncSession, upload_id: str, user_id: int) -> models.UploadSession:
+    upload = await db.get(models.UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id or upload_sessions.is_expired(upload):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
 
+@router.post("/cards/{card_id}/uploads", response_model=schemas.UploadSession)
+async def create_upload_session(
+    card_id: int,
+    upload: schemas.UploadSessionCreate,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "card", card_id)):
+        raise HTTPException(status_code=404, detail="Card not found or access denied")
+    if upload.size > RESUMABLE_UPLOAD_MAX_SIZE:
+        raise too_large(RESUMABLE_UPLOAD_MAX_SIZE)
+    db_upload = models.UploadSession(
+        id=secrets.token_urlsafe(32),
+        card_id=card_id,
+        user_id=current_user.id,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        size=upload.size,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_SESSION_TTL),
+    )
+    db.add(db_upload)
+    await db.commit()
+    return upload_sessions.describe(db_upload, [])
+
+@router.get("/uploads/{upload_id}", response_model=schemas.UploadSession)
+async def get_upload_status(
+    upload_id: str,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user.id)
+    return upload_sessions.describe(upload, await storage.parts(upload_id))
+
+@router.put("/uploads/{upload_id}/chunks/{index}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user.id)
+    if not 0 <= index < upload_sessions.chunk_count(upload):
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+    size = upload_sessions.chunk_length(upload, index)
+    await db.commit()
+    # The raw chunk, streamed to storage. Chunks can be sent in parallel
+    await storage.save_part(upload_id, index, request.stream(), size)
+
+@router.post("/uploads/{upload_id}/complete", response_model=schemas.Attachment)
+async def complete_upload(
+    upload_id: str,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user.id)
+    # Access may have been revoked since the upload started
+    if not await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "card", upload.card_id)):
+        raise HTTPException(status_code=404, detail="Card not found or access denied")
+    count = upload_sessions.chunk_count(upload)
+    missing = sorted(set(range(count)) - set(await storage.parts(upload_id)))
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing chunks: {missing[:100]}")
+
+    # Claim the upload before reading its parts: of two concurrent completions
+    # only the one that removes the session assembles, so the other can't
+    # have the parts discarded underneath it
+    columns = {column.key: getattr(upload, column.key) for column in models.UploadSession.__table__.columns}
+    removed = await db.execute(
+        delete(models.UploadSession).where(models.UploadSession.id == upload_id)
+        .execution_options(synchronize_session=False)
+    )
+    if removed.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    await db.commit()
+    try:
+        stored = await storage.assemble(upload_id, count, RESUMABLE_UPLOAD_MAX_SIZE)
+    except BaseException:
+        # Hand the session back so the upload can be completed again
+        await db.rollback()
+        await db.execute(insert(models.UploadSession).values(**columns))
+        await db.commit()
+        raise
+    db_attachment = models.Attachment(
+        filename=upload.filename,
+        file_path=stored.location,
+        size=stored.size,
+        sha256=stored.sha256,
+        content_type=upload.content_type,
+        card_id=upload.card_id
+    )
+    db.add(db_attachment)
+    await db.commit()
+    await storage.discard_parts(upload_id)
     return db_attachment
 
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_upload(
+    upload_id: str,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    upload = await get_upload_session(db, upload_id, current_user.id)
+    await db.delete(upload)
+    await db.commit()
+    await storage.discard_parts(upload_id)
+
 @router.get("/cards/{card_id}/attachments", response_model=List[schemas.Attachment])
 async def get_attachments(
     card_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    if not card:
+    if not permissions.is_owner(db, current_user.id, permissions.board_for_card(db, card_id)):
         raise HTTPException(status_code=404, detail="Card not found or access denied")
 
-    return card.attachments
+    return db.query(models.Attachment).filter(models.Attachment.card_id == card_id).all()
+
+@router.api_route("/attachments/{attachment_id}", methods=["GET", "HEAD"], response_class=FileDownload)
+async def download_attachment(
+    attachment_id: int,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    attachment = await db.get(models.Attachment, attachment_id)
+    board_id = await permissions.board_for_async(db, "card", attachment.card_id) if attachment else None
+    if board_id is None or not await db.run_sync(permissions.has_permission, current_user.id, board_id):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    # The file can take a while to send; don't hold a connection meanwhile
+    await db.commit()
+
+    if attachment.sha256:
+        path = storage.local_path(attachment.file_path)
+    else:
+        # Uploaded before content addressing, to a path of its own
+        path = attachment.file_path
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Attachment file is missing")
+    return FileDownload(path, attachment.filename, attachment.content_type, attachment.sha256, stat_result)
 
 @router.post("/cards/{card_id}/comments", response_model=schemas.Comment)
 def add_comment_to_card(
     card_id: int,
     comment: schemas.CommentCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    if not card:
+    if not permissions.is_owner(db, current_user.id, permissions.board_for_card(db, card_id)):
         raise HTTPException(status_code=404, detail="Card not found")
     
     new_comment = models.Comment(**comment.model_dump(), card_id=card_id, user_id=current_user.id)
     db.add(new_comment)
     db.commit()
     db.refresh(new_comment)
+    search_index.refresh_card(db, card_id)
     return new_comment
 
 @router.get("/cards/{card_id}/comments", response_model=List[schemas.Comment])
 def get_card_comments(
     card_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    if not card:
+    if not permissions.is_owner(db, current_user.id, permissions.board_for_card(db, card_id)):
         raise HTTPException(status_code=404, detail="Card not found")
     
-    return card.comments
+    return db.query(models.Comment).filter(models.Comment.card_id == card_id).all()
 
 #users
 
@@ -893,12 +1054,12 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Could not create user")
 
 @router.get("/users/me/", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: schemas.User = Depends(auth.get_current_user)):
     return current_user
 
 @router.get("/users/me/boards", response_model=List[schemas.Board])
-async def read_user_boards(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    boards = db.query(models.Board).filter(models.Board.owner_id == current_user.id).all()
+async def read_user_boards(current_user: schemas.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    boards = db.query(models.Board).options(*board_snapshot_options()).filter(models.Board.owner_id == current_user.id).all()
     return boards
 
 #token
@@ -909,7 +1070,7 @@ async def login_for_access_token(
     db: Session = Depends(get_db)
 ):
     print(f"Login attempt for: {form_data.username}")
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -927,109 +1088,49 @@ async def login_for_access_token(
 @router.get("/search", response_model=List[schemas.SearchResult])
 async def search(
     query: str,
+    response: Response,
     due_date_start: Optional[datetime] = None,
     due_date_end: Optional[datetime] = None,
     label: Optional[str] = None,
     board_id: Optional[int] = None,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = None,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    # Base query for boards
-    board_query = db.query(models.Board).filter(models.Board.owner_id == current_user.id)
-    
-    # Apply board_id filter if provided
-    if board_id:
-        board_query = board_query.filter(models.Board.id == board_id)
-    
-    # Search in boards
-    boards = board_query.filter(models.Board.title.ilike(f"%{query}%")).all()
-
-    # Search in lists
-    lists = db.query(models.List).join(models.Board).filter(
-        models.Board.owner_id == current_user.id,
-        models.List.title.ilike(f"%{query}%")
-    ).all()
-
-    # Base query for cards
-    card_query = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Board.owner_id == current_user.id
-    )
-    
-    # Apply filters
-    if due_date_start:
-        card_query = card_query.filter(models.Card.due_date >= due_date_start)
-    if due_date_end:
-        card_query = card_query.filter(models.Card.due_date <= due_date_end)
-    if label:
-        card_query = card_query.join(models.Label).filter(models.Label.name == label)
-    if board_id:
-        card_query = card_query.filter(models.Board.id == board_id)
-
-    # Full-text search on cards
-    cards = card_query.filter(
-        or_(
-            models.Card.title.ilike(f"%{query}%"),
-            models.Card.description.ilike(f"%{query}%")
-        )
-    ).all()
-
-    results = [
-        *[schemas.SearchResult(type="board", id=b.id, title=b.title) for b in boards],
-        *[schemas.SearchResult(type="list", id=l.id, title=l.title) for l in lists],
-        *[schemas.SearchResult(type="card", id=c.id, title=c.title) for c in cards]
-    ]
-
+    # Ranked full-text search over boards, lists and cards in one query
+    results, next_cursor = await get_search_backend(db).search(db, SearchQuery(
+        text=query,
+        user_id=current_user.id,
+        board_id=board_id,
+        label=label,
+        due_date_start=due_date_start,
+        due_date_end=due_date_end,
+        limit=limit,
+        cursor=cursor,
+    ))
+    # Pass this back as `cursor` to fetch the next page
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return results
 
-
-
-@router.post("/password-reset/request", status_code=status.HTTP_200_OK)
-async def request_password_reset(
-    email: EmailStr,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+@router.get("/search/suggest", response_model=List[schemas.SearchResult])
+async def search_suggest(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if not user:
-        # Return 200 even if user not found for security
-        return {"message": "If a user with that email exists, a password reset link has been sent."}
-
-    # Generate reset token
-    reset_token = secrets.token_urlsafe(32)
-    user.password_reset_token = reset_token
-    user.password_reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
-    db.commit()
+    # Typo-tolerant typeahead over board, list and card titles and label names
+    return await get_search_backend(db).suggest(db, current_user.id, q, limit)
 
-    # Create reset link
-    reset_url = f"{os.getenv('FRONTEND_URL')}/reset-password/{reset_token}"
 
-    # Create email message
-    message = MessageSchema(
-        subject="Password Reset Request",
-        recipients=[email],
-        body=f"""
-        Hi {user.username},
-
-        You requested to reset your password. Click the link below to reset it:
-
-        {reset_url}
-
-        This link will expire in 1 hour.
-
-        If you didn't request this, please ignore this email.
-        """,
-    )
-
-    # Send email in background
-    background_tasks.add_task(fastmail.send_message, message)
-
-    return {"message": "Password reset email sent successfully"}
 
 @router.get("/password-reset/verify/{token}", status_code=status.HTTP_200_OK)
 async def verify_reset_token(token: str, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(
         models.User.password_reset_token == token,
-        models.User.password_reset_expires > datetime.now(timezone.utc)
+        models.User.password_reset_expires > stats.utcnow()
     ).first()
 
     if not user:
@@ -1043,7 +1144,6 @@ async def verify_reset_token(token: str, db: Session = Depends(get_db)):
 @router.post("/password-reset/request", status_code=status.HTTP_200_OK)
 async def request_password_reset(
     email: EmailStr,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     user = db.query(models.User).filter(models.User.email == email).first()
@@ -1054,38 +1154,13 @@ async def request_password_reset(
     # Generate reset token
     reset_token = secrets.token_urlsafe(32)
     user.password_reset_token = reset_token
-    user.password_reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
-    db.commit()
-
-    # Create reset link
-    reset_url = f"{os.getenv('FRONTEND_URL')}/reset-password/{reset_token}"
-
-    # Create email message
-    message = MessageSchema(
-        subject="Password Reset Request",
-        recipients=[email],
-        body=f"""
-        Hi {user.username},
-
-        You requested to reset your password. Click the link below to reset it:
-
-        {reset_url}
-
-        This link will expire in 1 hour.
+    user.password_reset_expires = stats.utcnow() + timedelta(hours=1)
 
-        If you didn't request this, please ignore this email.
-        """,
-        subtype=MessageType.plain
-    )
-
-    # Send email immediately (changed from background task for better error handling)
-    try:
-        await fastmail.send_message(message)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to send reset email: {str(e)}"
-        )
+    # Queued with the token, so the email goes out if and only if the token is
+    # saved. The job only names the user; the link is made when it's sent
+    emails.send_password_reset_later(db, user.id)
+    db.commit()
+    auth.invalidate_user(user.username)
 
     return {"message": "Password reset email sent successfully"}
 
@@ -1119,7 +1194,7 @@ async def test_email(
 async def update_user(
     user_id: int,
     user_data: schemas.UserUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: schemas.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     if current_user.id != user_id:
@@ -1140,130 +1215,154 @@ async def update_user(
     try:
         db.commit()
         db.refresh(db_user)
+        # Drop the cached record under both the old and the new username
+        auth.invalidate_user(current_user.username, db_user.username)
         return db_user
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.put("/users/{user_id}/avatar", response_model=schemas.User)
+@router.put("/users/{user_id}/avatar", response_model=schemas.User, openapi_extra=uploads.upload_body())
 async def update_user_avatar(
     user_id: int,
-    file: UploadFile = File(...),
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    filename: Optional[str] = None,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.id != user_id:
         raise HTTPException(
             status_code=403,
             detail="Not authorized to update this user's avatar"
         )
-    
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+
+    db_user = await db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # Save the file
-    file_path = f"uploads/avatars/{user_id}_{file.filename}"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    try:
-        with open(file_path, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Could not upload file: {str(e)}"
-        )
-    
-    
-    db_user.avatar_url = file_path
-    db.commit()
-    db.refresh(db_user)
-    
+    await db.commit()
+
+    # The photo as uploaded, then thumbnails of it once the response is out
+    upload = await uploads.read_upload(request, filename)
+    stored = await storage.save(upload, AVATAR_MAX_SIZE)
+    if await avatars.is_ready(stored.sha256):
+        # Seen this photo before
+        db_user.avatar_key, db_user.avatar_pending = stored.sha256, None
+    else:
+        # Until they're made, the previous avatar stays
+        db_user.avatar_pending = stored.sha256
+        queue.enqueue(db, "avatar_thumbnails", {
+            "user_id": user_id, "key": stored.sha256, "location": stored.location,
+        })
+    await db.commit()
+    await db.refresh(db_user)
+    auth.invalidate_user(db_user.username)
     return db_user
 
+@router.get("/avatars/{key}/{variant}", response_class=FileDownload)
+async def get_avatar(key: str, variant: str):
+    # Public, like the URLs of the images themselves
+    if variant not in avatars.VARIANTS or len(key) != 64:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    path = storage.local_path(avatars.location(key, variant))
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    return FileDownload(
+        path, variant, avatars.MEDIA_TYPES[variant.rsplit(".", 1)[1]], f"{key}/{variant}", stat_result,
+        cache_control=avatars.CACHE_CONTROL, inline=True,
+    )
+
 @router.post("/checklists/", response_model=schemas.Checklist)
 async def create_checklist(
     checklist: schemas.ChecklistCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify user has access to the card
-    card = db.query(models.Card).join(models.List).join(models.Board).filter(
-        models.Card.id == checklist.card_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    
-    if not card:
+    board_id = await permissions.board_for_async(db, "card", checklist.card_id)
+    if not await permissions.is_owner_async(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Card not found")
         
-    db_checklist = models.Checklist(**checklist.model_dump())
+    db_checklist = models.Checklist(**checklist.model_dump(), board_id=board_id)
+    await place_async(db, db_checklist, "card_id")
     db.add(db_checklist)
-    db.commit()
-    db.refresh(db_checklist)
-    return db_checklist
+    await db.commit()
+    return await reload(db, models.Checklist, db_checklist.id, *checklist_options())
 
 @router.post("/checklist-items/", response_model=schemas.ChecklistItem)
 async def create_checklist_item(
     item: schemas.ChecklistItemCreate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify user has access to the checklist
-    checklist = db.query(models.Checklist).join(models.Card).join(models.List).join(models.Board).filter(
-        models.Checklist.id == item.checklist_id,
-        models.Board.owner_id == current_user.id
-    ).first()
-    
-    if not checklist:
+    board_id = await permissions.board_for_async(db, "checklist", item.checklist_id)
+    if not await permissions.is_owner_async(db, current_user.id, board_id):
         raise HTTPException(status_code=404, detail="Checklist not found")
         
-    db_item = models.ChecklistItem(**item.model_dump())
+    card_filter = stats.card_of_checklist(item.checklist_id)
+    before = await db.run_sync(stats.snapshot, card_filter)
+    db_item = models.ChecklistItem(**item.model_dump(), board_id=board_id)
+    await place_async(db, db_item, "checklist_id")
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.run_sync(stats.record, card_filter, before)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 @router.put("/checklist-items/{item_id}", response_model=schemas.ChecklistItem)
 async def update_checklist_item(
     item_id: int,
     item_update: schemas.ChecklistItemUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get the item and verify user has access
-    db_item = db.query(models.ChecklistItem).join(models.Checklist).join(models.Card).join(models.List).join(models.Board).filter(
-        models.ChecklistItem.id == item_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    db_item = None
+    if await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "checklist_item", item_id)):
+        db_item = await db.get(models.ChecklistItem, item_id)
     
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
         
-    for key, value in item_update.model_dump(exclude_unset=True).items():
+    update_data = item_update.model_dump(exclude_unset=True)
+    after_id, before_id = update_data.pop("after_id", None), update_data.pop("before_id", None)
+    counted = update_data.get("completed", db_item.completed) != db_item.completed
+    if counted:
+        card_filter = stats.card_of_checklist(db_item.checklist_id)
+        before = await db.run_sync(stats.snapshot, card_filter)
+    for key, value in update_data.items():
         setattr(db_item, key, value)
+    if after_id is not None or before_id is not None:
+        await place_async(db, db_item, "checklist_id", before_id=before_id, after_id=after_id)
+    if counted:
+        await db.run_sync(stats.record, card_filter, before)
         
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 @router.delete("/checklist-items/{item_id}")
 async def delete_checklist_item(
     item_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get the item and verify user has access
-    db_item = db.query(models.ChecklistItem).join(models.Checklist).join(models.Card).join(models.List).join(models.Board).filter(
-        models.ChecklistItem.id == item_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    db_item = None
+    if await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "checklist_item", item_id)):
+        db_item = await db.get(models.ChecklistItem, item_id)
     
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
         
-    db.delete(db_item)
-    db.commit()
+    card_filter = stats.card_of_checklist(db_item.checklist_id)
+    before = await db.run_sync(stats.snapshot, card_filter)
+    await db.delete(db_item)
+    await db.run_sync(stats.record, card_filter, before)
+    await db.commit()
+    permissions.invalidate_ancestry("checklist_item", item_id)
     return {"detail": "Item deleted successfully"}
 
 
@@ -1271,39 +1370,45 @@ async def delete_checklist_item(
 async def update_checklist(
     checklist_id: int,
     checklist_update: schemas.ChecklistUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify user has access to the checklist
-    checklist = db.query(models.Checklist).join(models.Card).join(models.List).join(models.Board).filter(
-        models.Checklist.id == checklist_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    checklist = None
+    if await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "checklist", checklist_id)):
+        checklist = await db.get(models.Checklist, checklist_id)
     
     if not checklist:
         raise HTTPException(status_code=404, detail="Checklist not found")
         
-    for key, value in checklist_update.model_dump(exclude_unset=True).items():
+    update_data = checklist_update.model_dump(exclude_unset=True)
+    after_id, before_id = update_data.pop("after_id", None), update_data.pop("before_id", None)
+    for key, value in update_data.items():
         setattr(checklist, key, value)
+    if after_id is not None or before_id is not None:
+        await place_async(db, checklist, "card_id", before_id=before_id, after_id=after_id)
         
-    db.commit()
-    db.refresh(checklist)
-    return checklist
+    await db.commit()
+    return await reload(db, models.Checklist, checklist_id, *checklist_options())
 
 @router.delete("/checklists/{checklist_id}")
 async def delete_checklist(
     checklist_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    checklist = db.query(models.Checklist).join(models.Card).join(models.List).join(models.Board).filter(
-        models.Checklist.id == checklist_id,
-        models.Board.owner_id == current_user.id
-    ).first()
+    checklist = None
+    if await permissions.is_owner_async(db, current_user.id, await permissions.board_for_async(db, "checklist", checklist_id)):
+        checklist = await db.get(models.Checklist, checklist_id)
     
     if not checklist:
         raise HTTPException(status_code=404, detail="Checklist not found")
         
-    db.delete(checklist)
-    db.commit()
+    # The checklist's row is gone afterwards, so count its card by id
+    card_filter = models.Card.id == checklist.card_id
+    before = await db.run_sync(stats.snapshot, card_filter)
+    await db.delete(checklist)
+    await db.run_sync(stats.record, card_filter, before)
+    await db.commit()
+    permissions.invalidate_ancestry("checklist", checklist_id)
     return {"detail": "Checklist deleted successfully"}
\ No newline at end of file
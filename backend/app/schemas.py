@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr, model_validator
-from datetime import datetime
-from typing import Annotated, List as PyList, Optional, Any, Dict
+from datetime import date, datetime
+from typing import Annotated, List as PyList, Literal, Optional, Any, Dict, Union
 from enum import Enum
 from pydantic.config import ConfigDict
 from .models import PermissionLevel
@@ -31,7 +31,9 @@ class ListCreate(BaseModel):
 class ListUpdate(BaseModel):
     title: Annotated[str, Field(min_length=1, max_length=100)]
     board_id: Optional[int] = None
-    position: Optional[int] = None
+    # Reorder: place the list right after / right before a sibling
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -88,14 +90,20 @@ class ActivityType(str, Enum):
     CARD_CREATED = "card_created"
     CARD_MOVED = "card_moved"
     CARD_ARCHIVED = "card_archived"
+    CARD_DELETED = "card_deleted"
     LIST_CREATED = "list_created"
+    CARDS_BULK_UPDATED = "cards_bulk_updated"
     
 class Activity(BaseModel):
     id: int
     board_id: int
-    user_id: int
+    # None for changes made through routes that don't authenticate
+    user_id: Optional[int] = None
     activity_type: ActivityType
     details: str
+    card_id: Optional[int] = None
+    from_list_id: Optional[int] = None
+    to_list_id: Optional[int] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)  
@@ -104,6 +112,7 @@ class SearchResult(BaseModel):
     type: str
     id: int
     title: str
+    rank: Optional[float] = None
 
     model_config = ConfigDict(from_attributes=True)
     
@@ -111,10 +120,31 @@ class Attachment(BaseModel):
     id: int
     filename: str
     file_path: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    content_type: Optional[str] = None
     uploaded_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1)
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+
+class UploadSession(BaseModel):
+    id: str
+    card_id: int
+    filename: str
+    content_type: Optional[str] = None
+    size: int
+    # Chunk i covers bytes [i * chunk_size, (i + 1) * chunk_size); the last may be shorter
+    chunk_size: int
+    chunk_count: int
+    # Indexes of the chunks stored so far
+    received: PyList[int]
+    expires_at: datetime
+
 class BoardTemplateCreate(BaseModel):
     name: str
     description: str
@@ -130,13 +160,52 @@ class BoardTemplate(BoardTemplateCreate):
 class ListStatistics(BaseModel):
     name: str
     card_count: int
+    overdue_count: int = 0
+    checklist_items: int = 0
+    checklist_items_done: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
 
 class BoardStatistics(BaseModel):
     total_lists: int
     total_cards: int
+    total_overdue: int = 0
+    total_checklist_items: int = 0
+    total_checklist_items_done: int = 0
     lists_statistics: PyList[ListStatistics]
 
     model_config = ConfigDict(from_attributes=True)    
+
+class DurationStats(BaseModel):
+    count: int
+    mean_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p85_hours: Optional[float] = None
+    p95_hours: Optional[float] = None
+
+class ListFlow(BaseModel):
+    list_id: int
+    name: str
+    # Days-end card counts, one per entry in BoardAnalytics.days
+    cumulative_flow: PyList[int]
+    # From a card's creation to its first arrival in the list
+    lead_time: DurationStats
+    # Time cards spent in the list before moving on
+    cycle_time: DurationStats
+
+class ThroughputWeek(BaseModel):
+    week_start: date
+    completed: int
+
+class BoardAnalytics(BaseModel):
+    board_id: int
+    done_list_id: Optional[int]
+    days: PyList[date]
+    lists: PyList[ListFlow]
+    # Creation, and first move out of the creation list, to arrival in the done list
+    lead_time: DurationStats
+    cycle_time: DurationStats
+    throughput: PyList[ThroughputWeek]
     
 class LabelCreate(BaseModel):
     name: str
@@ -183,6 +252,8 @@ class User(UserBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Square thumbnails are at <avatar_url>/<size>.webp and .jpg
+    avatar_url: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)     
     
@@ -219,26 +290,8 @@ class UserUpdate(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)    
     
-class List(ListBase):
-    id: int
-    created_at: datetime
-    updated_at: Optional[datetime] = None
-    cards: PyList[Card] = []
-    model_config = ConfigDict(from_attributes=True)   
-    
-class Board(BoardBase):
-    id: int
-    description: Optional[str] = None
-    created_at: datetime
-    updated_at: Optional[datetime] = None
-    lists: PyList[List] = []  
-
-    model_config = ConfigDict(from_attributes=True)
-    
-
 class ChecklistItemBase(BaseModel):
     content: str
-    position: Optional[int] = None
     completed: Optional[bool] = False
 
 class ChecklistItemCreate(ChecklistItemBase):
@@ -247,11 +300,13 @@ class ChecklistItemCreate(ChecklistItemBase):
 class ChecklistItemUpdate(BaseModel):
     content: Optional[str] = None
     completed: Optional[bool] = None
-    position: Optional[int] = None
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
 
 class ChecklistItem(ChecklistItemBase):
     id: int
     checklist_id: int
+    position: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -259,18 +314,19 @@ class ChecklistItem(ChecklistItemBase):
 
 class ChecklistBase(BaseModel):
     title: str
-    position: Optional[int] = None
 
 class ChecklistCreate(ChecklistBase):
     card_id: int
 
 class ChecklistUpdate(BaseModel):
     title: Optional[str] = None
-    position: Optional[int] = None
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
 
 class Checklist(ChecklistBase):
     id: int
     card_id: int
+    position: Optional[str] = None
     items: PyList[ChecklistItem] = []
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -280,13 +336,33 @@ class Checklist(ChecklistBase):
 # Update the Card schema to include checklists
 class Card(CardBase):
     id: int
+    position: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    labels: PyList[Label] = []
     checklists: PyList[Checklist] = []
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class List(ListBase):
+    id: int
+    position: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    cards: PyList[Card] = []
+    model_config = ConfigDict(from_attributes=True)   
+    
+class Board(BoardBase):
+    id: int
+    description: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    lists: PyList[List] = []  
+
+    model_config = ConfigDict(from_attributes=True)
+    
+
 class WebSocketEventType(str, Enum):
     COMMENT = "comment"
     ACTIVITY = "activity"
@@ -310,4 +386,42 @@ class WebSocketEvent(WebSocketEventBase):
     user_id: int
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Bulk card operations, applied in order in one transaction
+
+class BulkCardOperationBase(BaseModel):
+    card_ids: PyList[int] = Field(..., min_length=1)
+
+class BulkMoveCards(BulkCardOperationBase):
+    op: Literal["move"]
+    list_id: int
+
+class BulkSetDueDate(BulkCardOperationBase):
+    op: Literal["set_due_date"]
+    due_date: Optional[datetime] = None  # None clears it
+
+class BulkAddLabel(BulkCardOperationBase):
+    op: Literal["add_label"]
+    name: str
+    color: str
+
+class BulkRemoveLabel(BulkCardOperationBase):
+    op: Literal["remove_label"]
+    name: str
+
+class BulkDeleteCards(BulkCardOperationBase):
+    op: Literal["delete"]
+
+BulkCardOperation = Annotated[
+    Union[BulkMoveCards, BulkSetDueDate, BulkAddLabel, BulkRemoveLabel, BulkDeleteCards],
+    Field(discriminator="op"),
+]
+
+class BulkCardRequest(BaseModel):
+    operations: PyList[BulkCardOperation] = Field(..., min_length=1)
+
+class BulkCardResult(BaseModel):
+    # Rows changed by each operation, in request order
+    affected: PyList[int]
+    board_ids: PyList[int]
@@ -0,0 +1,396 @@
+# app/search.py
+import base64
+import json
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DDL, Float, Index, String, and_, cast, event, func, literal, or_, select, table, column, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas, stats
+from .cache import TTLCache
+from .config import SUGGEST_SIMILARITY_THRESHOLD, SUGGEST_CACHE_TTL, SUGGEST_CACHE_SIZE
+from .search_index import search_index
+
+# 'simple' skips stemming and stop words, so short titles and ids still match
+SEARCH_CONFIG = "simple"
+MAX_SEARCH_LIMIT = 100
+
+
+def _document(*columns):
+    # Constants are inlined rather than bound so the expression compiles to the
+    # same SQL as the index definition, whichever driver sends it
+    parts = [func.coalesce(c, text("''")) for c in columns]
+    expr = parts[0]
+    for part in parts[1:]:
+        expr = expr.concat(text("' '")).concat(part)
+    return func.to_tsvector(text(f"'{SEARCH_CONFIG}'"), expr)
+
+
+# The search queries below must use exactly these expressions for the GIN
+# indexes to be picked up
+BOARD_DOCUMENT = _document(models.Board.__table__.c.title)
+LIST_DOCUMENT = _document(models.List.__table__.c.title)
+CARD_DOCUMENT = _document(models.Card.__table__.c.title, models.Card.__table__.c.description)
+
+for name, document in (
+    ("ix_boards_search", BOARD_DOCUMENT),
+    ("ix_lists_search", LIST_DOCUMENT),
+    ("ix_cards_search", CARD_DOCUMENT),
+):
+    Index(name, document, postgresql_using="gin").ddl_if(dialect="postgresql")
+
+
+# Typeahead on Postgres needs the pg_trgm extension and its GIN indexes on
+# board/list/card titles and label names; both come from the Alembic
+# migration, since the extension has to be installed on the server first
+
+
+def trigrams(value: str) -> set:
+    # Same trigram split as pg_trgm: lowercase words padded with two leading
+    # blanks and one trailing blank
+    grams = set()
+    for word in re.findall(r"[^\W_]+", (value or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def word_similarity(query: str, value: str) -> float:
+    """Share of the query's trigrams found in the closest word of `value`.
+
+    A close stand-in for pg_trgm's word_similarity, registered on SQLite
+    connections so the same suggestion SQL runs there.
+    """
+    query_grams = trigrams(query)
+    if not query_grams or not value:
+        return 0.0
+    best = 0
+    for word in re.findall(r"[^\W_]+", value.lower()):
+        best = max(best, len(query_grams & trigrams(word)))
+    return best / len(query_grams)
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if hasattr(dbapi_connection, "create_function"):
+        dbapi_connection.create_function("word_similarity", 2, word_similarity, deterministic=True)
+
+
+# SQLite stand-in: external-content FTS5 tables kept in sync by triggers
+
+FTS_TABLES = {
+    "boards": ["title"],
+    "lists": ["title"],
+    "cards": ["title", "description"],
+}
+
+
+def _fts_ddl(name: str, columns: List[str]) -> List[str]:
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    fts = f"{name}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{name}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_insert AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_delete AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_update AFTER UPDATE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+for _name, _columns in FTS_TABLES.items():
+    _table = models.Base.metadata.tables[_name]
+    for _statement in _fts_ddl(_name, _columns):
+        event.listen(_table, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+    event.listen(_table, "before_drop", DDL(f"DROP TABLE IF EXISTS {_name}_fts").execute_if(dialect="sqlite"))
+
+
+@dataclass
+class SearchQuery:
+    text: str
+    user_id: int
+    board_id: Optional[int] = None
+    label: Optional[str] = None
+    due_date_start: Optional[datetime] = None
+    due_date_end: Optional[datetime] = None
+    limit: int = 50
+    cursor: Optional[str] = None
+
+    @property
+    def terms(self) -> List[str]:
+        return re.findall(r"\w+", self.text.lower())
+
+
+def encode_cursor(rank: float, kind: str, object_id: int) -> str:
+    raw = json.dumps([rank, kind, object_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, int]:
+    try:
+        rank, kind, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(kind), int(object_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid search cursor")
+
+
+class SearchBackend(ABC):
+    """Answers /search and /search/suggest for one user."""
+
+    @abstractmethod
+    async def search(self, db: AsyncSession, query: SearchQuery) -> Tuple[List[schemas.SearchResult], Optional[str]]:
+        """A page of results and the cursor for the next one, if any."""
+
+    @abstractmethod
+    async def suggest(self, db: AsyncSession, user_id: int, prefix: str, limit: int) -> List[schemas.SearchResult]:
+        """Typo-tolerant completions of `prefix`."""
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Adds the ranked match for one searchable table to a select. The backends
+    share one UNION query with the owner/board/label/due-date filters and a
+    keyset cursor over (rank, type, id)."""
+
+    @abstractmethod
+    def ranked(self, statement, kind: str, query: SearchQuery):
+        ...
+
+    def _union(self, query: SearchQuery):
+        user_id = query.user_id
+
+        boards = self.ranked(select(
+            literal("board", String).label("type"), models.Board.id.label("id"), models.Board.title.label("title")
+        ).where(models.Board.owner_id == user_id), "board", query)
+
+        lists = self.ranked(select(
+            literal("list", String).label("type"), models.List.id.label("id"), models.List.title.label("title")
+        ).join(models.Board, models.List.board_id == models.Board.id).where(
+            models.Board.owner_id == user_id
+        ), "list", query)
+
+        cards = self.ranked(select(
+            literal("card", String).label("type"), models.Card.id.label("id"), models.Card.title.label("title")
+        ).join(models.Board, models.Card.board_id == models.Board.id).where(
+            models.Board.owner_id == user_id
+        ), "card", query)
+
+        if query.board_id:
+            boards = boards.where(models.Board.id == query.board_id)
+            lists = lists.where(models.Board.id == query.board_id)
+            cards = cards.where(models.Board.id == query.board_id)
+        if query.due_date_start:
+            cards = cards.where(models.Card.due_date >= stats.naive_utc(query.due_date_start))
+        if query.due_date_end:
+            cards = cards.where(models.Card.due_date <= stats.naive_utc(query.due_date_end))
+        if query.label:
+            cards = cards.where(
+                select(models.Label.id).where(
+                    models.Label.card_id == models.Card.id, models.Label.name == query.label
+                ).exists()
+            )
+        return union_all(boards, lists, cards).subquery("results")
+
+    async def search(self, db: AsyncSession, query: SearchQuery) -> Tuple[List[schemas.SearchResult], Optional[str]]:
+        if not query.terms:
+            return [], None
+        results = self._union(query)
+        statement = select(results.c.type, results.c.id, results.c.title, results.c.rank)
+        if query.cursor:
+            rank, kind, object_id = decode_cursor(query.cursor)
+            statement = statement.where(or_(
+                results.c.rank < rank,
+                and_(results.c.rank == rank, or_(
+                    results.c.type > kind,
+                    and_(results.c.type == kind, results.c.id > object_id)
+                ))
+            ))
+        limit = max(1, min(query.limit, MAX_SEARCH_LIMIT))
+        statement = statement.order_by(
+            results.c.rank.desc(), results.c.type, results.c.id
+        ).limit(limit + 1)
+
+        rows = (await db.execute(statement)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.rank, last.type, last.id)
+        return [
+            schemas.SearchResult(type=row.type, id=row.id, title=row.title, rank=row.rank)
+            for row in rows
+        ], next_cursor
+
+
+    # Typeahead
+
+    @abstractmethod
+    def fuzzy_match(self, prefix: str, column_):
+        ...
+
+    async def prepare_suggest(self, db: AsyncSession):
+        pass
+
+    def _suggest_union(self, user_id: int, prefix: str):
+        def ranked(kind, id_column, title_column, statement):
+            score = func.word_similarity(prefix, title_column)
+            return statement.add_columns(
+                literal(kind, String).label("type"), id_column.label("id"),
+                title_column.label("title"), cast(score, Float).label("rank")
+            ).where(self.fuzzy_match(prefix, title_column))
+
+        boards = ranked("board", models.Board.id, models.Board.title, select().select_from(models.Board)).where(
+            models.Board.owner_id == user_id
+        )
+        lists = ranked("list", models.List.id, models.List.title, select().select_from(models.List)).join(
+            models.Board, models.List.board_id == models.Board.id
+        ).where(models.Board.owner_id == user_id)
+        cards = ranked("card", models.Card.id, models.Card.title, select().select_from(models.Card)).join(
+            models.Board, models.Card.board_id == models.Board.id
+        ).where(models.Board.owner_id == user_id)
+        # The same label name sits on many cards; suggest each name once. Labels
+        # left behind by deleted cards keep their board but not their card
+        labels = select(
+            literal("label", String).label("type"), func.min(models.Label.id).label("id"),
+            models.Label.name.label("title"), cast(func.max(func.word_similarity(prefix, models.Label.name)), Float).label("rank")
+        ).join(models.Board, models.Label.board_id == models.Board.id).where(
+            models.Board.owner_id == user_id, models.Label.card_id.isnot(None), self.fuzzy_match(prefix, models.Label.name)
+        ).group_by(models.Label.name)
+        return union_all(boards, lists, cards, labels).subquery("suggestions")
+
+    async def suggest(self, db: AsyncSession, user_id: int, prefix: str, limit: int) -> List[schemas.SearchResult]:
+        prefix = prefix.strip().lower()
+        if not trigrams(prefix):
+            return []
+        key = (user_id, prefix, limit)
+        cached = suggestion_cache.get(key)
+        if cached is not None:
+            return cached
+        await self.prepare_suggest(db)
+        results = self._suggest_union(user_id, prefix)
+        rows = (await db.execute(
+            select(results.c.type, results.c.id, results.c.title, results.c.rank)
+            .order_by(results.c.rank.desc(), results.c.title, results.c.type, results.c.id)
+            .limit(limit)
+        )).all()
+        suggestions = [
+            schemas.SearchResult(type=row.type, id=row.id, title=row.title, rank=row.rank)
+            for row in rows
+        ]
+        suggestion_cache.set(key, suggestions)
+        return suggestions
+
+
+# (user_id, prefix, limit) -> suggestions; typeahead re-requests the same
+# prefixes while a user types and deletes
+suggestion_cache = TTLCache("search-suggest", maxsize=SUGGEST_CACHE_SIZE, ttl=SUGGEST_CACHE_TTL)
+
+
+class PostgresSearchBackend(DatabaseSearchBackend):
+    """Full-text search over GIN-indexed tsvector expressions, ranked with ts_rank."""
+
+    documents = {"board": BOARD_DOCUMENT, "list": LIST_DOCUMENT, "card": CARD_DOCUMENT}
+
+    def _tsquery(self, query: SearchQuery):
+        # Every term must match, each as a prefix so partially typed words hit
+        expression = " & ".join(f"{t}:*" for t in query.terms)
+        return func.to_tsquery(text(f"'{SEARCH_CONFIG}'"), expression)
+
+    def ranked(self, statement, kind, query):
+        document, tsquery = self.documents[kind], self._tsquery(query)
+        return statement.where(document.op("@@")(tsquery)).add_columns(
+            cast(func.ts_rank(document, tsquery), Float).label("rank")
+        )
+
+    has_trigrams: Optional[bool] = None
+
+    async def prepare_suggest(self, db):
+        if self.has_trigrams is None:
+            installed = await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+            PostgresSearchBackend.has_trigrams = installed is not None
+        if not self.has_trigrams:
+            raise HTTPException(status_code=501, detail="Suggestions need the pg_trgm extension")
+        # <% compares against this threshold and can use the trigram indexes
+        await db.execute(
+            select(func.set_config("pg_trgm.word_similarity_threshold", str(SUGGEST_SIMILARITY_THRESHOLD), True))
+        )
+
+    def fuzzy_match(self, prefix, column_):
+        return literal(prefix, String).op("<%")(column_)
+
+
+class SQLiteSearchBackend(DatabaseSearchBackend):
+    """FTS5 stand-in used for local runs and tests. bm25 is negated so that
+    larger ranks are better, as with ts_rank."""
+
+    tables = {"board": ("boards", models.Board.id), "list": ("lists", models.List.id), "card": ("cards", models.Card.id)}
+
+    def ranked(self, statement, kind, query):
+        name, id_column = self.tables[kind]
+        expression = " ".join(f'"{t}"*' for t in query.terms)
+        fts = table(f"{name}_fts", column("rowid"), column("rank"))
+        matches = select(fts.c.rowid, (-fts.c.rank).label("score")).where(
+            text(f"{name}_fts MATCH :{name}_terms").bindparams(**{f"{name}_terms": expression})
+        ).subquery(f"{name}_matches")
+        return statement.join(matches, matches.c.rowid == id_column).add_columns(
+            cast(matches.c.score, Float).label("rank")
+        )
+
+    def fuzzy_match(self, prefix, column_):
+        return func.word_similarity(prefix, column_) >= SUGGEST_SIMILARITY_THRESHOLD
+
+
+class InMemorySearchBackend(SearchBackend):
+    """Answers /search from the in-process inverted index without touching the
+    database. Suggestions still come from the database backend."""
+
+    def __init__(self, index):
+        self.index = index
+
+    async def search(self, db, query):
+        hits = self.index.search(query)
+        if query.cursor:
+            rank, kind, object_id = decode_cursor(query.cursor)
+            hits = [hit for hit in hits if (-hit[0], hit[1], hit[2]) > (-rank, kind, object_id)]
+        limit = max(1, min(query.limit, MAX_SEARCH_LIMIT))
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = encode_cursor(*hits[-1][:3])
+        return [
+            schemas.SearchResult(type=kind, id=object_id, title=title, rank=rank)
+            for rank, kind, object_id, title in hits
+        ], next_cursor
+
+    async def suggest(self, db, user_id, prefix, limit):
+        return await database_backend(db).suggest(db, user_id, prefix, limit)
+
+
+BACKENDS = {
+    "postgresql": PostgresSearchBackend(),
+    "sqlite": SQLiteSearchBackend(),
+}
+memory_backend = InMemorySearchBackend(search_index)
+
+
+def database_backend(db: AsyncSession) -> DatabaseSearchBackend:
+    dialect = db.bind.dialect.name if db.bind is not None else "postgresql"
+    backend = BACKENDS.get(dialect)
+    if backend is None:
+        raise HTTPException(status_code=501, detail=f"Search is not supported on {dialect}")
+    return backend
+
+
+def get_search_backend(db: AsyncSession) -> SearchBackend:
+    if search_index.enabled:
+        return memory_backend
+    return database_backend(db)
@@ -0,0 +1,333 @@
+# app/search_index.py
+import asyncio
+import bisect
+import json
+import re
+import threading
+import uuid
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from . import models
+from .broker import Broker, publish_from_any_thread
+from .config import SEARCH_BACKEND
+from .stats import naive_utc
+
+KIND_CODES = {"board": 0, "list": 1, "card": 2}
+# Matches in a title count double
+TITLE_WEIGHT = 2.0
+
+
+def tokenize(*texts: Optional[str]) -> List[str]:
+    return [term for text in texts if text for term in re.findall(r"\w+", text.lower())]
+
+
+def doc_key(kind: str, object_id: int) -> int:
+    # Kind in the low bits so one unsigned array holds boards, lists and cards
+    return object_id << 2 | KIND_CODES[kind]
+
+
+class Document:
+    __slots__ = ("kind", "id", "title", "terms", "title_terms", "list_id", "labels", "due_date")
+
+    def __init__(self, kind: str, object_id: int, title: str, terms: Iterable[str],
+                 list_id: Optional[int] = None, labels: Iterable[str] = (), due_date: Optional[datetime] = None):
+        self.kind = kind
+        self.id = object_id
+        self.title = title or ""
+        self.terms = frozenset(terms)
+        self.title_terms = frozenset(tokenize(title))
+        self.list_id = list_id
+        self.labels = frozenset(labels)
+        self.due_date = naive_utc(due_date)
+
+
+class BoardPartition:
+    """Postings for one board. Each term maps to a sorted array of doc keys,
+    and a sorted term list serves prefix lookups."""
+
+    def __init__(self, board_id: int, owner_id: Optional[int] = None):
+        self.board_id = board_id
+        self.owner_id = owner_id
+        self.postings: Dict[str, array] = {}
+        self.terms: List[str] = []
+        self.docs: Dict[int, Document] = {}
+
+    def add(self, doc: Document):
+        key = doc_key(doc.kind, doc.id)
+        self.remove(key)
+        self.docs[key] = doc
+        for term in doc.terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("Q")
+                bisect.insort(self.terms, term)
+            bisect.insort(postings, key)
+
+    def remove(self, key: int) -> Optional[Document]:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return None
+        for term in doc.terms:
+            postings = self.postings[term]
+            del postings[bisect.bisect_left(postings, key)]
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+        return doc
+
+    def _prefix_postings(self, prefix: str) -> Set[int]:
+        keys: Set[int] = set()
+        start = bisect.bisect_left(self.terms, prefix)
+        for term in self.terms[start:]:
+            if not term.startswith(prefix):
+                break
+            keys.update(self.postings[term])
+        return keys
+
+    def match(self, terms: List[str]) -> Set[int]:
+        # Boolean AND of prefix matches, smallest posting set first
+        matches = sorted((self._prefix_postings(term) for term in terms), key=len)
+        result = matches[0] if matches else set()
+        for keys in matches[1:]:
+            result &= keys
+            if not result:
+                break
+        return result
+
+
+class SearchIndex:
+    """In-process inverted index over boards, lists and cards, partitioned by
+    board and kept current by the write handlers in routes.py.
+
+    Updates are applied as small document events, which are also published on
+    the broker so every worker's index stays in step without a reload.
+    """
+
+    channel = "search-index"
+
+    def __init__(self, enabled: bool = SEARCH_BACKEND == "memory"):
+        self.enabled = enabled
+        self.partitions: Dict[int, BoardPartition] = {}
+        # (kind, id) -> board_id, to find a document when it moves or is deleted
+        self.locations: Dict[Tuple[str, int], int] = {}
+        self.boards_by_owner: Dict[int, Set[int]] = {}
+        self._lock = threading.RLock()
+        self._index_id = uuid.uuid4().hex
+        self._broker: Optional[Broker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # Applying events
+
+    def apply(self, event: dict):
+        with self._lock:
+            kind, object_id = event["kind"], event["id"]
+            if event["op"] == "delete":
+                self._delete(kind, object_id)
+                return
+            if kind == "board":
+                self._upsert_board(object_id, event["owner_id"], event["title"])
+                return
+            board_id = event["board_id"]
+            due_date = datetime.fromisoformat(event["due_date"]) if event.get("due_date") else None
+            doc = Document(
+                kind, object_id, event["title"], tokenize(event["title"], *event.get("text", [])),
+                list_id=event.get("list_id"), labels=event.get("labels", []), due_date=due_date
+            )
+            self._remove_doc(kind, object_id)
+            self._partition(board_id).add(doc)
+            self.locations[(kind, object_id)] = board_id
+
+    def _partition(self, board_id: int) -> BoardPartition:
+        partition = self.partitions.get(board_id)
+        if partition is None:
+            partition = self.partitions[board_id] = BoardPartition(board_id)
+        return partition
+
+    def _upsert_board(self, board_id: int, owner_id: int, title: str):
+        partition = self._partition(board_id)
+        if partition.owner_id != owner_id:
+            self.boards_by_owner.get(partition.owner_id, set()).discard(board_id)
+            partition.owner_id = owner_id
+            self.boards_by_owner.setdefault(owner_id, set()).add(board_id)
+        partition.add(Document("board", board_id, title, tokenize(title)))
+        self.locations[("board", board_id)] = board_id
+
+    def _remove_doc(self, kind: str, object_id: int):
+        board_id = self.locations.pop((kind, object_id), None)
+        if board_id is not None and board_id in self.partitions:
+            self.partitions[board_id].remove(doc_key(kind, object_id))
+
+    def _delete(self, kind: str, object_id: int):
+        if kind == "board":
+            partition = self.partitions.pop(object_id, None)
+            if partition is not None:
+                self.boards_by_owner.get(partition.owner_id, set()).discard(object_id)
+                for doc in partition.docs.values():
+                    self.locations.pop((doc.kind, doc.id), None)
+            return
+        board_id = self.locations.get((kind, object_id))
+        if kind == "list" and board_id in self.partitions:
+            # Cards go with their list
+            partition = self.partitions[board_id]
+            for doc in [d for d in partition.docs.values() if d.kind == "card" and d.list_id == object_id]:
+                self._remove_doc("card", doc.id)
+        self._remove_doc(kind, object_id)
+
+    # Loading documents from the database
+
+    def _card_event(self, card: models.Card, board_id: int) -> dict:
+        return {
+            "op": "upsert", "kind": "card", "id": card.id, "board_id": board_id, "list_id": card.list_id,
+            "title": card.title,
+            "text": [card.description, *[label.name for label in card.labels], *[c.content for c in card.comments]],
+            "labels": [label.name for label in card.labels if label.name],
+            "due_date": card.due_date.isoformat() if card.due_date else None,
+        }
+
+    def _emit(self, events: List[dict]):
+        for event in events:
+            self.apply(event)
+        self._publish(events)
+
+    def refresh_board(self, db: Session, board_id: int):
+        if not self.enabled:
+            return
+        board = db.get(models.Board, board_id)
+        if board is None:
+            self._emit([{"op": "delete", "kind": "board", "id": board_id}])
+            return
+        self._emit([{"op": "upsert", "kind": "board", "id": board.id, "owner_id": board.owner_id, "title": board.title}])
+
+    def refresh_list(self, db: Session, list_id: int, with_cards: bool = False):
+        if not self.enabled:
+            return
+        db_list = db.get(models.List, list_id)
+        if db_list is None:
+            self._emit([{"op": "delete", "kind": "list", "id": list_id}])
+            return
+        events = [{"op": "upsert", "kind": "list", "id": db_list.id, "board_id": db_list.board_id, "title": db_list.title}]
+        if with_cards:
+            # The list moved boards, so its cards move partitions too
+            events += [self._card_event(card, db_list.board_id) for card in db_list.cards]
+        self._emit(events)
+
+    def refresh_card(self, db: Session, card_id: int):
+        if not self.enabled:
+            return
+        card = db.get(models.Card, card_id)
+        if card is None:
+            self._emit([{"op": "delete", "kind": "card", "id": card_id}])
+            return
+        self._emit([self._card_event(card, card.board_id)])
+
+    def add_new_cards(self, cards: List[models.Card], board_ids: Dict[int, int]):
+        # Freshly inserted cards have no labels or comments, so skip the reload
+        if not self.enabled:
+            return
+        self._emit([
+            {
+                "op": "upsert", "kind": "card", "id": card.id, "board_id": board_ids[card.list_id],
+                "list_id": card.list_id, "title": card.title, "text": [card.description], "labels": [],
+                "due_date": card.due_date.isoformat() if card.due_date else None,
+            }
+            for card in cards
+        ])
+
+    def refresh_cards(self, db: Session, card_ids: List[int]):
+        # One load for a whole batch of changed cards; missing ones were deleted
+        if not self.enabled or not card_ids:
+            return
+        cards = db.query(models.Card).filter(models.Card.id.in_(card_ids)).options(
+            selectinload(models.Card.labels), selectinload(models.Card.comments)
+        ).populate_existing().all()
+        found = {card.id for card in cards}
+        self._emit(
+            [self._card_event(card, card.board_id) for card in cards]
+            + [{"op": "delete", "kind": "card", "id": card_id} for card_id in card_ids if card_id not in found]
+        )
+
+    def remove(self, kind: str, object_id: int):
+        if self.enabled:
+            self._emit([{"op": "delete", "kind": kind, "id": object_id}])
+
+    def rebuild(self, db: Session):
+        # Full load at startup; afterwards the index is maintained incrementally
+        with self._lock:
+            self.partitions.clear()
+            self.locations.clear()
+            self.boards_by_owner.clear()
+            boards = db.query(models.Board).options(
+                selectinload(models.Board.lists).selectinload(models.List.cards).selectinload(models.Card.labels),
+                selectinload(models.Board.lists).selectinload(models.List.cards).selectinload(models.Card.comments),
+            ).all()
+            for board in boards:
+                self.apply({"op": "upsert", "kind": "board", "id": board.id, "owner_id": board.owner_id, "title": board.title})
+                for db_list in board.lists:
+                    self.apply({"op": "upsert", "kind": "list", "id": db_list.id, "board_id": board.id, "title": db_list.title})
+                    for card in db_list.cards:
+                        self.apply(self._card_event(card, board.id))
+
+    # Querying
+
+    def search(self, query) -> List[Tuple[float, str, int, str]]:
+        """(rank, type, id, title) for every match the user can see, best first."""
+        terms = query.terms
+        if not terms:
+            return []
+        due_start, due_end = naive_utc(query.due_date_start), naive_utc(query.due_date_end)
+        hits = []
+        with self._lock:
+            board_ids = self.boards_by_owner.get(query.user_id, set())
+            if query.board_id:
+                board_ids = board_ids & {query.board_id}
+            for board_id in board_ids:
+                partition = self.partitions[board_id]
+                for key in partition.match(terms):
+                    doc = partition.docs[key]
+                    if doc.kind == "card":
+                        if query.label and query.label not in doc.labels:
+                            continue
+                        if due_start and (doc.due_date is None or doc.due_date < due_start):
+                            continue
+                        if due_end and (doc.due_date is None or doc.due_date > due_end):
+                            continue
+                    weight = sum(
+                        TITLE_WEIGHT if any(t.startswith(term) for t in doc.title_terms) else 1.0
+                        for term in terms
+                    )
+                    hits.append((weight / (len(terms) * TITLE_WEIGHT), doc.kind, doc.id, doc.title))
+        hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+        return hits
+
+    # Cross-worker updates
+
+    async def attach_broker(self, broker: Broker):
+        self._broker = broker
+        self._loop = asyncio.get_running_loop()
+        await broker.subscribe(self.channel, self._on_events)
+
+    async def detach_broker(self):
+        if self._broker is not None:
+            await self._broker.unsubscribe(self.channel, self._on_events)
+        self._broker = None
+        self._loop = None
+
+    async def _on_events(self, channel: str, data: str):
+        message = json.loads(data)
+        if message["origin"] == self._index_id:
+            return
+        for event in message["events"]:
+            self.apply(event)
+
+    def _publish(self, events: List[dict]):
+        if self._broker is None or self._loop is None:
+            return
+        message = json.dumps({"origin": self._index_id, "events": events})
+        publish_from_any_thread(self._broker, self._loop, self.channel, message)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,187 @@
+# app/stats.py
+"""Per-list counters behind GET /boards/{board_id}/statistics.
+
+Writes that add, move or delete cards, or change checklist items, count the
+cards they touch before and after the change and add the difference to those
+lists' list_statistics rows in the same transaction. The endpoint then reads
+one row per list; reconcile() recounts everything periodically to repair any
+drift.
+
+Overdue cards aren't counted here: a card becomes overdue just by time
+passing, with no write to count it, so a later delta would subtract what was
+never added. The endpoint counts those when it's read (overdue_counts()).
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("card_count", "checklist_items", "checklist_items_done")
+
+# list id -> counter name -> value
+Counts = Dict[int, Dict[str, int]]
+
+
+def utcnow() -> datetime:
+    # due_date is stored without a timezone, as UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps from requests may carry an offset; asyncpg won't bind those
+    # to a column without a timezone, so convert them to naive UTC first.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _counts_statement(card_filter):
+    item = models.ChecklistItem
+    items = (
+        select(
+            models.Checklist.card_id,
+            func.count(item.id).label("total"),
+            func.sum(case((item.completed.is_(True), 1), else_=0)).label("done"),
+        )
+        .join(item, item.checklist_id == models.Checklist.id)
+        .where(models.Checklist.card_id.in_(select(models.Card.id).where(card_filter)))
+        .group_by(models.Checklist.card_id)
+        .subquery()
+    )
+    return (
+        select(
+            models.Card.list_id,
+            func.count(models.Card.id),
+            func.sum(items.c.total),
+            func.sum(items.c.done),
+        )
+        .outerjoin(items, items.c.card_id == models.Card.id)
+        .where(card_filter)
+        .group_by(models.Card.list_id)
+    )
+
+
+def snapshot(db: Session, card_filter) -> Counts:
+    """What the cards matching `card_filter` contribute to each list's counters."""
+    rows = db.execute(_counts_statement(card_filter))
+    return {row[0]: dict(zip(COUNTERS, (int(value or 0) for value in row[1:]))) for row in rows}
+
+
+def new_cards(cards: Iterable[models.Card]) -> Counts:
+    """The same as snapshot() for cards just inserted, without a query."""
+    counts: Counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for card in cards:
+        counts[card.list_id]["card_count"] += 1
+    return counts
+
+
+def apply(db: Session, before: Counts, after: Counts):
+    """Adds the change from `before` to `after` to the stored counters. One
+    executemany UPDATE, in list id order so concurrent writers lock rows in
+    the same order."""
+    deltas: Counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for sign, counts in ((-1, before), (1, after)):
+        for list_id, values in counts.items():
+            for name, value in values.items():
+                deltas[list_id][name] += sign * value
+    rows = [
+        {"b_list_id": list_id, **{f"b_{name}": value for name, value in delta.items()}}
+        for list_id, delta in sorted(deltas.items()) if list_id is not None and any(delta.values())
+    ]
+    if not rows:
+        return
+    table = models.ListStatistics.__table__
+    db.execute(
+        update(table).where(table.c.list_id == bindparam("b_list_id"))
+        .values({name: table.c[name] + bindparam(f"b_{name}") for name in COUNTERS}),
+        rows,
+    )
+
+
+def record(db: Session, card_filter, before: Optional[Counts] = None):
+    """Flushes pending changes and applies them to the counters of the cards
+    matching `card_filter`. `before` is their snapshot() from before the
+    change; leave it out for new cards."""
+    db.flush()
+    apply(db, before or {}, snapshot(db, card_filter))
+
+
+def overdue_counts(list_ids):
+    """Per list, how many of its cards are past their due date now, for the
+    lists `list_ids` selects. A range scan of ix_cards_list_id_due_date per
+    list."""
+    return (
+        select(models.Card.list_id, func.count().label("overdue_count"))
+        .where(models.Card.list_id.in_(list_ids), models.Card.due_date < utcnow())
+        .group_by(models.Card.list_id)
+    )
+
+
+def card_of_checklist(checklist_id: int):
+    """Card filter for the card a checklist belongs to."""
+    return models.Card.id == select(models.Checklist.card_id).where(
+        models.Checklist.id == checklist_id
+    ).scalar_subquery()
+
+
+def reconcile(db: Session, batch_size: int = 500) -> int:
+    """Recounts every list's counters and rewrites the ones that differ.
+
+    Works through the lists in batches, one transaction each. Returns how many
+    lists had drifted.
+    """
+    drifted = 0
+    last_id = 0
+    while True:
+        list_ids = db.scalars(
+            select(models.List.id).where(models.List.id > last_id).order_by(models.List.id).limit(batch_size)
+        ).all()
+        if not list_ids:
+            return drifted
+        last_id = list_ids[-1]
+        # Lock the rows before counting: a write committing meanwhile waits,
+        # then adds its change on top of the recount
+        stored = {
+            row.list_id: row for row in db.scalars(
+                select(models.ListStatistics).where(models.ListStatistics.list_id.in_(list_ids))
+                .order_by(models.ListStatistics.list_id).with_for_update()
+            )
+        }
+        actual = snapshot(db, models.Card.list_id.in_(list_ids))
+        for list_id in list_ids:
+            counts = actual.get(list_id, dict.fromkeys(COUNTERS, 0))
+            row = stored.get(list_id)
+            if row is None:
+                row = models.ListStatistics(list_id=list_id, **dict.fromkeys(COUNTERS, 0))
+                db.add(row)
+            differences = {
+                name: (getattr(row, name), value) for name, value in counts.items() if getattr(row, name) != value
+            }
+            if differences:
+                drifted += 1
+                logger.warning(f"List {list_id} statistics drifted (stored, actual): {differences}")
+            for name, value in counts.items():
+                setattr(row, name, value)
+        db.commit()
+
+
+async def reconcile_periodically(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        db = session_factory()
+        try:
+            drifted = await asyncio.to_thread(reconcile, db)
+            if drifted:
+                logger.warning(f"Repaired statistics for {drifted} lists")
+        except Exception:
+            logger.exception("Statistics reconciliation failed")
+        finally:
+            db.close()
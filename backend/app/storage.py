@@ -0,0 +1,223 @@
+# app/storage.py
+"""Content-addressed storage for uploaded files.
+
+Objects are named by the SHA-256 of their content, so the same file
+uploaded twice, under any name, is stored once. Writes stream chunk by
+chunk, hashing as they go, and give up as soon as an upload passes its
+size limit.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, AsyncIterator, List, NamedTuple
+
+from fastapi import HTTPException
+
+from .config import STORAGE_BACKEND, STORAGE_ROOT
+
+
+# Bytes read at a time when assembling parts
+PART_READ_SIZE = 1024 * 1024
+
+
+class StoredObject(NamedTuple):
+    sha256: str
+    size: int
+    # Where the backend keeps it, e.g. a path under the storage root
+    location: str
+
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Uploads are limited to {max_size} bytes")
+
+
+class Storage(ABC):
+    """Backend interface. Local disk for now; an S3-compatible backend
+    implements the same methods."""
+
+    @abstractmethod
+    async def save(self, chunks: AsyncIterable[bytes], max_size: int) -> StoredObject:
+        """Stores the streamed content under its SHA-256, unless an object with
+        that hash already exists. Raises 413 once more than `max_size` bytes
+        have arrived, keeping nothing."""
+
+    @abstractmethod
+    async def exists(self, sha256: str) -> bool:
+        ...
+
+    @abstractmethod
+    def local_path(self, location: str) -> str:
+        """A path the file at `location` can be served from."""
+
+    @abstractmethod
+    async def put(self, location: str, data: bytes):
+        """Writes a small file derived from stored ones, such as a thumbnail,
+        at a location of the caller's choosing."""
+
+    # Resumable uploads arrive as numbered parts, in any order and possibly in
+    # parallel, and are assembled into one object once all are in
+
+    @abstractmethod
+    async def save_part(self, upload_id: str, index: int, chunks: AsyncIterable[bytes], size: int):
+        """Stores part `index` of an upload, which must be exactly `size`
+        bytes. Sending a part again replaces it."""
+
+    @abstractmethod
+    async def parts(self, upload_id: str) -> List[int]:
+        ...
+
+    @abstractmethod
+    async def assemble(self, upload_id: str, count: int, max_size: int) -> StoredObject:
+        """Saves parts 0 to `count - 1`, in order, as one object."""
+
+    @abstractmethod
+    async def discard_parts(self, upload_id: str):
+        ...
+
+    @abstractmethod
+    async def stale_uploads(self, older_than: float) -> List[str]:
+        """Uploads with no part written for `older_than` seconds."""
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str):
+        self.root = root
+
+    def location(self, sha256: str) -> str:
+        # Two levels of fan-out keep directories small
+        return os.path.join("objects", sha256[:2], sha256[2:4], sha256)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, self.location(sha256))
+
+    @staticmethod
+    def _write(out, digest, chunk: bytes):
+        digest.update(chunk)
+        out.write(chunk)
+
+    def _commit(self, temp_path: str, sha256: str):
+        path = self.path(sha256)
+        if os.path.exists(path):
+            # Already stored by an earlier upload
+            os.remove(temp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic, so readers never see a partial object; a concurrent upload of
+        # the same content just replaces it with identical bytes
+        os.replace(temp_path, path)
+
+    async def save(self, chunks: AsyncIterable[bytes], max_size: int) -> StoredObject:
+        temp_dir = os.path.join(self.root, "tmp")
+        await asyncio.to_thread(os.makedirs, temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise too_large(max_size)
+                    # Disk writes and hashing happen off the event loop
+                    await asyncio.to_thread(self._write, out, digest, chunk)
+            sha256 = digest.hexdigest()
+            await asyncio.to_thread(self._commit, temp_path, sha256)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return StoredObject(sha256, size, self.location(sha256))
+
+    async def exists(self, sha256: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(sha256))
+
+    def local_path(self, location: str) -> str:
+        return os.path.join(self.root, location)
+
+    def _put(self, location: str, data: bytes):
+        path = self.local_path(location)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    async def put(self, location: str, data: bytes):
+        await asyncio.to_thread(self._put, location, data)
+
+    def _parts_dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, "parts", upload_id)
+
+    async def save_part(self, upload_id: str, index: int, chunks: AsyncIterable[bytes], size: int):
+        parts_dir = self._parts_dir(upload_id)
+        await asyncio.to_thread(os.makedirs, parts_dir, exist_ok=True)
+        # Written beside the others and renamed into place when complete, so
+        # a part that's listed is always whole
+        fd, temp_path = tempfile.mkstemp(dir=parts_dir, prefix=".")
+        received = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    received += len(chunk)
+                    if received > size:
+                        raise HTTPException(status_code=413, detail=f"Chunk {index} is {size} bytes")
+                    await asyncio.to_thread(out.write, chunk)
+            if received != size:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} is {size} bytes, got {received}")
+            await asyncio.to_thread(os.replace, temp_path, os.path.join(parts_dir, str(index)))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def parts(self, upload_id: str) -> List[int]:
+        try:
+            names = await asyncio.to_thread(os.listdir, self._parts_dir(upload_id))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    async def _read_parts(self, upload_id: str, count: int) -> AsyncIterator[bytes]:
+        parts_dir = self._parts_dir(upload_id)
+        for index in range(count):
+            f = await asyncio.to_thread(open, os.path.join(parts_dir, str(index)), "rb")
+            try:
+                while chunk := await asyncio.to_thread(f.read, PART_READ_SIZE):
+                    yield chunk
+            finally:
+                f.close()
+
+    async def assemble(self, upload_id: str, count: int, max_size: int) -> StoredObject:
+        # Streamed through save() like any upload: hashed on the way, one
+        # read size in memory at a time
+        return await self.save(self._read_parts(upload_id, count), max_size)
+
+    async def discard_parts(self, upload_id: str):
+        await asyncio.to_thread(shutil.rmtree, self._parts_dir(upload_id), True)
+
+    def _stale_uploads(self, cutoff: float) -> List[str]:
+        try:
+            entries = list(os.scandir(os.path.join(self.root, "parts")))
+        except FileNotFoundError:
+            return []
+        return [entry.name for entry in entries if entry.is_dir() and entry.stat().st_mtime < cutoff]
+
+    async def stale_uploads(self, older_than: float) -> List[str]:
+        return await asyncio.to_thread(self._stale_uploads, time.time() - older_than)
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    if backend == "local":
+        return LocalStorage(STORAGE_ROOT)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage()
@@ -0,0 +1,63 @@
+# app/thumbnails.py
+"""Square thumbnails of an uploaded image.
+
+Runs in the avatar worker processes, so it imports nothing from the app
+beyond what it needs.
+"""
+import io
+from typing import Dict, Sequence
+
+from PIL import Image, ImageOps
+
+# Extension: (Pillow format, save options). Only pixels are written; EXIF,
+# XMP and ICC data from the source are left behind
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+class NotAnImage(ValueError):
+    """The upload can't be made into thumbnails, however often it's tried."""
+
+
+def variant_names(sizes: Sequence[int]) -> list:
+    return [f"{size}.{extension}" for size in sizes for extension in FORMATS]
+
+
+def _encode(image: Image.Image, extension: str) -> bytes:
+    image_format, options = FORMATS[extension]
+    if image_format == "JPEG":
+        # No alpha in JPEG: flatten transparent areas onto white
+        flat = Image.new("RGB", image.size, "white")
+        flat.paste(image, mask=image.getchannel("A"))
+        image = flat
+    out = io.BytesIO()
+    image.save(out, image_format, **options)
+    return out.getvalue()
+
+
+def render(path: str, sizes: Sequence[int], max_pixels: int) -> Dict[str, bytes]:
+    """Every size in every format, keyed by variant name (e.g. "64.webp").
+    Raises NotAnImage if the file isn't an image Pillow can read or has more
+    than `max_pixels` pixels."""
+    try:
+        with Image.open(path) as image:
+            if image.width * image.height > max_pixels:
+                raise NotAnImage(f"Image is {image.width}x{image.height}, more than {max_pixels} pixels")
+            # JPEGs can be decoded straight at a fraction of their size, which
+            # is most of the work for a large photo
+            image.draft("RGB", (max(sizes), max(sizes)))
+            # Phones store photos sideways with an orientation tag; apply it
+            # since the tag doesn't survive
+            image = ImageOps.exif_transpose(image).convert("RGBA")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        # Unrecognised, truncated or corrupt
+        raise NotAnImage(str(e))
+
+    variants = {}
+    for size in sizes:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for extension in FORMATS:
+            variants[f"{size}.{extension}"] = _encode(thumbnail, extension)
+    return variants
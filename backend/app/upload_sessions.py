@@ -0,0 +1,89 @@
+# app/upload_sessions.py
+"""Resumable uploads.
+
+A client starts a session for a file of known size, PUTs its numbered
+chunks in any order (retrying or sending several at once as it likes), asks
+which have arrived, and completes the session to turn it into an
+attachment. Chunks are kept by storage, not the database, so sending one
+doesn't write a row. Sessions that are never completed are removed once
+they expire.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .config import UPLOAD_SESSION_TTL
+from .storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_count(upload: models.UploadSession) -> int:
+    return -(-upload.size // upload.chunk_size)
+
+
+def chunk_length(upload: models.UploadSession, index: int) -> int:
+    return min(upload.chunk_size, upload.size - index * upload.chunk_size)
+
+
+def describe(upload: models.UploadSession, received: List[int]) -> schemas.UploadSession:
+    return schemas.UploadSession(
+        id=upload.id,
+        card_id=upload.card_id,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        size=upload.size,
+        chunk_size=upload.chunk_size,
+        chunk_count=chunk_count(upload),
+        received=received,
+        expires_at=upload.expires_at,
+    )
+
+
+def is_expired(upload: models.UploadSession) -> bool:
+    expires_at = upload.expires_at
+    if expires_at.tzinfo is None:
+        # SQLite hands timezone-aware columns back naive
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= datetime.now(timezone.utc)
+
+
+def delete_expired(db: Session) -> List[str]:
+    expired = db.scalars(
+        delete(models.UploadSession)
+        .where(models.UploadSession.expires_at <= datetime.now(timezone.utc))
+        .returning(models.UploadSession.id)
+    ).all()
+    db.commit()
+    return expired
+
+
+async def collect_expired(db: Session) -> int:
+    """Removes expired sessions and their chunks, and any chunks left behind
+    with no session, e.g. by a deleted card. Returns how many were removed."""
+    expired = set(await asyncio.to_thread(delete_expired, db))
+    # Nothing is written to a live session's chunks after it expires, so
+    # chunks untouched for a whole TTL can't belong to one
+    expired.update(await storage.stale_uploads(UPLOAD_SESSION_TTL))
+    for upload_id in expired:
+        await storage.discard_parts(upload_id)
+    return len(expired)
+
+
+async def collect_periodically(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        db = session_factory()
+        try:
+            removed = await collect_expired(db)
+            if removed:
+                logger.info(f"Removed {removed} abandoned uploads")
+        except Exception:
+            logger.exception("Upload cleanup failed")
+        finally:
+            db.close()
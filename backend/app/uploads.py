@@ -0,0 +1,144 @@
+# app/uploads.py
+"""Reads file uploads from the request body as it streams in.
+
+FastAPI's UploadFile spools the whole multipart body to a temporary file
+before the route runs. Routes that take large files read the body
+themselves instead: either multipart/form-data with a `file` field, parsed
+incrementally, or the raw bytes with the name in a `filename` query
+parameter.
+"""
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+FILE_FIELD = b"file"
+
+
+class Upload:
+    """One uploaded file: its name and type, and its content as an async
+    iterator of chunks. Iterate it once."""
+
+    def __init__(self, filename: str, content_type: Optional[str], chunks: AsyncIterator[bytes]):
+        self.filename = filename
+        self.content_type = content_type
+        self._chunks = chunks
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._chunks
+
+
+class _MultipartFile:
+    # Collects the bytes of the first `file` part as the parser finds them
+
+    def __init__(self, boundary: bytes):
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.data: List[bytes] = []
+        self.in_file = False
+        self.finished = False
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if self.filename is None and options.get(b"name") == FILE_FIELD and b"filename" in options:
+            self.in_file = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            content_type = self._headers.get(b"content-type")
+            self.content_type = content_type.decode("latin-1") if content_type else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.in_file:
+            # The parser reuses its buffer, so copy
+            self.data.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        if self.in_file:
+            self.in_file = False
+            self.finished = True
+
+
+async def _multipart_upload(request: Request, boundary: bytes) -> Upload:
+    part = _MultipartFile(boundary)
+    body = request.stream()
+    # Read up to the file part's headers, to know its name before storing it
+    async for chunk in body:
+        part.parser.write(chunk)
+        if part.filename is not None:
+            break
+    if part.filename is None:
+        raise HTTPException(status_code=400, detail="No file in the upload")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while True:
+            while part.data:
+                yield part.data.pop(0)
+            if part.finished:
+                return
+            chunk = await anext(body, None)
+            if chunk is None:
+                raise HTTPException(status_code=400, detail="Upload ended before the file did")
+            part.parser.write(chunk)
+
+    return Upload(part.filename, part.content_type, chunks())
+
+
+async def read_upload(request: Request, filename: Optional[str] = None) -> Upload:
+    """The file in the request body, without buffering it."""
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type == b"multipart/form-data":
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Missing multipart boundary")
+        return await _multipart_upload(request, boundary)
+    if not filename:
+        raise HTTPException(status_code=400, detail="A filename query parameter is required for raw uploads")
+    raw_type = content_type.decode("latin-1") if content_type else None
+    return Upload(filename, raw_type, request.stream())
+
+
+def upload_body() -> dict:
+    # The body is read by hand to stream it, so describe it for the OpenAPI docs
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    }
+                },
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
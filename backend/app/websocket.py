@@ -1,70 +1,248 @@
 # app/websocket.py
 import asyncio
-from fastapi import WebSocket, WebSocketDisconnect, Depends
+import logging
+from fastapi import WebSocket, WebSocketDisconnect
 from typing import Dict, List, Optional
 
-from .config import SECRET_KEY, ALGORITHM
-from . import models, auth
-from sqlalchemy.orm import Session
-from .database import get_db
+from . import models
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from .broker import Broker, InMemoryBroker
 import json
 import time
-from jose import JWTError, jwt
+import uuid
 
-class ConnectionManager:
+logger = logging.getLogger(__name__)
+
+OUTBOUND_QUEUE_SIZE = 64  # Messages buffered per socket before the oldest are dropped
+SLOW_CONSUMER_DROP_LIMIT = 256  # Drops since the last successful write before a socket is evicted
+SLOW_CONSUMER_CLOSE_CODE = 1013  # "Try again later"
+MAX_SUBSCRIPTIONS_PER_SOCKET = 500  # Channels a single board socket may multiplex
+
+
+class ChannelMetrics:
     def __init__(self):
-        # Store connections by card_id for targeted broadcasting
-        self.card_connections: Dict[int, List[WebSocket]] = {}
+        self.broadcasts = 0
+        self.deliveries = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record_delivery(self, latency: float):
+        self.deliveries += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+
+class ClientConnection:
+    """A socket with its own bounded outbound queue and writer task, so a slow
+    client only ever delays its own messages."""
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, user_id: int):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.channels = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.dropped = 0
+        self.writer = asyncio.create_task(self._write())
+
+    def enqueue(self, channel: Optional[str], payload: str, sent_at: float) -> bool:
+        # Returns False once the client has fallen too far behind to keep
+        if self.queue.full():
+            # Coalesce by dropping the oldest message; newer ones supersede it
+            dropped_channel, _, _ = self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+            if dropped_channel in self.manager.metrics:
+                self.manager.metrics[dropped_channel].dropped += 1
+        self.queue.put_nowait((channel, payload, sent_at))
+        return self.dropped < SLOW_CONSUMER_DROP_LIMIT
+
+    async def _write(self):
+        while True:
+            channel, payload, sent_at = await self.queue.get()
+            try:
+                await self.websocket.send_text(payload)
+            except Exception:
+                self.queue.task_done()
+                await self.manager.remove(self.websocket)
+                return
+            self.dropped = 0
+            if channel in self.manager.metrics:
+                self.manager.metrics[channel].record_delivery(time.time() - sent_at)
+            self.queue.task_done()
+
+    async def stop(self):
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+            await asyncio.gather(self.writer, return_exceptions=True)
+
+
+class ConnectionManager:
+    def __init__(self, broker: Optional[Broker] = None):
+        # Transport shared by every worker; defaults to in-process delivery
+        self.broker: Broker = broker or InMemoryBroker()
+        # Identifies this manager in published envelopes so "exclude" works across workers
+        self.manager_id = uuid.uuid4().hex
+        # Sockets subscribed to each channel ("card:1", "list:2", "board:3") for targeted broadcasting
+        self.channel_connections: Dict[str, List[WebSocket]] = {}
+        # Outbound queue and writer for every live socket
+        self.clients: Dict[WebSocket, ClientConnection] = {}
         # Store user_id with each connection for authentication
         self.socket_users: Dict[WebSocket, int] = {}
+        self.metrics: Dict[str, ChannelMetrics] = {}
 
-    async def connect(self, websocket: WebSocket, card_id: int, user_id: int):
+    @staticmethod
+    def card_channel(card_id: int) -> str:
+        return f"card:{card_id}"
+
+    @staticmethod
+    def list_channel(list_id: int) -> str:
+        return f"list:{list_id}"
+
+    @staticmethod
+    def board_channel(board_id: int) -> str:
+        return f"board:{board_id}"
+
+    async def register(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
-        if card_id not in self.card_connections:
-            self.card_connections[card_id] = []
-        self.card_connections[card_id].append(websocket)
+        if websocket not in self.clients:
+            self.clients[websocket] = ClientConnection(self, websocket, user_id)
         self.socket_users[websocket] = user_id
-        print(f"Client connected to card {card_id}. Active connections: {len(self.card_connections[card_id])}")
 
-    def disconnect(self, websocket: WebSocket, card_id: int):
-        if card_id in self.card_connections:
-            self.card_connections[card_id].remove(websocket)
-            if not self.card_connections[card_id]:
-                del self.card_connections[card_id]
-        if websocket in self.socket_users:
-            del self.socket_users[websocket]
+    async def subscribe(self, websocket: WebSocket, channel: str):
+        client = self.clients[websocket]
+        if channel in client.channels:
+            return
+        if channel not in self.channel_connections:
+            self.channel_connections[channel] = []
+            self.metrics[channel] = ChannelMetrics()
+            # Only subscribe to channels this worker has live sockets on
+            await self.broker.subscribe(channel, self._on_broker_message)
+        self.channel_connections[channel].append(websocket)
+        client.channels.add(channel)
+
+    async def unsubscribe(self, websocket: WebSocket, channel: str):
+        if channel in self.channel_connections:
+            if websocket in self.channel_connections[channel]:
+                self.channel_connections[channel].remove(websocket)
+            if not self.channel_connections[channel]:
+                del self.channel_connections[channel]
+                self.metrics.pop(channel, None)
+                await self.broker.unsubscribe(channel, self._on_broker_message)
+        client = self.clients.get(websocket)
+        if client:
+            client.channels.discard(channel)
+
+    async def connect(self, websocket: WebSocket, card_id: int, user_id: int):
+        await self.register(websocket, user_id)
+        await self.subscribe(websocket, self.card_channel(card_id))
+        logger.debug(f"Client connected to card {card_id}. Active connections: {len(self.channel_connections[self.card_channel(card_id)])}")
+
+    async def connect_board(self, websocket: WebSocket, board_id: int, user_id: int):
+        await self.register(websocket, user_id)
+        await self.subscribe(websocket, self.board_channel(board_id))
+
+    async def disconnect(self, websocket: WebSocket, card_id: int):
+        await self.unsubscribe(websocket, self.card_channel(card_id))
+        client = self.clients.get(websocket)
+        if client and not client.channels:
+            await self.remove(websocket)
+
+    async def remove(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        self.socket_users.pop(websocket, None)
+        if client:
+            for channel in list(client.channels):
+                await self.unsubscribe(websocket, channel)
+            await client.stop()
+
+    async def evict(self, websocket: WebSocket):
+        client = self.clients.get(websocket)
+        if not client:
+            return
+        for channel in client.channels:
+            self.metrics[channel].evicted += 1
+        await self.remove(websocket)
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    async def broadcast(self, channel: str, message: dict, exclude: Optional[WebSocket] = None):
+        # Serialize once per broadcast; every socket on every worker gets the same text frame
+        envelope = {
+            "origin": self.manager_id,
+            "exclude": id(exclude) if exclude is not None else None,
+            "sent_at": time.time(),
+            "payload": json.dumps(message, default=str),
+        }
+        await self.broker.publish(channel, json.dumps(envelope))
 
     async def broadcast_to_card(self, card_id: int, message: dict, exclude: Optional[WebSocket] = None):
-        if card_id in self.card_connections:
-            for connection in self.card_connections[card_id]:
-                if connection != exclude:
-                    try:
-                        await connection.send_json(message)
-                    except:
-                        await self.disconnect(connection, card_id)
+        await self.broadcast(self.card_channel(card_id), message, exclude)
+
+    async def broadcast_to_list(self, list_id: int, message: dict, exclude: Optional[WebSocket] = None):
+        await self.broadcast(self.list_channel(list_id), message, exclude)
+
+    async def broadcast_to_board(self, board_id: int, message: dict, exclude: Optional[WebSocket] = None):
+        await self.broadcast(self.board_channel(board_id), message, exclude)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        client = self.clients.get(websocket)
+        if client and not client.enqueue(None, json.dumps(message, default=str), time.time()):
+            await self.evict(websocket)
+
+    async def _on_broker_message(self, channel: str, data: str):
+        envelope = json.loads(data)
+        exclude = envelope["exclude"] if envelope.get("origin") == self.manager_id else None
+        await self.send_local(channel, envelope["payload"], envelope["sent_at"], exclude_id=exclude)
+
+    async def send_local(self, channel: str, payload: str, sent_at: float, exclude_id: Optional[int] = None):
+        if channel in self.metrics:
+            self.metrics[channel].broadcasts += 1
+        slow = []
+        for connection in list(self.channel_connections.get(channel, [])):
+            if id(connection) == exclude_id:
+                continue
+            client = self.clients.get(connection)
+            if client and not client.enqueue(channel, payload, sent_at):
+                slow.append(connection)
+        for connection in slow:
+            await self.evict(connection)
+
+    async def drain(self):
+        # Wait until every queued message has been written or dropped
+        await asyncio.gather(*(client.queue.join() for client in list(self.clients.values())))
+
+    def get_metrics(self) -> dict:
+        channels = {}
+        for channel, connections in self.channel_connections.items():
+            metrics = self.metrics[channel]
+            depths = [self.clients[ws].queue.qsize() for ws in connections if ws in self.clients]
+            channels[channel] = {
+                "connections": len(connections),
+                "broadcasts": metrics.broadcasts,
+                "deliveries": metrics.deliveries,
+                "dropped": metrics.dropped,
+                "evicted": metrics.evicted,
+                "avg_fanout_latency_ms": (metrics.total_latency / metrics.deliveries * 1000) if metrics.deliveries else 0.0,
+                "max_fanout_latency_ms": metrics.max_latency * 1000,
+                "queue_depth": sum(depths),
+                "max_queue_depth": max(depths, default=0),
+            }
+        return {"connections": len(self.clients), "channels": channels}
 
 # Create global connection manager
 manager = ConnectionManager()
 
-# Verify WebSocket token
-async def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
-    try:
-        # Remove 'Bearer ' prefix if present
-        token = token.replace('Bearer ', '')
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        
-        user = db.query(models.User).filter(models.User.username == username).first()
-        return user
-    except JWTError:
-        return None
 MESSAGE_RATE_LIMIT = 0.1  # Minimum time between messages in seconds
 
-async def handle_websocket(websocket: WebSocket, card_id: int, token: str, db: Session):
+async def handle_websocket(websocket: WebSocket, card_id: int, user_id: int):
+    # Relay messages from an already connected and authorized socket
     try:
-        await websocket.accept()
         last_message_time = 0
         
         while True:
@@ -78,21 +256,113 @@ async def handle_websocket(websocket: WebSocket, card_id: int, token: str, db: S
             # Validate message format
             if not all(key in data for key in ['type', 'action', 'data']):
                 continue
-                
-            # Add user info to message
-            user = await get_user_from_token(token, db)
-            if not user:
-                await websocket.close(code=4001)
-                return
             
-            data['user_id'] = user.id
+            # Add user info to message
+            data['user_id'] = user_id
             
-            # Broadcast to all other clients subscribed to this card
+            # Broadcast to all other clients subscribed to this card, on every worker
             await manager.broadcast_to_card(card_id, data, exclude=websocket)
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket, card_id)
+        await manager.disconnect(websocket, card_id)
     except Exception as e:
         print(f"WebSocket error: {e}")
+        await manager.disconnect(websocket, card_id)
         await websocket.close(code=1011)  # Internal error
-        manager.disconnect(websocket, card_id)
\ No newline at end of file
+
+
+async def resolve_board_targets(sessions: async_sessionmaker, board_id: int, card_ids: List[int], list_ids: List[int]):
+    # Keep only the cards and lists that belong to this board: one query per kind
+    # instead of a full access check per card. The session is only held for
+    # the lookup, not while the socket stays open
+    cards = []
+    lists = []
+    async with sessions() as db:
+        if card_ids:
+            cards = list(await db.scalars(
+                select(models.Card.id).where(models.Card.board_id == board_id, models.Card.id.in_(card_ids))
+            ))
+        if list_ids:
+            lists = list(await db.scalars(
+                select(models.List.id).where(models.List.board_id == board_id, models.List.id.in_(list_ids))
+            ))
+    return cards, lists
+
+
+def _int_ids(values) -> List[int]:
+    if not isinstance(values, list):
+        return []
+    return [value for value in values if isinstance(value, int)]
+
+
+async def handle_board_websocket(websocket: WebSocket, board_id: int, user_id: int, sessions: async_sessionmaker):
+    # Multiplex card and list subscriptions for one board over a single socket
+    try:
+        last_message_time = 0
+        
+        while True:
+            current_time = time.time()
+            if current_time - last_message_time < MESSAGE_RATE_LIMIT:
+                await asyncio.sleep(MESSAGE_RATE_LIMIT - (current_time - last_message_time))
+            
+            data = await websocket.receive_json()
+            last_message_time = time.time()
+
+            if data.get('action') in ('subscribe', 'unsubscribe') and 'data' not in data:
+                await _update_board_subscriptions(websocket, board_id, data, sessions)
+                continue
+
+            # Validate message format
+            if not all(key in data for key in ['type', 'action', 'data']):
+                continue
+
+            data['user_id'] = user_id
+            data['boardId'] = board_id
+
+            # Publish to the most specific channel the socket is subscribed to
+            subscribed = manager.clients[websocket].channels
+            card_id = data.get('cardId')
+            list_id = data.get('listId')
+            if isinstance(card_id, int) and manager.card_channel(card_id) in subscribed:
+                await manager.broadcast_to_card(card_id, data, exclude=websocket)
+            elif isinstance(list_id, int) and manager.list_channel(list_id) in subscribed:
+                await manager.broadcast_to_list(list_id, data, exclude=websocket)
+            else:
+                await manager.broadcast_to_board(board_id, data, exclude=websocket)
+
+    except WebSocketDisconnect:
+        await manager.remove(websocket)
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+        await manager.remove(websocket)
+        await websocket.close(code=1011)  # Internal error
+
+
+async def _update_board_subscriptions(websocket: WebSocket, board_id: int, data: dict, sessions: async_sessionmaker):
+    card_ids = _int_ids(data.get('cards'))
+    list_ids = _int_ids(data.get('lists'))
+    client = manager.clients[websocket]
+
+    if data['action'] == 'subscribe':
+        room = MAX_SUBSCRIPTIONS_PER_SOCKET - len(client.channels)
+        card_ids = card_ids[:max(room, 0)]
+        list_ids = list_ids[:max(room - len(card_ids), 0)]
+        card_ids, list_ids = await resolve_board_targets(sessions, board_id, card_ids, list_ids)
+        for card_id in card_ids:
+            await manager.subscribe(websocket, manager.card_channel(card_id))
+        for list_id in list_ids:
+            await manager.subscribe(websocket, manager.list_channel(list_id))
+        action = 'subscribed'
+    else:
+        for card_id in card_ids:
+            await manager.unsubscribe(websocket, manager.card_channel(card_id))
+        for list_id in list_ids:
+            await manager.unsubscribe(websocket, manager.list_channel(list_id))
+        action = 'unsubscribed'
+
+    await manager.send_personal(websocket, {
+        'type': 'subscription',
+        'action': action,
+        'boardId': board_id,
+        'data': {'cards': card_ids, 'lists': list_ids},
+    })
@@ -0,0 +1,109 @@
+# benchmarks/card_batch.py
+"""Compares rows/sec of the old per-card batch insert with the set-based one.
+
+Run from the backend directory:
+
+    python -m benchmarks.card_batch --cards 500 --rounds 5
+
+Uses a throwaway SQLite file by default. Point BENCH_DATABASE_URL at a scratch
+Postgres database to include real network round trips, which is where the
+per-card path hurts most.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import bulk, models, schemas
+from app.database import async_url
+from app.permissions import permissions
+
+
+def legacy_create_cards(db, user_id, cards):
+    # The batch endpoint before it went set-based: a check and a refresh per card
+    created_cards = []
+    for card_data in cards:
+        if not permissions.is_owner(db, user_id, permissions.board_for_list(db, card_data.list_id)):
+            raise RuntimeError("List not found or access denied")
+        db_card = models.Card(**card_data.model_dump())
+        db.add(db_card)
+        created_cards.append(db_card)
+    db.commit()
+    for card in created_cards:
+        db.refresh(card)
+    return created_cards
+
+
+def seed(engine):
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username="bench@example.com", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    board = models.Board(title="Import", owner_id=user.id)
+    db.add(board)
+    db.flush()
+    lists = [models.List(title=f"List {i}", board_id=board.id) for i in range(10)]
+    db.add_all(lists)
+    db.commit()
+    ids = user.id, [l.id for l in lists]
+    db.close()
+    return ids
+
+
+async def run(url: str, cards: int, rounds: int):
+    engine = create_engine(url)
+    async_engine = create_async_engine(async_url(url))
+    user_id, list_ids = seed(engine)
+    payload = [
+        schemas.CardCreate(title=f"Imported card {i}", description="From CSV", list_id=list_ids[i % len(list_ids)])
+        for i in range(cards)
+    ]
+
+    legacy, set_based = [], []
+    for _ in range(rounds):
+        # Cold permission caches, as for a fresh import
+        permissions.clear()
+        db = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        legacy_create_cards(db, user_id, payload)
+        legacy.append(cards / (time.perf_counter() - start))
+        db.close()
+
+        async with AsyncSession(async_engine, expire_on_commit=False) as adb:
+            start = time.perf_counter()
+            await bulk.create_cards(adb, user_id, payload)
+            set_based.append(cards / (time.perf_counter() - start))
+
+    print(f"{cards} cards x {rounds} rounds")
+    print(f"  per-card:  {statistics.median(legacy):10.0f} rows/sec")
+    print(f"  set-based: {statistics.median(set_based):10.0f} rows/sec")
+    print(f"  speedup:   {statistics.median(set_based) / statistics.median(legacy):10.1f}x")
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url:
+        asyncio.run(run(url, args.cards, args.rounds))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.cards, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/login_storm.py
+"""Measures latency of an unrelated endpoint while a burst of logins is in flight.
+
+Run from the backend directory:
+
+    python -m benchmarks.login_storm --logins 200 --probes 200
+
+Uses a throwaway SQLite database and a real bcrypt hash, so the numbers reflect
+how much password work blocks the event loop.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import auth, models
+from app.database import Base, get_db
+from app.main import app
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def no_lifespan(app):
+    yield
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.User(
+        username="storm@example.com",
+        email="storm@example.com",
+        hashed_password=auth.pwd_context.hash("stormpassword"),
+    ))
+    db.commit()
+    db.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(logins: int, probes: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        statuses = {}
+
+        async def login():
+            response = await client.post(
+                "/token",
+                data={"username": "storm@example.com", "password": "stormpassword"},
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe(latencies):
+            start = time.perf_counter()
+            await client.get("/")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        baseline = []
+        for _ in range(probes):
+            await probe(baseline)
+
+        during = []
+        storm = asyncio.gather(*(login() for _ in range(logins)))
+        for _ in range(probes):
+            await probe(during)
+            await asyncio.sleep(0.005)
+        await storm
+
+    for name, samples in (("idle", baseline), ("login storm", during)):
+        print(
+            f"GET / {name:>12}: p50={statistics.median(samples):7.2f}ms "
+            f"p99={percentile(samples, 99):7.2f}ms max={max(samples):7.2f}ms"
+        )
+    print(f"login responses: {dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+
+    seed()
+    app.dependency_overrides[get_db] = override_get_db
+    app.router.lifespan_context = no_lifespan
+    app.state.use_redis = False
+    asyncio.run(run(args.logins, args.probes))
+
+
+if __name__ == "__main__":
+    main()
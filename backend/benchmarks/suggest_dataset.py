@@ -0,0 +1,125 @@
+# benchmarks/suggest_dataset.py
+"""Seeds a large board dataset in Postgres and measures /search/suggest latency.
+
+Run from the backend directory against a scratch database that has the
+migrations applied (pg_trgm and the trigram indexes):
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/taskflow_bench \\
+        python -m benchmarks.suggest_dataset --cards 1000000 --queries 500
+
+Pass --skip-seed to rerun the queries against an existing dataset.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import models
+from app.database import async_url
+from app.search import PostgresSearchBackend, suggestion_cache
+
+WORDS = [
+    "deploy", "pipeline", "invoice", "customer", "migration", "onboarding", "release", "design",
+    "review", "billing", "search", "mobile", "android", "checkout", "metrics", "dashboard",
+    "report", "backup", "security", "audit", "roadmap", "launch", "feedback", "support",
+]
+LABELS = ["bug", "feature", "urgent", "design", "ops", "backend", "frontend", "research"]
+BATCH = 10000
+
+
+def title(rng: random.Random) -> str:
+    return " ".join(rng.sample(WORDS, 3)).capitalize() + f" {rng.randint(1, 9999)}"
+
+
+def seed(url: str, cards: int, cards_per_list: int, lists_per_board: int):
+    rng = random.Random(42)
+    engine = create_engine(url)
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE users, boards, lists, cards, labels RESTART IDENTITY CASCADE"))
+        user_id = conn.execute(insert(models.User).values(
+            username="bench@example.com", email="bench@example.com", hashed_password="x"
+        ).returning(models.User.id)).scalar_one()
+
+        list_count = max(1, cards // cards_per_list)
+        board_count = max(1, list_count // lists_per_board)
+        conn.execute(insert(models.Board), [
+            {"title": title(rng), "owner_id": user_id} for _ in range(board_count)
+        ])
+        conn.execute(insert(models.List), [
+            {"title": title(rng), "board_id": i % board_count + 1} for i in range(list_count)
+        ])
+        for start in range(0, cards, BATCH):
+            size = min(BATCH, cards - start)
+            conn.execute(insert(models.Card), [
+                {"title": title(rng), "description": title(rng), "list_id": (start + i) % list_count + 1}
+                for i in range(size)
+            ])
+            conn.execute(insert(models.Label), [
+                {"name": rng.choice(LABELS), "color": "red", "card_id": start + i + 1}
+                for i in range(0, size, 10)
+            ])
+            print(f"seeded {start + size}/{cards} cards", end="\r", flush=True)
+        conn.execute(text("ANALYZE"))
+    print()
+    engine.dispose()
+    return user_id
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+async def measure(url: str, user_id: int, queries: int):
+    rng = random.Random(7)
+    backend = PostgresSearchBackend()
+    engine = create_async_engine(async_url(url))
+    latencies = []
+    async with AsyncSession(engine) as db:
+        for _ in range(queries):
+            word = rng.choice(WORDS)
+            prefix = typo(word, rng) if rng.random() < 0.3 else word[:rng.randint(3, len(word))]
+            # Measure the database path, not the per-user cache
+            suggestion_cache.clear()
+            start = time.perf_counter()
+            await backend.suggest(db, user_id, prefix, 10)
+            latencies.append((time.perf_counter() - start) * 1000)
+            await db.rollback()
+    await engine.dispose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"suggest over {queries} queries: p50={statistics.median(latencies):.2f}ms "
+          f"p95={p95:.2f}ms max={latencies[-1]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--cards-per-list", type=int, default=50)
+    parser.add_argument("--lists-per-board", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    url = os.environ["BENCH_DATABASE_URL"]
+    if args.skip_seed:
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            user_id = conn.execute(text("SELECT id FROM users WHERE username = 'bench@example.com'")).scalar_one()
+        engine.dispose()
+    else:
+        user_id = seed(url, args.cards, args.cards_per_list, args.lists_per_board)
+    asyncio.run(measure(url, user_id, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from app.analytics import DAY, compute
+
+LISTS = [(1, "Todo"), (2, "Doing"), (3, "Done")]
+NOW = datetime(2024, 5, 15, 12, tzinfo=timezone.utc).timestamp()
+HOUR = 3600
+
+
+def events(*rows):
+    # (card, created, from list, to list, seconds before NOW), in time order
+    rows = sorted(rows, key=lambda row: -row[4])
+    return {
+        "card": np.array([row[0] for row in rows], dtype=np.int64),
+        "created": np.array([row[1] for row in rows], dtype=bool),
+        "from": np.array([row[2] for row in rows], dtype=float),
+        "to": np.array([row[3] for row in rows], dtype=float),
+        "at": np.array([NOW - row[4] for row in rows], dtype=float),
+    }
+
+
+HISTORY = events(
+    (10, True, None, 1, 3 * DAY),
+    (10, False, 1, 2, 2 * DAY),
+    (10, False, 2, 3, 1 * DAY),
+    (11, True, None, 1, 3 * DAY),
+    (11, False, 1, 2, 2.5 * DAY),
+    (11, False, 2, None, 1 * DAY),
+    (12, True, None, 1, 10 * DAY),
+)
+
+
+def test_cumulative_flow_counts_cards_per_list_at_each_days_end():
+    result = compute(HISTORY, LISTS, None, 7, NOW)
+    assert result["days"][0] == date(2024, 5, 9) and result["days"][-1] == date(2024, 5, 15)
+    flows = {item["name"]: item["cumulative_flow"] for item in result["lists"]}
+    assert flows == {
+        "Todo": [1, 1, 1, 3, 1, 1, 1],
+        "Doing": [0, 0, 0, 0, 2, 0, 0],
+        "Done": [0, 0, 0, 0, 0, 1, 1],
+    }
+
+
+def test_lead_and_cycle_times():
+    result = compute(HISTORY, LISTS, None, 7, NOW)
+    assert result["done_list_id"] == 3
+    assert result["lead_time"]["p50_hours"] == 48
+    assert result["cycle_time"]["p50_hours"] == 24
+
+    todo, doing, done = result["lists"]
+    # Time spent in each list
+    assert (todo["cycle_time"]["count"], todo["cycle_time"]["mean_hours"]) == (2, 18)
+    assert (doing["cycle_time"]["count"], doing["cycle_time"]["mean_hours"]) == (2, 30)
+    assert done["cycle_time"] == {"count": 0}
+    # From creation to first arrival
+    assert todo["lead_time"] == {"count": 0}
+    assert doing["lead_time"]["mean_hours"] == 18
+    assert done["lead_time"]["p95_hours"] == 48
+
+
+def test_throughput_counts_first_arrivals_per_week():
+    result = compute(HISTORY, LISTS, None, 14, NOW)
+    assert result["throughput"] == [
+        {"week_start": date(2024, 5, 6), "completed": 0},
+        {"week_start": date(2024, 5, 13), "completed": 1},
+    ]
+    # A different done list
+    result = compute(HISTORY, LISTS, 2, 14, NOW)
+    assert [week["completed"] for week in result["throughput"]] == [0, 2]
+
+
+def test_lists_no_longer_on_the_board_are_ignored():
+    result = compute(HISTORY, [(1, "Todo"), (3, "Done")], None, 7, NOW)
+    assert [item["cumulative_flow"][-1] for item in result["lists"]] == [1, 1]
+
+
+def test_empty_history():
+    result = compute(events(), LISTS, None, 7, NOW)
+    assert result["lead_time"] == {"count": 0}
+    assert all(item["cumulative_flow"] == [0] * 7 for item in result["lists"])
@@ -0,0 +1,160 @@
+# tests/test_auth.py
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app import auth
+from app.auth import create_access_token, get_current_user, invalidate_user, user_cache
+from app.broker import InMemoryBroker
+from app.cache import TTLCache
+from app import models
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        user_cache.clear()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def user(db):
+    user = models.User(username="cacheuser", email="cache@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def count_queries(statements):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    return before_cursor_execute
+
+@pytest.mark.asyncio
+async def test_get_current_user_is_served_from_cache(db, user):
+    token = create_access_token(data={"sub": user.username})
+    statements = []
+    listener = count_queries(statements)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        first = await get_current_user(token, db)
+        second = await get_current_user(token, db)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert first.id == second.id == user.id
+    assert second.email == "cache@example.com"
+
+@pytest.mark.asyncio
+async def test_invalidate_user_reloads_changed_record(db, user):
+    token = create_access_token(data={"sub": user.username})
+    await get_current_user(token, db)
+
+    user.email = "changed@example.com"
+    db.commit()
+    assert (await get_current_user(token, db)).email == "cache@example.com"
+
+    invalidate_user(user.username)
+    assert (await get_current_user(token, db)).email == "changed@example.com"
+
+def test_ttl_cache_evicts_least_recently_used_and_expired():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.ttl = -1
+    cache.set("d", 4)
+    assert cache.get("d") is None
+
+@pytest.mark.asyncio
+async def test_invalidation_is_shared_between_workers():
+    broker = InMemoryBroker()
+    worker_a = TTLCache("shared", ttl=60)
+    worker_b = TTLCache("shared", ttl=60)
+    await worker_a.attach_broker(broker)
+    await worker_b.attach_broker(broker)
+    worker_a.set("alice", 1)
+    worker_b.set("alice", 1)
+
+    worker_a.invalidate("alice")
+    # Let the scheduled publish run
+    await asyncio.sleep(0)
+
+    assert worker_a.get("alice") is None
+    assert worker_b.get("alice") is None
+
+@pytest.mark.asyncio
+async def test_password_verification_runs_off_the_event_loop():
+    hashed = auth.pwd_context.hash("secret")
+    loop_thread = threading.current_thread().name
+    seen = []
+
+    def verify(password, hashed_password):
+        seen.append(threading.current_thread().name)
+        return auth.pwd_context.verify(password, hashed_password)
+
+    assert await auth._run_password_job_async(verify, "secret", hashed)
+    assert seen[0] != loop_thread
+    assert seen[0].startswith("password-hash")
+    assert await auth.verify_password_async("wrong", hashed) is False
+
+@pytest.mark.asyncio
+async def test_password_queue_limit_rejects_with_503(monkeypatch):
+    monkeypatch.setattr(auth, "password_slots", threading.BoundedSemaphore(1))
+    auth.password_slots.acquire()
+    with pytest.raises(HTTPException) as exc:
+        await auth.verify_password_async("secret", "irrelevant")
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "1"
+
+@pytest.mark.asyncio
+async def test_login_lookup_runs_off_the_event_loop(db, monkeypatch):
+    db.add(models.User(username="login", email="login@example.com", hashed_password=auth.pwd_context.hash("secret")))
+    db.commit()
+    loop_thread = threading.current_thread()
+    seen = []
+    listener = lambda *args: seen.append(threading.current_thread())
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        user = await auth.authenticate_user(db, "login@example.com", "secret")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert user.username == "login"
+    assert seen and loop_thread not in seen
+    assert await auth.authenticate_user(db, "nobody", "secret") is False
+
+@pytest.mark.asyncio
+async def test_current_user_lookup_runs_off_the_event_loop(db, user):
+    token = create_access_token(data={"sub": user.username})
+    loop_thread = threading.current_thread()
+    seen = []
+    listener = lambda *args: seen.append(threading.current_thread())
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert (await get_current_user(token, db)).id == user.id
+        assert (await auth.get_user_from_token(create_access_token(data={"sub": "nobody"}), db)) is None
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(seen) == 2 and loop_thread not in seen
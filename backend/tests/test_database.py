@@ -0,0 +1,60 @@
+# tests/test_database.py
+import os
+import tempfile
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from app import database
+from app.database import make_engine, get_pool_metrics, pool_settings, statement_timeout_args
+
+
+@pytest.fixture
+def db_path():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    yield path
+    os.remove(path)
+
+
+def test_pool_metrics_record_waits_and_timeouts(db_path):
+    engine = make_engine(f"sqlite:///{db_path}", "test-pool", pool_size=1, max_overflow=0, pool_timeout=0.05)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert get_pool_metrics()["test-pool"]["saturation"] == 1.0
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+
+        stats = get_pool_metrics()["test-pool"]
+        assert stats["checkouts"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["peak_saturation"] == 1.0
+
+        # Metrics survive the pool being swapped out
+        engine.dispose()
+        with engine.connect():
+            pass
+        assert get_pool_metrics()["test-pool"]["checkouts"] == 2
+    finally:
+        engine.dispose()
+        database.engines.pop("test-pool", None)
+
+
+def test_pool_settings_split_connection_budget_across_workers(monkeypatch):
+    monkeypatch.setattr(database, "DB_MAX_CONNECTIONS", 40)
+    monkeypatch.setattr(database, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 10)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 10)
+    settings = pool_settings()
+    assert settings["pool_size"] + settings["max_overflow"] == 5
+
+
+def test_statement_timeout_is_passed_to_postgres_drivers(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    assert statement_timeout_args(make_url("postgresql://u@h/db")) == {"options": "-c statement_timeout=5000"}
+    assert statement_timeout_args(make_url("postgresql+asyncpg://u@h/db")) == {
+        "server_settings": {"statement_timeout": "5000"}
+    }
+    assert statement_timeout_args(make_url("sqlite:///x.db")) == {}
@@ -0,0 +1,191 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import models
+from app.database import Base
+from app.jobs import JobQueue
+from app.models import JobStatus
+
+
+@pytest.fixture
+def queue(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(create())
+    queue = JobQueue()
+    queue.sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    yield queue
+    asyncio.run(engine.dispose())
+
+
+async def add(queue, kind, *payloads):
+    async with queue.sessions() as db:
+        for payload in payloads:
+            queue.enqueue(db, kind, payload)
+        await db.commit()
+
+
+async def jobs(queue):
+    async with queue.sessions() as db:
+        return (await db.scalars(select(models.Job).order_by(models.Job.id))).all()
+
+
+def test_failures_back_off_then_dead_letter(queue):
+    calls = []
+
+    @queue.handler("flaky", max_attempts=2)
+    async def flaky(payload):
+        calls.append(payload["n"])
+        if payload["n"]:
+            raise RuntimeError("SMTP down")
+
+    async def scenario():
+        await add(queue, "flaky", {"n": 0}, {"n": 1})
+        assert await queue.run_pending() == 2
+        # The success is gone; the failure waits out its backoff
+        [job] = await jobs(queue)
+        assert (job.status, job.attempts, job.last_error) == ("queued", 1, "RuntimeError: SMTP down")
+        assert job.run_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+        assert await queue.run_pending() == 0
+
+        async with queue.sessions() as db:
+            await db.execute(update(models.Job).values(run_at=datetime.now(timezone.utc)))
+            await db.commit()
+        assert await queue.run_pending() == 1
+        [job] = await jobs(queue)
+        assert (job.status, job.attempts) == (JobStatus.DEAD.value, 2)
+        # Dead jobs aren't picked up again
+        assert await queue.run_pending() == 0
+
+    asyncio.run(scenario())
+    assert calls == [0, 1, 1]
+
+
+def test_workers_respect_concurrency_and_hand_back_on_stop(queue):
+    running, peak, finished = set(), [0], []
+
+    @queue.handler("slow", concurrency=2)
+    async def slow(payload):
+        running.add(payload["n"])
+        peak[0] = max(peak[0], len(running))
+        try:
+            await asyncio.sleep(0.05 if payload["n"] < 4 else 10)
+            finished.append(payload["n"])
+        finally:
+            running.discard(payload["n"])
+
+    async def scenario():
+        await queue.start(queue.sessions)
+        await add(queue, "slow", *({"n": n} for n in range(5)))
+        while len(finished) < 4:
+            await asyncio.sleep(0.02)
+        await queue.stop(grace=0.1)
+        # The one still running on shutdown goes back in the queue as it was
+        [job] = await jobs(queue)
+        assert (job.payload, job.status, job.attempts) == ({"n": 4}, "queued", 0)
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+    assert sorted(finished) == [0, 1, 2, 3]
+
+
+def test_expired_leases_are_claimed_again(queue):
+    @queue.handler("once")
+    async def once(payload):
+        pass
+
+    async def scenario():
+        await add(queue, "once", {})
+        # Claimed by a worker that then died
+        assert len(await queue._claim("once", 1)) == 1
+        assert await queue.run_pending() == 0
+        async with queue.sessions() as db:
+            await db.execute(update(models.Job).values(run_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+            await db.commit()
+        assert await queue.run_pending() == 1
+        assert await jobs(queue) == []
+
+    asyncio.run(scenario())
+
+
+def test_running_jobs_keep_their_lease(queue, monkeypatch):
+    monkeypatch.setattr("app.jobs.JOB_LEASE", 0.3)
+    calls = []
+
+    @queue.handler("long")
+    async def long(payload):
+        calls.append(payload)
+        await asyncio.sleep(1)
+
+    async def scenario():
+        await add(queue, "long", {})
+        [job] = await queue._claim("long", 1)
+        running = asyncio.create_task(queue._run(job))
+        # Another worker looking well past the first lease finds nothing to take
+        for _ in range(8):
+            await asyncio.sleep(0.1)
+            assert await queue._claim("long", 1) == []
+        await running
+        assert await jobs(queue) == []
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_stale_claims_cannot_finish_newer_ones(queue):
+    @queue.handler("once")
+    async def once(payload):
+        pass
+
+    async def expire():
+        async with queue.sessions() as db:
+            await db.execute(update(models.Job).values(run_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+            await db.commit()
+
+    async def scenario():
+        await add(queue, "once", {})
+        [stale] = await queue._claim("once", 1)
+        await expire()
+        [current] = await queue._claim("once", 1)
+        # The first worker comes back late: neither its failure nor its
+        # success touches the job as claimed the second time
+        await queue._finish(stale, "RuntimeError: late")
+        await queue._finish(stale, None)
+        [job] = await jobs(queue)
+        assert (job.status, job.attempts, job.last_error) == ("running", 2, None)
+        await queue._finish(current, None)
+        assert await jobs(queue) == []
+
+    asyncio.run(scenario())
+
+
+def test_jobs_that_keep_losing_their_worker_are_dead_lettered(queue):
+    @queue.handler("crashy", max_attempts=2)
+    async def crashy(payload):
+        pass
+
+    async def scenario():
+        await add(queue, "crashy", {})
+        for _ in range(2):
+            # Claimed, then the worker dies with it
+            assert len(await queue._claim("crashy", 1)) == 1
+            async with queue.sessions() as db:
+                await db.execute(update(models.Job).values(run_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+                await db.commit()
+        assert await queue._claim("crashy", 1) == []
+        [job] = await jobs(queue)
+        assert (job.status, job.attempts) == (JobStatus.DEAD.value, 2)
+
+    asyncio.run(scenario())
+
+
+def test_unknown_kinds_are_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue(None, "nope", {})
@@ -1,15 +1,25 @@
 # test_main.py
 
+import asyncio
+import hashlib
+import json
 import pytest
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from fastapi import FastAPI, Depends, HTTPException, WebSocketDisconnect
 from app.main import app, lifespan
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db, get_async_sessions
 from app.auth import create_access_token
 from app import models, auth
+from app.permissions import permissions
+from app import search
+from app.search_index import search_index
+from app.websocket import manager
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 import os
@@ -20,19 +30,26 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Sync and async routes need to see the same data, so use a file both drivers can open
+TEST_DB_PATH = os.path.join(tempfile.gettempdir(), "taskflow_test_main.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
+# NullPool: each TestClient runs its own event loop, so connections cannot be reused
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool)
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 @pytest.fixture(scope="function")
 def test_db():
     Base.metadata.create_all(bind=engine)
+    # Ids are reused once the tables are recreated, so start with cold caches
+    permissions.clear()
+    auth.user_cache.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -47,7 +64,13 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_sessions] = lambda: TestingAsyncSessionLocal
 
 @pytest.fixture(scope="function")
 def test_user(test_db):
@@ -99,6 +122,7 @@ app.dependency_overrides[auth.get_current_user] = override_get_current_user
 
 app.state.use_redis = False
 
+@asynccontextmanager
 async def override_lifespan(app: FastAPI):
     async with lifespan(app):
         yield
@@ -290,6 +314,315 @@ def test_board_statistics(authorized_client, test_db):
     assert stats["total_lists"] == 2
     assert stats["total_cards"] == 3
 
+def test_board_statistics_are_maintained_by_writes(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Counted")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    done = create_test_list(board['id'], "Done", authorized_client)
+    late = authorized_client.post(
+        "/cards/", json={"title": "Late", "list_id": todo['id'], "due_date": "2020-01-01T00:00:00"}
+    ).json()
+    card = create_test_card(todo['id'], "Card", authorized_client)
+    authorized_client.post("/cards/batch", json=[{"title": f"Imported {i}", "list_id": done['id']} for i in range(3)])
+    checklist = authorized_client.post("/checklists/", json={"title": "Steps", "card_id": card['id']}).json()
+    items = [
+        authorized_client.post("/checklist-items/", json={"content": c, "checklist_id": checklist['id']}).json()
+        for c in ("One", "Two")
+    ]
+    authorized_client.put(f"/checklist-items/{items[0]['id']}", json={"completed": True})
+    authorized_client.put(f"/cards/{card['id']}/move?new_list_id={done['id']}")
+    authorized_client.delete(f"/cards/{late['id']}")
+
+    def read():
+        response = authorized_client.get(f"/boards/{board['id']}/statistics")
+        assert response.status_code == 200
+        return response.json()
+
+    stats, queries = count_queries(read)
+    # Current user, board check and the counters, however many cards there are
+    assert queries <= 4
+    assert [(s["name"], s["card_count"], s["checklist_items"], s["checklist_items_done"]) for s in stats["lists_statistics"]] == [
+        ("Todo", 0, 0, 0), ("Done", 4, 2, 1),
+    ]
+    assert (stats["total_cards"], stats["total_overdue"], stats["total_checklist_items_done"]) == (4, 0, 1)
+
+    # Due dates don't feed the counters, so setting one doesn't count cards
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        authorized_client.put(f"/cards/{card['id']}", json={"due_date": "2030-01-01T00:00:00"})
+        authorized_client.post("/cards/bulk", json={"operations": [
+            {"op": "set_due_date", "card_ids": [card['id']], "due_date": "2030-01-01T00:00:00"},
+        ]})
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert not any("count(" in statement.lower() or "list_statistics" in statement for statement in statements)
+
+    authorized_client.post("/cards/bulk", json={"operations": [
+        {"op": "set_due_date", "card_ids": [card['id']], "due_date": "2020-01-01T00:00:00"},
+        {"op": "move", "card_ids": [card['id']], "list_id": todo['id']},
+    ]})
+    authorized_client.delete(f"/checklists/{checklist['id']}")
+    stats = read()
+    assert [(s["card_count"], s["overdue_count"], s["checklist_items"]) for s in stats["lists_statistics"]] == [
+        (1, 1, 0), (3, 0, 0),
+    ]
+
+    # Reconciliation finds and repairs drift
+    from app import stats as board_stats
+    test_db.query(models.ListStatistics).filter_by(list_id=done['id']).update({"card_count": 42})
+    test_db.commit()
+    assert board_stats.reconcile(test_db) == 1
+    assert read()["total_cards"] == 4
+    assert board_stats.reconcile(test_db) == 0
+
+def test_cards_that_fall_overdue_are_counted_on_read(authorized_client, test_db, monkeypatch):
+    from datetime import datetime, timedelta
+    from app import stats as board_stats
+    board = create_test_board(authorized_client, "Deadlines")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    soon = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+    cards = [
+        authorized_client.post("/cards/", json={"title": f"Due {i}", "list_id": todo['id'], "due_date": soon}).json()
+        for i in range(2)
+    ]
+    assert authorized_client.get(f"/boards/{board['id']}/statistics").json()["total_overdue"] == 0
+
+    # Both fall due with no write in between, then one is deleted
+    later = datetime.utcnow() + timedelta(hours=2)
+    monkeypatch.setattr(board_stats, "utcnow", lambda: later)
+    authorized_client.delete(f"/cards/{cards[0]['id']}")
+    stats = authorized_client.get(f"/boards/{board['id']}/statistics").json()
+    assert (stats["total_cards"], stats["total_overdue"]) == (1, 1)
+    assert stats["lists_statistics"][0]["overdue_count"] == 1
+
+def test_board_analytics(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Flow")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    done = create_test_list(board['id'], "Done", authorized_client)
+    cards = [create_test_card(todo['id'], f"Card {i}", authorized_client) for i in range(3)]
+    authorized_client.put(f"/cards/{cards[0]['id']}/move?new_list_id={done['id']}")
+    authorized_client.post("/cards/bulk", json={"operations": [
+        {"op": "move", "card_ids": [cards[1]['id']], "list_id": done['id']},
+    ]})
+
+    # Moves are recorded with the lists they went between
+    moves = [a for a in authorized_client.get(f"/boards/{board['id']}/activity").json() if a["activity_type"] == "card_moved"]
+    assert {(a["card_id"], a["from_list_id"], a["to_list_id"]) for a in moves} == {
+        (cards[0]['id'], todo['id'], done['id']), (cards[1]['id'], todo['id'], done['id']),
+    }
+
+    response = authorized_client.get(f"/boards/{board['id']}/analytics?days=7")
+    assert response.status_code == 200, response.text
+    analytics = response.json()
+    assert analytics["done_list_id"] == done['id']
+    assert [(l["name"], l["cumulative_flow"][-1]) for l in analytics["lists"]] == [("Todo", 1), ("Done", 2)]
+    assert analytics["lead_time"]["count"] == 2
+    assert sum(week["completed"] for week in analytics["throughput"]) == 2
+
+    # Served from the cache until the board has new activity
+    cached, queries = count_queries(lambda: authorized_client.get(f"/boards/{board['id']}/analytics?days=7"))
+    assert cached.json() == analytics
+    assert queries <= 4
+    authorized_client.delete(f"/cards/{cards[2]['id']}")
+    analytics = authorized_client.get(f"/boards/{board['id']}/analytics?days=7").json()
+    assert analytics["lists"][0]["cumulative_flow"][-1] == 0
+
+    assert authorized_client.get(f"/boards/{board['id']}/analytics?done_list_id=999999").status_code == 400
+
+def test_attachments_are_content_addressed(authorized_client, test_db, tmp_path, monkeypatch):
+    from app import routes
+    from app.storage import storage
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    board = create_test_board(authorized_client, "Files")
+    card = create_test_card(create_test_list(board['id'], "Todo", authorized_client)['id'], "Card", authorized_client)
+
+    first = authorized_client.post(
+        f"/cards/{card['id']}/attachments", files={"file": ("report.txt", b"quarterly numbers", "text/plain")}
+    )
+    assert first.status_code == 200, first.text
+    # The same bytes under another name, sent raw
+    second = authorized_client.post(
+        f"/cards/{card['id']}/attachments?filename=copy.txt", content=b"quarterly numbers",
+        headers={"Content-Type": "text/plain"}
+    )
+    assert second.status_code == 200, second.text
+    first, second = first.json(), second.json()
+    assert (first["filename"], second["filename"]) == ("report.txt", "copy.txt")
+    assert first["sha256"] == second["sha256"] == hashlib.sha256(b"quarterly numbers").hexdigest()
+    assert first["file_path"] == second["file_path"]
+    assert (first["size"], first["content_type"]) == (17, "text/plain")
+    assert [p.name for p in (tmp_path / "objects").rglob("*") if p.is_file()] == [first["sha256"]]
+
+    monkeypatch.setattr(routes, "ATTACHMENT_MAX_SIZE", 10)
+    response = authorized_client.post(
+        f"/cards/{card['id']}/attachments", files={"file": ("big.bin", b"x" * 11, "application/octet-stream")}
+    )
+    assert response.status_code == 413
+    assert len(authorized_client.get(f"/cards/{card['id']}/attachments").json()) == 2
+
+def test_attachment_download(authorized_client, test_db, tmp_path, monkeypatch):
+    from app.storage import storage
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    board = create_test_board(authorized_client, "Downloads")
+    card = create_test_card(create_test_list(board['id'], "Todo", authorized_client)['id'], "Card", authorized_client)
+    content = bytes(range(256)) * 4
+    attachment = authorized_client.post(
+        f"/cards/{card['id']}/attachments", files={"file": ("scan.pdf", content, "application/pdf")}
+    ).json()
+    url = f"/attachments/{attachment['id']}"
+
+    response = authorized_client.get(url)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["etag"] == f'"{attachment["sha256"]}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert 'filename="scan.pdf"' in response.headers["content-disposition"]
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    # Conditional requests
+    assert authorized_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert authorized_client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert authorized_client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Ranges
+    response = authorized_client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == content[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(content)}"
+    assert authorized_client.get(url, headers={"Range": "bytes=-5"}).content == content[-5:]
+    assert authorized_client.get(url, headers={"Range": "bytes=1000-"}).content == content[1000:]
+    response = authorized_client.get(url, headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    # A stale If-Range gets the whole file rather than a mismatched piece
+    response = authorized_client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert (response.status_code, response.content) == (200, content)
+    response = authorized_client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert (response.status_code, response.content) == (206, content[:10])
+
+    response = authorized_client.head(url)
+    assert (response.status_code, response.content) == (200, b"")
+    assert response.headers["content-length"] == str(len(content))
+
+    # Only people with access to the board
+    stranger = create_test_user("downloadstranger", "downloadstranger@example.com", "password")
+    assert authorized_client.get(url, headers=get_auth_header(stranger)).status_code == 404
+    assert authorized_client.get("/attachments/999999").status_code == 404
+
+def test_resumable_upload(authorized_client, test_db, tmp_path, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app import routes, upload_sessions
+    from app.storage import storage
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    monkeypatch.setattr(routes, "UPLOAD_CHUNK_SIZE", 4)
+    board = create_test_board(authorized_client, "Resumable")
+    card = create_test_card(create_test_list(board['id'], "Todo", authorized_client)['id'], "Card", authorized_client)
+    content = b"0123456789"
+
+    upload = authorized_client.post(
+        f"/cards/{card['id']}/uploads", json={"filename": "design.fig", "size": len(content)}
+    ).json()
+    assert (upload["chunk_size"], upload["chunk_count"], upload["received"]) == (4, 3, [])
+    chunk_url = f"/uploads/{upload['id']}/chunks"
+
+    # Out of order, with a retry
+    assert authorized_client.put(f"{chunk_url}/2", content=b"89").status_code == 204
+    assert authorized_client.put(f"{chunk_url}/0", content=b"xxxx").status_code == 204
+    assert authorized_client.put(f"{chunk_url}/0", content=b"0123").status_code == 204
+    assert authorized_client.put(f"{chunk_url}/1", content=b"45").status_code == 400
+    assert authorized_client.put(f"{chunk_url}/1", content=b"456789").status_code == 413
+    assert authorized_client.put(f"{chunk_url}/3", content=b"").status_code == 400
+    assert authorized_client.get(f"/uploads/{upload['id']}").json()["received"] == [0, 2]
+    response = authorized_client.post(f"/uploads/{upload['id']}/complete")
+    assert (response.status_code, response.json()["detail"]) == (400, "Missing chunks: [1]")
+
+    stranger = create_test_user("uploadstranger", "uploadstranger@example.com", "password")
+    assert authorized_client.get(f"/uploads/{upload['id']}", headers=get_auth_header(stranger)).status_code == 404
+
+    assert authorized_client.put(f"{chunk_url}/1", content=b"4567").status_code == 204
+
+    # A failed assembly leaves the upload to be completed again
+    from app.storage import storage
+    assemble = storage.assemble
+
+    async def failing_assemble(upload_id, count, max_size):
+        raise OSError("disk full")
+    monkeypatch.setattr(storage, "assemble", failing_assemble)
+    with pytest.raises(OSError):
+        authorized_client.post(f"/uploads/{upload['id']}/complete")
+    assert authorized_client.get(f"/uploads/{upload['id']}").json()["received"] == [0, 1, 2]
+
+    # The upload is claimed before its parts are read, so a second completion
+    # arriving meanwhile is turned away instead of racing it
+    during = []
+
+    async def claimed_assemble(upload_id, count, max_size):
+        during.append(authorized_client.post(f"/uploads/{upload_id}/complete").status_code)
+        return await assemble(upload_id, count, max_size)
+    monkeypatch.setattr(storage, "assemble", claimed_assemble)
+    attachment = authorized_client.post(f"/uploads/{upload['id']}/complete").json()
+    assert during == [404]
+    assert attachment["filename"] == "design.fig"
+    assert (attachment["size"], attachment["sha256"]) == (10, hashlib.sha256(content).hexdigest())
+    assert authorized_client.get(f"/attachments/{attachment['id']}").content == content
+    assert authorized_client.get(f"/uploads/{upload['id']}").status_code == 404
+    assert not (tmp_path / "parts" / upload["id"]).exists()
+
+    # Abandoned uploads are removed once they expire
+    abandoned = authorized_client.post(
+        f"/cards/{card['id']}/uploads", json={"filename": "half.bin", "size": 8}
+    ).json()
+    authorized_client.put(f"/uploads/{abandoned['id']}/chunks/0", content=b"abcd")
+    test_db.get(models.UploadSession, abandoned["id"]).expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    test_db.commit()
+    assert authorized_client.get(f"/uploads/{abandoned['id']}").status_code == 404
+    assert asyncio.run(upload_sessions.collect_expired(test_db)) == 1
+    assert test_db.get(models.UploadSession, abandoned["id"]) is None
+    assert not (tmp_path / "parts" / abandoned["id"]).exists()
+
+    assert authorized_client.post(f"/cards/{card['id']}/uploads", json={"filename": "huge.bin", "size": 1 << 50}).status_code == 413
+
+def test_avatar_thumbnails(authorized_client, test_db, test_user, tmp_path, monkeypatch):
+    import io
+    from PIL import Image
+    from app.jobs import queue
+    from app.storage import storage
+    monkeypatch.setattr(storage, "root", str(tmp_path))
+    monkeypatch.setattr(queue, "sessions", TestingAsyncSessionLocal)
+    photo = io.BytesIO()
+    Image.new("RGB", (800, 600), "blue").save(photo, "JPEG")
+
+    response = authorized_client.put(
+        f"/users/{test_user.id}/avatar", files={"file": ("me.jpg", photo.getvalue(), "image/jpeg")}
+    )
+    assert response.status_code == 200, response.text
+    # Made by a background job
+    assert response.json()["avatar_url"] is None
+    assert asyncio.run(queue.run_pending()) == 1
+    avatar_url = authorized_client.get("/users/me/").json()["avatar_url"]
+    assert avatar_url == f"/avatars/{hashlib.sha256(photo.getvalue()).hexdigest()}"
+
+    thumbnail = authorized_client.get(f"{avatar_url}/64.webp")
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/webp"
+    assert "immutable" in thumbnail.headers["cache-control"]
+    assert Image.open(io.BytesIO(thumbnail.content)).size == (64, 64)
+    assert authorized_client.get(f"{avatar_url}/64.jpg").headers["content-type"] == "image/jpeg"
+    assert authorized_client.get(f"{avatar_url}/65.jpg").status_code == 404
+
+    # Something that isn't an image leaves the previous avatar in place
+    response = authorized_client.put(
+        f"/users/{test_user.id}/avatar", files={"file": ("me.jpg", b"not an image", "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert asyncio.run(queue.run_pending()) == 1
+    assert authorized_client.get("/users/me/").json()["avatar_url"] == avatar_url
+    test_db.refresh(test_user)
+    assert test_user.avatar_pending is None
+
 def test_board_cards(authorized_client, test_db):
     user = create_test_user("cardsuser", "cards@example.com", "password")
     board = create_test_board(user, "Cards Board")
@@ -347,3 +680,553 @@ def test_delete_board(authorized_client, test_db):
     get_response = authorized_client.get(f"/boards/{board_id}")
     assert get_response.status_code == 404
 
+
+def count_queries(func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        for target in (engine, async_engine.sync_engine):
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+    return result, len(statements)
+
+def test_read_board_query_count_is_fixed(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Snapshot Board")
+    first_list = create_test_list(board['id'], "List 0", authorized_client)
+    create_test_card(first_list['id'], "Card 0", authorized_client)
+    # Warm the permission cache so both measurements only count snapshot queries
+    authorized_client.get(f"/boards/{board['id']}")
+
+    response, small_board_queries = count_queries(lambda: authorized_client.get(f"/boards/{board['id']}"))
+    assert response.status_code == 200
+
+    for i in range(1, 6):
+        list_ = create_test_list(board['id'], f"List {i}", authorized_client)
+        card = create_test_card(list_['id'], f"Card {i}", authorized_client)
+        authorized_client.post(f"/cards/{card['id']}/labels", json={"name": "bug", "color": "red"})
+
+    response, large_board_queries = count_queries(lambda: authorized_client.get(f"/boards/{board['id']}"))
+    assert response.status_code == 200
+    data = response.json()
+    assert [l["title"] for l in data["lists"]] == [f"List {i}" for i in range(6)]
+    assert all(len(l["cards"]) == 1 for l in data["lists"])
+    assert data["lists"][1]["cards"][0]["labels"][0]["name"] == "bug"
+    assert large_board_queries == small_board_queries
+
+def test_board_websocket_subscriptions(test_token, test_db):
+    with TestClient(app) as ws_client:
+        headers = {"Authorization": f"Bearer {test_token}"}
+        board = ws_client.post("/boards/", json={"title": "Socket Board"}, headers=headers).json()
+        list_ = ws_client.post("/lists/", json={"title": "List", "board_id": board["id"]}, headers=headers).json()
+        card = ws_client.post("/cards/", json={"title": "Card", "list_id": list_["id"]}, headers=headers).json()
+        other_board = ws_client.post("/boards/", json={"title": "Other"}, headers=headers).json()
+        other_list = ws_client.post("/lists/", json={"title": "Other", "board_id": other_board["id"]}, headers=headers).json()
+
+        url = f"/ws/boards/{board['id']}?token={test_token}"
+        with ws_client.websocket_connect(url) as first, ws_client.websocket_connect(url) as second:
+            sync_queries = []
+            record = lambda *args: sync_queries.append(args[2])
+            event.listen(engine, "before_cursor_execute", record)
+            try:
+                for socket in (first, second):
+                    socket.send_json({"action": "subscribe", "cards": [card["id"]], "lists": [other_list["id"]]})
+                    reply = socket.receive_json()
+                    assert reply["action"] == "subscribed"
+                    assert reply["data"] == {"cards": [card["id"]], "lists": []}
+            finally:
+                event.remove(engine, "before_cursor_execute", record)
+            # Looked up through an async session, not a blocking sync one
+            assert sync_queries == []
+
+            first.send_json({"type": "comment", "action": "created", "cardId": card["id"], "data": {"content": "hi"}})
+            message = second.receive_json()
+            assert message["cardId"] == card["id"]
+            assert message["boardId"] == board["id"]
+            assert message["data"] == {"content": "hi"}
+
+def test_board_websocket_rejects_non_members(test_db):
+    outsider = create_test_user("outsider", "outsider@example.com", "password")
+    owner = create_test_user("socketowner", "socketowner@example.com", "password")
+    board = create_test_board(owner, "Private Board")
+    token = create_access_token(data={"sub": outsider["username"]})
+    with TestClient(app) as ws_client:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with ws_client.websocket_connect(f"/ws/boards/{board['id']}?token={token}") as socket:
+                socket.receive_json()
+        assert exc.value.code == 4002
+
+def test_member_permission_changes_invalidate_cache(authorized_client, test_db):
+    owner = create_test_user("aclowner", "aclowner@example.com", "password")
+    member = create_test_user("aclmember", "aclmember@example.com", "password")
+    board = create_test_board(owner, "ACL Board")
+    owner_headers = get_auth_header(owner)
+    member_headers = get_auth_header(member)
+
+    # Denied before being added, and the denial is cached
+    assert client.get(f"/boards/{board['id']}", headers=member_headers).status_code == 403
+
+    response = client.post(
+        f"/boards/{board['id']}/members",
+        json={"user_id": member["id"], "permission_level": "edit"},
+        headers=owner_headers
+    )
+    assert response.status_code == 200
+    response = client.put(f"/boards/{board['id']}", json={"title": "Edited"}, headers=member_headers)
+    assert response.status_code == 200
+
+    response = client.put(
+        f"/boards/{board['id']}/members/{member['id']}?permission=view",
+        headers=owner_headers
+    )
+    assert response.status_code == 200
+    response = client.put(f"/boards/{board['id']}", json={"title": "Denied"}, headers=member_headers)
+    assert response.status_code == 403
+
+    response = client.delete(f"/boards/{board['id']}/members/{member['id']}", headers=owner_headers)
+    assert response.status_code == 204
+    assert client.get(f"/boards/{board['id']}", headers=member_headers).status_code == 403
+
+def test_current_user_is_cached_until_changed(authorized_client, test_db, test_user, monkeypatch):
+    # The real dependency rather than this module's override
+    monkeypatch.delitem(app.dependency_overrides, auth.get_current_user)
+
+    me, first_queries = count_queries(lambda: authorized_client.get("/users/me/").json())
+    assert me["email"] == "testuser@example.com"
+    me, queries = count_queries(lambda: authorized_client.get("/users/me/").json())
+    assert (first_queries, queries) == (1, 0)
+
+    # Written behind the cache's back: still the cached record
+    test_db.query(models.User).filter_by(id=test_user.id).update({"email": "sideways@example.com"})
+    test_db.commit()
+    assert authorized_client.get("/users/me/").json()["email"] == "testuser@example.com"
+
+    # Written through the API: invalidated, so the next request reloads it
+    response = authorized_client.put(f"/users/{test_user.id}", json={"email": "new@example.com"})
+    assert response.status_code == 200
+    assert authorized_client.get("/users/me/").json()["email"] == "new@example.com"
+
+def test_card_access_checks_use_cached_ancestry(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Ancestry Board")
+    list_ = create_test_list(board['id'], "List", authorized_client)
+    card = create_test_card(list_['id'], "Card", authorized_client)
+
+    authorized_client.get(f"/cards/{card['id']}/labels")
+    _, queries = count_queries(lambda: authorized_client.get(f"/cards/{card['id']}/labels"))
+    # Only the user lookup and the labels query remain once the ancestry is cached
+    assert queries == 2
+
+def test_checklist_routes_use_async_session(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Checklist Board")
+    list_ = create_test_list(board['id'], "List", authorized_client)
+    card = create_test_card(list_['id'], "Card", authorized_client)
+
+    response = authorized_client.post("/checklists/", json={"title": "Todo", "card_id": card['id']})
+    assert response.status_code == 200
+    checklist = response.json()
+    assert checklist["items"] == []
+
+    response = authorized_client.post(
+        "/checklist-items/",
+        json={"content": "First", "position": 0, "checklist_id": checklist['id']}
+    )
+    assert response.status_code == 200
+    item = response.json()
+
+    response = authorized_client.put(f"/checklist-items/{item['id']}", json={"completed": True})
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+
+    response = authorized_client.put(f"/checklists/{checklist['id']}", json={"title": "Done"})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Done"
+    assert [i["content"] for i in response.json()["items"]] == ["First"]
+
+    response = authorized_client.get(f"/boards/{board['id']}/cards")
+    assert response.json()[0]["checklists"][0]["items"][0]["completed"] is True
+
+    assert authorized_client.delete(f"/checklists/{checklist['id']}").status_code == 200
+    assert authorized_client.delete(f"/checklist-items/{item['id']}").status_code == 404
+
+def test_search_ranks_filters_and_paginates(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Roadmap")
+    list_ = create_test_list(board['id'], "Backlog", authorized_client)
+    cards = [create_test_card(list_['id'], f"Deploy pipeline {i}", authorized_client) for i in range(3)]
+    authorized_client.put(f"/cards/{cards[0]['id']}", json={"title": "Deploy deploy deploy"})
+    authorized_client.post(f"/cards/{cards[1]['id']}/labels", json={"name": "ops", "color": "blue"})
+
+    # Prefix match, best match first
+    response = authorized_client.get("/search?query=depl")
+    results = response.json()
+    assert [r["type"] for r in results] == ["card"] * 3
+    assert results[0]["id"] == cards[0]['id']
+    assert results[0]["rank"] >= results[1]["rank"]
+
+    # Card writes keep the index current
+    authorized_client.put(f"/cards/{cards[2]['id']}", json={"title": "Renamed"})
+    assert len(authorized_client.get("/search?query=deploy").json()) == 2
+
+    assert [r["id"] for r in authorized_client.get("/search?query=deploy&label=ops").json()] == [cards[1]['id']]
+
+    # Due date bounds with an offset compare in UTC
+    authorized_client.put(f"/cards/{cards[1]['id']}", json={"due_date": "2030-01-01T00:00:00"})
+    due = {"query": "deploy", "due_date_start": "2030-01-01T01:00:00+02:00"}
+    assert [r["id"] for r in authorized_client.get("/search", params=due).json()] == [cards[1]['id']]
+
+    first_page = authorized_client.get("/search?query=deploy&limit=1")
+    assert len(first_page.json()) == 1
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = authorized_client.get(f"/search?query=deploy&limit=1&cursor={cursor}")
+    assert len(second_page.json()) == 1
+    assert second_page.json()[0]["id"] != first_page.json()[0]["id"]
+    assert "X-Next-Cursor" not in second_page.headers
+
+def test_search_suggest_tolerates_typos(authorized_client, test_db):
+    search.suggestion_cache.clear()
+    board = create_test_board(authorized_client, "Deployment Board")
+    list_ = create_test_list(board['id'], "Ideas", authorized_client)
+    card = create_test_card(list_['id'], "Deploy pipeline", authorized_client)
+    authorized_client.post(f"/cards/{card['id']}/labels", json={"name": "deployment", "color": "red"})
+    create_test_card(list_['id'], "Unrelated", authorized_client)
+
+    response = authorized_client.get("/search/suggest?q=deplyo")
+    assert response.status_code == 200
+    suggestions = {(s["type"], s["title"]) for s in response.json()}
+    assert ("card", "Deploy pipeline") in suggestions
+    assert ("label", "deployment") in suggestions
+    assert ("board", "Deployment Board") in suggestions
+    assert all(s["title"] != "Unrelated" for s in response.json())
+
+    # Hot prefixes are answered from the per-user cache
+    _, queries = count_queries(lambda: authorized_client.get("/search/suggest?q=deplyo"))
+    assert queries == 1
+
+    # Labels of deleted cards aren't suggested
+    authorized_client.post("/cards/bulk", json={"operations": [{"op": "delete", "card_ids": [card['id']]}]})
+    search.suggestion_cache.clear()
+    suggestions = {(s["type"], s["title"]) for s in authorized_client.get("/search/suggest?q=deplyo").json()}
+    assert ("label", "deployment") not in suggestions
+
+def test_search_from_memory_index(authorized_client, test_db, monkeypatch):
+    monkeypatch.setattr(search_index, "enabled", True)
+    search_index.rebuild(test_db)
+    board = create_test_board(authorized_client, "Roadmap")
+    list_ = create_test_list(board['id'], "Backlog", authorized_client)
+    card = create_test_card(list_['id'], "Deploy pipeline", authorized_client)
+    other = create_test_card(list_['id'], "Deploy docs", authorized_client)
+    authorized_client.post(f"/cards/{card['id']}/labels", json={"name": "ops", "color": "blue"})
+
+    # Only the current-user lookup reaches the database
+    response, queries = count_queries(lambda: authorized_client.get("/search?query=depl pipe"))
+    assert [r["id"] for r in response.json()] == [card['id']]
+    assert queries == 1
+
+    assert [r["id"] for r in authorized_client.get("/search?query=deploy&label=ops").json()] == [card['id']]
+
+    authorized_client.put(f"/cards/{other['id']}", json={"title": "Write docs"})
+    assert [r["id"] for r in authorized_client.get("/search?query=deploy").json()] == [card['id']]
+
+    authorized_client.delete(f"/cards/{other['id']}")
+    assert authorized_client.get("/search?query=docs").json() == []
+    assert [r["type"] for r in authorized_client.get("/search?query=roadmap").json()] == ["board"]
+
+def test_list_endpoints_use_keyset_cursors(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Paged")
+    list_ = create_test_list(board['id'], "Todo", authorized_client)
+    cards = [create_test_card(list_['id'], f"Card {i}", authorized_client) for i in range(5)]
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/cards/?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = authorized_client.get(url)
+        assert response.status_code == 200
+        seen += [c["id"] for c in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [c['id'] for c in cards]
+
+    # Rows deleted behind the cursor don't shift the next page
+    first = authorized_client.get("/cards/?limit=2")
+    authorized_client.delete(f"/cards/{cards[0]['id']}")
+    rest = authorized_client.get(f"/cards/?limit=10&cursor={first.headers['X-Next-Cursor']}")
+    assert [c["id"] for c in rest.json()] == [c['id'] for c in cards[2:]]
+
+    # The activity feed pages newest first
+    feed = authorized_client.get(f"/boards/{board['id']}/activity?limit=1")
+    assert len(feed.json()) == 1
+    older = authorized_client.get(f"/boards/{board['id']}/activity?cursor={feed.headers['X-Next-Cursor']}")
+    assert older.json()[0]["id"] < feed.json()[0]["id"]
+
+    assert authorized_client.get("/boards/?cursor=not-a-cursor").status_code == 400
+
+def test_create_cards_batch_is_set_based(authorized_client, test_db):
+    from datetime import datetime
+    board = create_test_board(authorized_client, "Import")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    done = create_test_list(board['id'], "Done", authorized_client)
+    payload = [{"title": f"Card {i}", "list_id": (todo, done)[i % 2]['id']} for i in range(50)]
+
+    response, queries = count_queries(lambda: authorized_client.post("/cards/batch", json=payload))
+    assert response.status_code == 200
+    assert [c["title"] for c in response.json()] == [c["title"] for c in payload]
+    assert all(c["labels"] == [] for c in response.json())
+    # Current user, list check, list ends, cards, activities and list counters, however large the batch
+    assert queries <= 6
+    assert len(authorized_client.get(f"/boards/{board['id']}/activity?limit=100").json()) == 52
+
+    # Streaming NDJSON input
+    ndjson = "\n".join(json.dumps({"title": f"Line {i}", "list_id": todo['id']}) for i in range(3)) + "\n"
+    response = authorized_client.post(
+        "/cards/batch", content=ndjson, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert [c["title"] for c in response.json()] == ["Line 0", "Line 1", "Line 2"]
+
+    bad = ndjson + json.dumps({"title": "", "list_id": todo['id']})
+    response = authorized_client.post("/cards/batch", content=bad, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", 4]
+
+    # Due dates with an offset are stored as naive UTC
+    response = authorized_client.post(
+        "/cards/batch", json=[{"title": "Dated", "list_id": todo['id'], "due_date": "2026-01-01T12:00:00+02:00"}]
+    )
+    test_db.expire_all()
+    assert test_db.get(models.Card, response.json()[0]["id"]).due_date == datetime(2026, 1, 1, 10, 0)
+
+    other = create_test_user("batch-other", "batch-other@example.com", "password")
+    foreign = create_test_board(other, "Not mine")
+    foreign_list = models.List(title="Theirs", board_id=foreign['id'])
+    test_db.add(foreign_list)
+    test_db.commit()
+    response = authorized_client.post("/cards/batch", json=[{"title": "Sneaky", "list_id": foreign_list.id}])
+    assert response.status_code == 404
+
+def test_card_batches_are_size_capped_while_streaming(authorized_client, test_db, monkeypatch):
+    from app import routes
+    monkeypatch.setattr(routes, "CARD_BATCH_MAX_SIZE", 1000)
+    board = create_test_board(authorized_client, "Import")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+
+    def long_line():
+        # One NDJSON line with no newline, sent without a Content-Length
+        yield b'{"title": "'
+        for _ in range(100):
+            yield b"x" * 100
+
+    response = authorized_client.post(
+        "/cards/batch", content=long_line(), headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 413
+
+    payload = [{"title": f"Card {i}", "list_id": todo['id']} for i in range(50)]
+    assert authorized_client.post("/cards/batch", json=payload).status_code == 413
+    assert authorized_client.post("/cards/batch", json=payload[:5]).status_code == 200
+
+def test_bulk_card_operations(authorized_client, test_db, monkeypatch):
+    board = create_test_board(authorized_client, "Bulk")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    done = create_test_list(board['id'], "Done", authorized_client)
+    cards = [create_test_card(todo['id'], f"Card {i}", authorized_client) for i in range(4)]
+    ids = [c['id'] for c in cards]
+    authorized_client.post(f"/cards/{ids[0]}/labels", json={"name": "urgent", "color": "red"})
+
+    broadcasts = []
+    async def record(board_id, message, exclude=None):
+        broadcasts.append((board_id, message))
+    monkeypatch.setattr(manager, "broadcast_to_board", record)
+
+    operations = [
+        {"op": "move", "card_ids": ids[:3], "list_id": done['id']},
+        {"op": "add_label", "card_ids": ids[:2], "name": "urgent", "color": "red"},
+        {"op": "set_due_date", "card_ids": ids[1:3], "due_date": "2030-01-01T02:00:00+02:00"},
+        {"op": "remove_label", "card_ids": [ids[0]], "name": "urgent"},
+        {"op": "delete", "card_ids": [ids[3]]},
+    ]
+    response, queries = count_queries(
+        lambda: authorized_client.post("/cards/bulk", json={"operations": operations})
+    )
+    assert response.status_code == 200, response.text
+    # The label only went on the card that didn't already have it
+    assert response.json() == {"affected": [3, 1, 2, 1, 1], "board_ids": [board['id']]}
+    # A fixed number of statements per operation, however many cards it names,
+    # plus counting the cards before and after for the list statistics
+    assert queries <= 22
+
+    test_db.expire_all()
+    assert [c.list_id for c in test_db.query(models.Card).order_by(models.Card.id)] == [done['id']] * 3
+    assert [l.name for l in test_db.get(models.Card, ids[1]).labels] == ["urgent"]
+    assert test_db.get(models.Card, ids[0]).labels == []
+    # Stored as naive UTC
+    assert test_db.get(models.Card, ids[2]).due_date.timetuple()[:4] == (2030, 1, 1, 0)
+
+    activity = authorized_client.get(f"/boards/{board['id']}/activity").json()[0]
+    assert activity["activity_type"] == "cards_bulk_updated"
+    assert "moved 3 cards" in activity["details"]
+    assert len(broadcasts) == 1
+    assert broadcasts[0][1]["data"]["deleted"] == [ids[3]]
+
+    # Moves across boards and foreign cards are rejected before anything changes
+    other_board = create_test_board(authorized_client, "Elsewhere")
+    other_list = create_test_list(other_board['id'], "Todo", authorized_client)
+    response = authorized_client.post(
+        "/cards/bulk", json={"operations": [{"op": "move", "card_ids": [ids[0]], "list_id": other_list['id']}]}
+    )
+    assert response.status_code == 400
+    response = authorized_client.post("/cards/bulk", json={"operations": [{"op": "delete", "card_ids": [999999]}]})
+    assert response.status_code == 404
+
+def test_reordering_writes_one_row(authorized_client, test_db):
+    board = create_test_board(authorized_client, "Ordered")
+    todo = create_test_list(board['id'], "Todo", authorized_client)
+    done = create_test_list(board['id'], "Done", authorized_client)
+    cards = [create_test_card(todo['id'], f"Card {i}", authorized_client) for i in range(3)]
+
+    updates = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE"):
+            updates.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = authorized_client.put(
+            f"/cards/{cards[2]['id']}/move", params={"new_list_id": todo['id'], "after_id": cards[0]['id']}
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert len(updates) == 1
+
+    order = [c["id"] for c in authorized_client.get(f"/lists/{todo['id']}/cards").json()]
+    assert order == [cards[0]['id'], cards[2]['id'], cards[1]['id']]
+
+    authorized_client.put(f"/cards/{cards[1]['id']}/move", params={"new_list_id": done['id']})
+    authorized_client.put(f"/cards/{cards[0]['id']}/move", params={"new_list_id": done['id'], "before_id": cards[1]['id']})
+    assert [c["id"] for c in authorized_client.get(f"/lists/{done['id']}/cards").json()] == [cards[0]['id'], cards[1]['id']]
+
+    # Neighbours must share the target list
+    response = authorized_client.put(
+        f"/cards/{cards[2]['id']}/move", params={"new_list_id": todo['id'], "after_id": cards[1]['id']}
+    )
+    assert response.status_code == 400
+
+    # Neighbours given the wrong way round are rejected without respacing the list
+    positions = [c["position"] for c in authorized_client.get(f"/lists/{done['id']}/cards").json()]
+    response = authorized_client.put(
+        f"/cards/{cards[2]['id']}/move",
+        params={"new_list_id": done['id'], "after_id": cards[1]['id'], "before_id": cards[0]['id']},
+    )
+    assert response.status_code == 400
+    assert [c["position"] for c in authorized_client.get(f"/lists/{done['id']}/cards").json()] == positions
+
+    # Lists reorder through PUT /lists/{id}
+    authorized_client.put(f"/lists/{done['id']}", json={"title": "Done", "before_id": todo['id']})
+    board_data = authorized_client.get(f"/boards/{board['id']}").json()
+    assert [l["id"] for l in board_data["lists"]] == [done['id'], todo['id']]
+
+    # Repeated inserts at one spot eventually respace the siblings
+    first, second = cards[0]['id'], cards[1]['id']
+    for i in range(150):
+        card = create_test_card(done['id'], f"Squeezed {i}", authorized_client)
+        authorized_client.put(f"/cards/{card['id']}/move", params={"new_list_id": done['id'], "after_id": first})
+        first = card['id']
+    listed = authorized_client.get(f"/lists/{done['id']}/cards").json()
+    assert listed[-1]["id"] == second
+    assert all(len(c["position"]) <= 24 for c in listed)
+
+    checklist = authorized_client.post("/checklists/", json={"title": "Steps", "card_id": cards[2]['id']}).json()
+    items = [
+        authorized_client.post("/checklist-items/", json={"content": f"Step {i}", "checklist_id": checklist['id']}).json()
+        for i in range(3)
+    ]
+    authorized_client.put(f"/checklist-items/{items[2]['id']}", json={"before_id": items[0]['id']})
+    checklist = authorized_client.put(f"/checklists/{checklist['id']}", json={"title": "Steps"}).json()
+    assert [i["content"] for i in checklist["items"]] == ["Step 2", "Step 0", "Step 1"]
+
+def test_board_id_follows_cards_between_boards(authorized_client, test_db):
+    source = create_test_board(authorized_client, "Source")
+    target = create_test_board(authorized_client, "Target")
+    list_ = create_test_list(source['id'], "Moving", authorized_client)
+    other_list = create_test_list(target['id'], "Staying", authorized_client)
+    card = create_test_card(list_['id'], "Travels", authorized_client)
+    lone = create_test_card(list_['id'], "Travels alone", authorized_client)
+    authorized_client.post(f"/cards/{card['id']}/labels", json={"name": "ops", "color": "red"})
+    checklist = authorized_client.post("/checklists/", json={"title": "Steps", "card_id": card['id']}).json()
+    authorized_client.post("/checklist-items/", json={"content": "One", "checklist_id": checklist['id']})
+
+    def board_ids():
+        test_db.expire_all()
+        return {
+            "card": test_db.get(models.Card, card['id']).board_id,
+            "labels": {l.board_id for l in test_db.query(models.Label).filter_by(card_id=card['id'])},
+            "checklist": test_db.get(models.Checklist, checklist['id']).board_id,
+            "items": {i.board_id for i in test_db.query(models.ChecklistItem).filter_by(checklist_id=checklist['id'])},
+        }
+
+    assert board_ids() == {"card": source['id'], "labels": {source['id']}, "checklist": source['id'], "items": {source['id']}}
+    authorized_client.put(f"/lists/{list_['id']}", json={"title": "Moving", "board_id": target['id']})
+    assert board_ids() == {"card": target['id'], "labels": {target['id']}, "checklist": target['id'], "items": {target['id']}}
+
+    authorized_client.put(f"/cards/{lone['id']}", json={"list_id": other_list['id']})
+    test_db.expire_all()
+    assert test_db.get(models.Card, lone['id']).board_id == target['id']
+
+    # Access checks no longer join through lists
+    permissions.clear()
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert authorized_client.get(f"/cards/{card['id']}/labels").status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    lookup = next(s for s in statements if "board_id" in s and "FROM cards" in s)
+    assert "JOIN" not in lookup
+
+def test_password_reset_email_is_sent_by_a_job(test_db, test_user, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.emails import fastmail
+    from app.jobs import queue
+    monkeypatch.setattr(queue, "sessions", TestingAsyncSessionLocal)
+    # Nothing leaves the test: messages are only recorded
+    monkeypatch.setattr(fastmail.config, "SUPPRESS_SEND", 1)
+
+    with fastmail.record_messages() as outbox:
+        for _ in range(2):
+            response = client.post("/password-reset/request", params={"email": test_user.email})
+            assert response.status_code == 200
+        # Queued rather than sent during the request, and without the token
+        assert outbox == []
+        test_db.refresh(test_user)
+        token = test_user.password_reset_token
+        assert all(job.payload == {"user_id": test_user.id} for job in test_db.query(models.Job))
+        assert asyncio.run(queue.run_pending("password_reset_email")) == 2
+
+    # Both carry the token that's current when they're sent
+    for message in outbox:
+        assert test_user.email in message["To"]
+        body = next(part for part in message.walk() if part.get_content_type() == "text/plain")
+        assert f"/reset-password/{token}" in body.get_payload(decode=True).decode()
+
+    # One queued before the reset was used sends nothing afterwards
+    with fastmail.record_messages() as outbox:
+        client.post("/password-reset/request", params={"email": test_user.email})
+        test_db.query(models.User).filter_by(id=test_user.id).update({"password_reset_token": None})
+        test_db.commit()
+        assert asyncio.run(queue.run_pending("password_reset_email")) == 1
+    assert outbox == []
+
+    # Nor does one whose token expired before it was sent
+    with fastmail.record_messages() as outbox:
+        client.post("/password-reset/request", params={"email": test_user.email})
+        expired = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=1)
+        test_db.query(models.User).filter_by(id=test_user.id).update({"password_reset_expires": expired})
+        test_db.commit()
+        assert asyncio.run(queue.run_pending("password_reset_email")) == 1
+    assert outbox == []
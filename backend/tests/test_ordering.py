@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from app.ordering import key_between, keys_between, spread_keys, MAX_KEY_LENGTH
+
+
+def test_key_between_sorts_between_its_bounds():
+    rng = random.Random(7)
+    keys = [key_between(None, None)]
+    for _ in range(2000):
+        i = rng.randrange(len(keys) + 1)
+        low = keys[i - 1] if i > 0 else None
+        high = keys[i] if i < len(keys) else None
+        key = key_between(low, high)
+        assert (low is None or low < key) and (high is None or key < high)
+        assert not key.endswith("0")
+        keys.insert(i, key)
+    assert keys == sorted(keys)
+
+
+def test_appends_stay_short():
+    key = None
+    for _ in range(300):
+        key = key_between(key, None)
+    assert len(key) <= MAX_KEY_LENGTH
+
+
+def test_key_between_rejects_unordered_bounds():
+    with pytest.raises(ValueError):
+        key_between("b", "a")
+
+
+def test_batch_and_rebalance_keys():
+    keys = keys_between("a", "b", 10000)
+    assert keys == sorted(keys) and len(set(keys)) == 10000
+    assert all("a" < key < "b" for key in keys)
+    assert max(map(len, keys)) <= 8
+
+    spread = spread_keys(500)
+    assert spread == sorted(spread) and len(set(spread)) == 500
+    assert max(map(len, spread)) <= 3
@@ -0,0 +1,85 @@
+# tests/test_replicas.py
+import os
+import tempfile
+import pytest
+from starlette.requests import Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.database import Base, RoutingSession
+from app.replicas import ReplicaRouter
+
+
+def make_request(token="Bearer alice"):
+    return Request({"type": "http", "headers": [(b"authorization", token.encode())], "client": ("127.0.0.1", 1)})
+
+
+@pytest.fixture
+def databases():
+    paths = []
+    for _ in range(2):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        paths.append(path)
+    primary = create_engine(f"sqlite:///{paths[0]}")
+    replica = create_engine(f"sqlite:///{paths[1]}")
+    for engine, title in ((primary, "primary"), (replica, "replica")):
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add(models.User(id=1, username="alice", email="alice@example.com", hashed_password="x"))
+            db.add(models.Board(id=1, title=title, owner_id=1))
+            db.commit()
+    yield primary, replica, paths
+    primary.dispose()
+    replica.dispose()
+    for path in paths:
+        os.remove(path)
+
+
+def test_routing_session_reads_replica_and_writes_primary(databases):
+    primary, replica, _ = databases
+    db = sessionmaker(class_=RoutingSession, bind=primary)()
+    db.read_engine = replica
+
+    board = db.get(models.Board, 1)
+    assert board.title == "replica"
+
+    db.add(models.Board(title="new", owner_id=1))
+    db.commit()
+    # Once the session has written, it keeps reading from the primary
+    assert db.query(models.Board).filter(models.Board.title == "new").count() == 1
+    db.close()
+
+    with sessionmaker(bind=replica)() as replica_db:
+        assert replica_db.query(models.Board).filter(models.Board.title == "new").count() == 0
+
+
+@pytest.mark.asyncio
+async def test_router_round_robin_sticky_writes_and_fallback(databases):
+    _, _, paths = databases
+    router = ReplicaRouter([f"sqlite:///{paths[1]}", f"sqlite:///{paths[1]}"], sticky_seconds=60)
+    try:
+        request = make_request()
+        first, second = router.replica_for(request), router.replica_for(request)
+        assert {first.name, second.name} == {"replica-0", "replica-1"}
+
+        # A client that just wrote stays on the primary, others keep using replicas
+        await router.record_write(request)
+        assert router.replica_for(request) is None
+        assert router.replica_for(make_request("Bearer bob")) is not None
+
+        await router.check_health()
+        assert all(replica.healthy for replica in router.replicas)
+    finally:
+        await router.stop()
+
+
+@pytest.mark.asyncio
+async def test_router_falls_back_to_primary_when_replicas_are_down():
+    router = ReplicaRouter(["sqlite:////nonexistent/dir/replica.db"])
+    try:
+        await router.check_health()
+        assert router.replicas[0].healthy is False
+        assert router.replica_for(make_request()) is None
+    finally:
+        await router.stop()
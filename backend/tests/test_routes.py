@@ -6,7 +6,8 @@ from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.database import Base, get_db
 from app.auth import create_access_token
-from app import models, schemas
+from app import auth, models, schemas
+from app.permissions import permissions
 
 
 # Setup test database
@@ -17,6 +18,9 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 @pytest.fixture(scope="module")
 def test_db():
     Base.metadata.create_all(bind=engine)
+    # Other modules' boards share these ids, so start with cold caches
+    permissions.clear()
+    auth.user_cache.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
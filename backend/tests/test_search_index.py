@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from app.search import SearchQuery
+from app.search_index import SearchIndex
+
+
+def build_index():
+    index = SearchIndex(enabled=True)
+    index.apply({"op": "upsert", "kind": "board", "id": 1, "owner_id": 7, "title": "Release plan"})
+    index.apply({"op": "upsert", "kind": "board", "id": 2, "owner_id": 8, "title": "Release notes"})
+    index.apply({"op": "upsert", "kind": "list", "id": 10, "board_id": 1, "title": "Doing"})
+    index.apply({
+        "op": "upsert", "kind": "card", "id": 100, "board_id": 1, "list_id": 10, "title": "Deploy api",
+        "text": ["roll out the release"], "labels": ["ops"], "due_date": "2024-05-01T00:00:00",
+    })
+    index.apply({
+        "op": "upsert", "kind": "card", "id": 101, "board_id": 1, "list_id": 10, "title": "Deploy docs",
+        "text": [], "labels": [], "due_date": None,
+    })
+    return index
+
+
+def ids(hits):
+    return [(kind, object_id) for _, kind, object_id, _ in hits]
+
+
+def test_terms_are_anded_prefix_matches():
+    index = build_index()
+    assert ids(index.search(SearchQuery(text="depl", user_id=7))) == [("card", 100), ("card", 101)]
+    assert ids(index.search(SearchQuery(text="deploy rel", user_id=7))) == [("card", 100)]
+    assert index.search(SearchQuery(text="deploy missing", user_id=7)) == []
+
+
+def test_title_matches_rank_first():
+    index = build_index()
+    hits = index.search(SearchQuery(text="release", user_id=7))
+    assert ids(hits) == [("board", 1), ("card", 100)]
+    assert hits[0][0] > hits[1][0]
+
+
+def test_results_are_limited_to_the_owners_boards():
+    index = build_index()
+    assert ids(index.search(SearchQuery(text="release", user_id=8))) == [("board", 2)]
+    assert ids(index.search(SearchQuery(text="release", user_id=7, board_id=2))) == []
+
+
+def test_label_and_due_date_filters():
+    index = build_index()
+    assert ids(index.search(SearchQuery(text="deploy", user_id=7, label="ops"))) == [("card", 100)]
+    query = SearchQuery(text="deploy", user_id=7, due_date_start=datetime(2024, 4, 1), due_date_end=datetime(2024, 6, 1))
+    assert ids(index.search(query)) == [("card", 100)]
+
+
+def test_updates_move_and_delete_documents():
+    index = build_index()
+    index.apply({"op": "upsert", "kind": "board", "id": 3, "owner_id": 7, "title": "Archive"})
+    index.apply({"op": "upsert", "kind": "list", "id": 10, "board_id": 3, "title": "Doing"})
+    index.apply({
+        "op": "upsert", "kind": "card", "id": 101, "board_id": 3, "list_id": 10, "title": "Deploy docs",
+        "text": [], "labels": [], "due_date": None,
+    })
+    assert ids(index.search(SearchQuery(text="deploy", user_id=7, board_id=3))) == [("card", 101)]
+    assert "docs" not in index.partitions[1].postings
+
+    index.apply({"op": "delete", "kind": "list", "id": 10})
+    assert ids(index.search(SearchQuery(text="deploy", user_id=7))) == [("card", 100)]
+
+    index.apply({"op": "delete", "kind": "board", "id": 1})
+    assert index.search(SearchQuery(text="release", user_id=7)) == []
+    assert ("card", 100) not in index.locations
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.storage import LocalStorage
+from app.uploads import _MultipartFile
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    first = asyncio.run(storage.save(stream(b"hello ", b"world"), max_size=100))
+    second = asyncio.run(storage.save(stream(b"hello world"), max_size=100))
+
+    assert first == second
+    assert first.sha256 == hashlib.sha256(b"hello world").hexdigest()
+    assert first.size == 11
+    with open(storage.path(first.sha256), "rb") as f:
+        assert f.read() == b"hello world"
+    assert asyncio.run(storage.exists(first.sha256))
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_oversized_upload_stops_and_keeps_nothing(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    seen = []
+
+    async def chunks():
+        for i in range(10):
+            seen.append(i)
+            yield b"x" * 10
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(storage.save(chunks(), max_size=25))
+    assert e.value.status_code == 413
+    # Stopped reading at the third chunk rather than taking the whole body
+    assert seen == [0, 1, 2]
+    assert os.listdir(tmp_path / "tmp") == []
+    assert not (tmp_path / "objects").exists()
+
+
+def test_multipart_file_part_is_parsed_incrementally():
+    body = (
+        b"--b\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nignored\r\n"
+        b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"plan.txt\"\r\n"
+        b"Content-Type: text/plain\r\n\r\nline one\r\nline two\r\n--b--\r\n"
+    )
+    part = _MultipartFile(b"b")
+    for i in range(0, len(body), 7):
+        part.parser.write(body[i:i + 7])
+    assert (part.filename, part.content_type, part.finished) == ("plan.txt", "text/plain", True)
+    assert b"".join(part.data) == b"line one\r\nline two"
+
+
+def test_thumbnails_are_square_upright_and_stripped(tmp_path):
+    from PIL import Image
+    from app.thumbnails import render
+
+    # A landscape photo tagged to be shown rotated, carrying EXIF
+    photo = Image.new("RGB", (600, 400), "red")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise
+    exif[0x010F] = "Camera maker"
+    path = tmp_path / "photo.jpg"
+    photo.save(path, "JPEG", exif=exif)
+
+    variants = render(str(path), (32, 128), max_pixels=10_000_000)
+    assert sorted(variants) == ["128.jpg", "128.webp", "32.jpg", "32.webp"]
+    for name, data in variants.items():
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            size = int(name.split(".")[0])
+            assert thumbnail.size == (size, size)
+            assert thumbnail.format == ("WEBP" if name.endswith("webp") else "JPEG")
+            assert not thumbnail.getexif()
+
+    with pytest.raises(ValueError):
+        render(str(path), (32,), max_pixels=1000)
+
+
+def test_broken_avatar_pool_fails_the_render_and_is_replaced(tmp_path):
+    from concurrent.futures.process import BrokenProcessPool
+    from PIL import Image
+    from app.avatars import AvatarProcessor
+
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (64, 64), "blue").save(path)
+    processor = AvatarProcessor(workers=1)
+
+    async def scenario():
+        await processor.render(str(path))
+        broken = processor._pool
+        # A worker dying mid-render, as when the OOM killer takes it
+        future = asyncio.get_running_loop().run_in_executor(broken, os._exit, 1)
+        with pytest.raises(BrokenProcessPool):
+            await future
+        with pytest.raises(BrokenProcessPool):
+            await processor.render(str(path))
+        # Not retried in this process; the next render gets a fresh pool
+        assert processor._pool is None
+        assert "64.webp" in await processor.render(str(path))
+        assert processor._pool is not broken
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        processor.shutdown()
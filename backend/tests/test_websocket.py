@@ -3,9 +3,13 @@ import pytest
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 import asyncio
+import json
 from sqlalchemy.orm import Session
 from app.main import app
 from app import models, auth
+from app.broker import Broker, InMemoryBroker
+from app import websocket as ws_module
+from app.websocket import ConnectionManager
 
 async def test_websocket_connection():
     # Create test user and card
@@ -34,4 +38,121 @@ async def test_websocket_connection():
             # Receive response
             data = await websocket.receive_json()
             assert data["type"] == "comment"
-            assert data["action"] == "created"
\ No newline at end of file
+            assert data["action"] == "created"
+
+class FakeWebSocket:
+    def __init__(self, delay=0):
+        self.accepted = False
+        self.closed_with = None
+        self.delay = delay
+        self.sent = []
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_incomplete_brokers_fail_when_constructed():
+    class PublishOnly(Broker):
+        async def publish(self, channel, message):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnly()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_sockets_on_other_managers():
+    broker = InMemoryBroker()
+    worker_a = ConnectionManager(broker)
+    worker_b = ConnectionManager(broker)
+
+    sender, peer_a, peer_b = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(sender, 1, user_id=1)
+    await worker_a.connect(peer_a, 1, user_id=2)
+    await worker_b.connect(peer_b, 1, user_id=3)
+
+    message = {"type": "comment", "action": "created", "data": {"content": "hi"}}
+    await worker_a.broadcast_to_card(1, message, exclude=sender)
+    await worker_a.drain()
+    await worker_b.drain()
+
+    assert sender.sent == []
+    assert peer_a.sent == [message]
+    assert peer_b.sent == [message]
+
+
+@pytest.mark.asyncio
+async def test_manager_only_subscribes_to_cards_with_live_sockets():
+    broker = InMemoryBroker()
+    worker_a = ConnectionManager(broker)
+    worker_b = ConnectionManager(broker)
+
+    socket_a, socket_b = FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(socket_a, 1, user_id=1)
+    await worker_b.connect(socket_b, 2, user_id=2)
+    assert set(broker.subscriptions) == {"card:1", "card:2"}
+    assert broker.subscriptions["card:1"] == [worker_a._on_broker_message]
+
+    await worker_b.broadcast_to_card(1, {"type": "activity"})
+    await worker_a.drain()
+    assert socket_a.sent == [{"type": "activity"}]
+    assert socket_b.sent == []
+
+    await worker_a.disconnect(socket_a, 1)
+    assert set(broker.subscriptions) == {"card:2"}
+
+
+@pytest.mark.asyncio
+async def test_board_socket_multiplexes_card_and_list_channels():
+    manager = ConnectionManager(InMemoryBroker())
+    board_socket, card_socket = FakeWebSocket(), FakeWebSocket()
+    await manager.connect_board(board_socket, 1, user_id=1)
+    await manager.subscribe(board_socket, manager.card_channel(10))
+    await manager.subscribe(board_socket, manager.list_channel(20))
+    await manager.connect(card_socket, 10, user_id=2)
+
+    await manager.broadcast_to_card(10, {"type": "comment"})
+    await manager.broadcast_to_list(20, {"type": "list"})
+    await manager.broadcast_to_board(1, {"type": "board"})
+    await manager.drain()
+    assert board_socket.sent == [{"type": "comment"}, {"type": "list"}, {"type": "board"}]
+    assert card_socket.sent == [{"type": "comment"}]
+
+    await manager.unsubscribe(board_socket, manager.card_channel(10))
+    assert manager.channel_connections["card:10"] == [card_socket]
+    await manager.remove(board_socket)
+    assert set(manager.channel_connections) == {"card:10"}
+    assert board_socket not in manager.clients
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_stall_others_and_is_evicted(monkeypatch):
+    monkeypatch.setattr(ws_module, "OUTBOUND_QUEUE_SIZE", 2)
+    monkeypatch.setattr(ws_module, "SLOW_CONSUMER_DROP_LIMIT", 3)
+    manager = ConnectionManager(InMemoryBroker())
+
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+    await manager.connect(fast, 1, user_id=1)
+    await manager.connect(slow, 1, user_id=2)
+
+    for i in range(6):
+        await manager.broadcast_to_card(1, {"seq": i})
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(manager.drain(), timeout=1)
+
+    assert [m["seq"] for m in fast.sent] == list(range(6))
+    assert slow.closed_with == ws_module.SLOW_CONSUMER_CLOSE_CODE
+    assert manager.channel_connections["card:1"] == [fast]
+
+    metrics = manager.get_metrics()["channels"]["card:1"]
+    assert metrics["deliveries"] == 6
+    assert metrics["evicted"] == 1
+    assert metrics["queue_depth"] == 0